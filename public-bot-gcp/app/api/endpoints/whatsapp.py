@@ -10,6 +10,9 @@ from app.services.conversation_service import ConversationService # <--- Import
 # --- UPDATED IMPORTS ---
 from app.core.persistence import get_checkpointer
 from app.graphs.master_graph import get_master_graph 
+from app.core.memory_manager import memory_manager
+from app.services.openai_service import get_llm_client
+from app.services.token_meter import token_meter
 import os
 import logging
 
@@ -62,8 +65,12 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
             logger.warning("Received message for unknown Agent ID.")
             return {"status": "ignored", "reason": "agent_not_found"}
 
-        if not agent.chatbot_enabled:
-            logger.info(f"⛔ Agent {agent.name} is disabled. Sending default reply.")
+        # Out of tokens: same offline reply as a disabled bot (in-memory check, no query)
+        has_quota = token_meter.has_quota(agent)
+
+        if not agent.chatbot_enabled or not has_quota:
+            reason = "chatbot_disabled" if not agent.chatbot_enabled else "token_quota_exhausted"
+            logger.info(f"⛔ Agent {agent.name} is unavailable ({reason}). Sending default reply.")
             wa_client = WhatsAppClient()
             changes = payload['entry'][0]['changes'][0]['value']
             user_mobile = changes['messages'][0]['from']
@@ -74,7 +81,7 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                 phone_number_id=agent.whatsapp_phone_number_id,
                 access_token=agent.whatsapp_access_token
             )
-            return {"status": "ignored", "reason": "chatbot_disabled"}
+            return {"status": "ignored", "reason": reason}
         
         # --- C. EXTRACT DATA ---
         value = payload['entry'][0]['changes'][0]['value']
@@ -110,8 +117,11 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
             )
             await db.commit() # Commit early so it's saved
 
+            # LLM usage from here on is billed to this agent
+            token_meter.bind(agent.agent_id)
+
             # --- 2. SETUP PERSISTENCE ---
-            checkpointer = await get_checkpointer(db.bind)
+            checkpointer = await get_checkpointer()
             
             # --- 3. GET MASTER GRAPH ---
             graph = get_master_graph(checkpointer)
@@ -120,7 +130,8 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
             config = {
                 "configurable": {
                     "thread_id": user_mobile, 
-                    "db_session": db 
+                    "db_session": db,
+                    "llm_client": get_llm_client()
                 }
             }
 
@@ -148,7 +159,10 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                 agent_id=agent.agent_id,
                 sender="assistant",
                 message=ai_reply,
-                metadata={"flow": final_state.get("active_flow")}
+                metadata={
+                    "flow": final_state.get("active_flow"),
+                    "intent": final_state.get("router_intent")
+                }
             )
             await db.commit()
 
@@ -160,6 +174,9 @@ async def receive_webhook(request: Request, db: AsyncSession = Depends(get_db)):
                 phone_number_id=agent.whatsapp_phone_number_id,
                 access_token=agent.whatsapp_access_token
             )
+
+            # Long threads: fold older messages into the summary in the background
+            memory_manager.maybe_compact(graph, user_mobile, final_state)
             
         else:
             logger.info(f"Received non-text message type: {msg_type}")
@@ -18,13 +18,164 @@ class Settings(BaseSettings):
     # Redis Settings
     REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
     REDIS_SESSION_TTL: int = int(os.getenv("REDIS_SESSION_TTL", "86400"))  
+
+    # Conversation state (LangGraph checkpointer, see app/core/persistence.py): memory | postgres | redis
+    # CHECKPOINT_DATABASE_URL defaults to DATABASE_URL (use a direct connection for CHECKPOINT_SETUP)
+    # CHECKPOINT_SETUP creates / migrates the checkpoint tables at startup (opt-in, needs DDL rights)
+    CHECKPOINT_BACKEND: str = os.getenv("CHECKPOINT_BACKEND", "memory")
+    CHECKPOINT_DATABASE_URL: str = os.getenv("CHECKPOINT_DATABASE_URL", "")
+    CHECKPOINT_POOL_MIN_SIZE: int = int(os.getenv("CHECKPOINT_POOL_MIN_SIZE", "1"))
+    CHECKPOINT_POOL_MAX_SIZE: int = int(os.getenv("CHECKPOINT_POOL_MAX_SIZE", "10"))
+    CHECKPOINT_SETUP: bool = os.getenv("CHECKPOINT_SETUP", "False").lower() == "true"
+    CHECKPOINT_REDIS_KEEP: int = int(os.getenv("CHECKPOINT_REDIS_KEEP", "2"))
+
+    # Conversation memory compaction (see app/core/memory_manager.py): once a thread holds more than
+    # MEMORY_COMPACTION_THRESHOLD messages, all but the last MEMORY_WINDOW_MESSAGES are folded into a summary
+    MEMORY_COMPACTION_ENABLED: bool = os.getenv("MEMORY_COMPACTION_ENABLED", "True").lower() == "true"
+    MEMORY_WINDOW_MESSAGES: int = int(os.getenv("MEMORY_WINDOW_MESSAGES", "12"))
+    MEMORY_COMPACTION_THRESHOLD: int = int(os.getenv("MEMORY_COMPACTION_THRESHOLD", "24"))
+    MEMORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "400"))
     
     # OpenAI Settings
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+
+    # Shared LLM HTTP Client (one pool per process, see app/services/openai_service.py)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "True").lower() == "true"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "50"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "120"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+    # Offline LLM (load tests / benchmarks, see app/services/llm_standin.py):
+    # LLM_MODE = live | record | replay | standin. LLM_BASE_URL points the client at the
+    # stand-in server (scripts/llm_standin_server.py) instead.
+    # LLM_STANDIN_LATENCY: "lognormal:700,0.35" or JSON per node {"default": ..., "router": "fixed:300"}
+    LLM_MODE: str = os.getenv("LLM_MODE", "live")
+    LLM_BASE_URL: Optional[str] = os.getenv("LLM_BASE_URL") or None
+    LLM_CASSETTE_PATH: str = os.getenv("LLM_CASSETTE_PATH", "llm_cassettes/default.jsonl")
+    LLM_STANDIN_LATENCY: str = os.getenv("LLM_STANDIN_LATENCY", "")
+    LLM_STANDIN_SEED: int = int(os.getenv("LLM_STANDIN_SEED", "0"))
     
     # Connection Pool Settings
     DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "20"))
     DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+    # Change Notifications (LISTEN/NOTIFY needs a direct connection, not PgBouncer transaction mode)
+    DB_LISTEN_URL: Optional[str] = os.getenv("DB_LISTEN_URL")
+    DB_INSTALL_TRIGGERS: bool = os.getenv("DB_INSTALL_TRIGGERS", "False").lower() == "true"
+
+    # Inventory Facet Cache
+    FACET_CACHE_TTL_SECONDS: int = int(os.getenv("FACET_CACHE_TTL_SECONDS", "900"))
+    FACET_CACHE_MAX_ENTRIES: int = int(os.getenv("FACET_CACHE_MAX_ENTRIES", "2000"))
+
+    # Property Detail Cache (full rows behind the PropertyCards in conversation state)
+    PROPERTY_CACHE_MAX_ENTRIES: int = int(os.getenv("PROPERTY_CACHE_MAX_ENTRIES", "2000"))
+    PROPERTY_CACHE_TTL_SECONDS: int = int(os.getenv("PROPERTY_CACHE_TTL_SECONDS", "900"))
+
+    # Model Tiers (JSON). LLM_TIERS: {"small": "gpt-4o-mini", "large": "gpt-4o"}
+    # LLM_NODE_TIERS: {"router": ["small", "large"], ...}, see app/services/llm_gateway.py
+    LLM_TIERS: str = os.getenv("LLM_TIERS", "")
+    LLM_NODE_TIERS: str = os.getenv("LLM_NODE_TIERS", "")
+
+    # LLM resilience (app/services/llm_gateway.py). LLM_NODE_DEADLINES (JSON): {"router": 8, ...} seconds
+    LLM_NODE_DEADLINES: str = os.getenv("LLM_NODE_DEADLINES", "")
+    LLM_DEFAULT_DEADLINE_SECONDS: float = float(os.getenv("LLM_DEFAULT_DEADLINE_SECONDS", "20"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_SECONDS: float = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.25"))
+    LLM_HEDGING: bool = os.getenv("LLM_HEDGING", "True").lower() == "true"
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+    LLM_CIRCUIT_FAILURE_RATE: float = float(os.getenv("LLM_CIRCUIT_FAILURE_RATE", "0.5"))
+    LLM_CIRCUIT_MIN_CALLS: int = int(os.getenv("LLM_CIRCUIT_MIN_CALLS", "10"))
+    LLM_CIRCUIT_WINDOW: int = int(os.getenv("LLM_CIRCUIT_WINDOW", "50"))
+    LLM_CIRCUIT_COOLDOWN_SECONDS: float = float(os.getenv("LLM_CIRCUIT_COOLDOWN_SECONDS", "30"))
+
+    # Prompt token budgets per node (JSON), e.g. {"intelligent_chat": 6000}. See app/core/prompt_budget.py
+    PROMPT_TOKEN_BUDGETS: str = os.getenv("PROMPT_TOKEN_BUDGETS", "")
+
+    # Generator: "template" answers plain slot-filling turns without the LLM, "llm" always calls it.
+    # Phrasing overrides (JSON): GENERATOR_TEMPLATES = {"ask_budget": ["..."]},
+    # GENERATOR_AGENT_TEMPLATES = {"<agent_id>": {...}}. See app/services/question_templates.py
+    GENERATOR_MODE: str = os.getenv("GENERATOR_MODE", "template")
+    GENERATOR_TEMPLATES: str = os.getenv("GENERATOR_TEMPLATES", "")
+    GENERATOR_AGENT_TEMPLATES: str = os.getenv("GENERATOR_AGENT_TEMPLATES", "")
+
+    # Booking chat summary (background job after the slot is reserved)
+    BOOKING_SUMMARY_MAX_ATTEMPTS: int = int(os.getenv("BOOKING_SUMMARY_MAX_ATTEMPTS", "4"))
+    BOOKING_SUMMARY_RETRY_BASE_SECONDS: float = float(os.getenv("BOOKING_SUMMARY_RETRY_BASE_SECONDS", "2"))
+    N8N_BOOKING_SUMMARY_URL: str = os.getenv("N8N_BOOKING_SUMMARY_URL", "")
+
+    # Token metering against agent.tokens_available (see app/services/token_meter.py).
+    # Usage is flushed to Postgres every TOKEN_METER_FLUSH_SECONDS; with TOKEN_QUOTA_ENFORCED
+    # an agent at or below zero gets the offline reply instead of the bot.
+    TOKEN_METERING_ENABLED: bool = os.getenv("TOKEN_METERING_ENABLED", "True").lower() == "true"
+    TOKEN_METER_FLUSH_SECONDS: float = float(os.getenv("TOKEN_METER_FLUSH_SECONDS", "15"))
+    TOKEN_QUOTA_ENFORCED: bool = os.getenv("TOKEN_QUOTA_ENFORCED", "True").lower() == "true"
+
+    # Fused Routing: one structured call returns intent + filter/appointment deltas
+    FUSED_ROUTING: bool = os.getenv("FUSED_ROUTING", "False").lower() == "true"
+
+    # Start search extraction alongside the router when a search continuation is likely
+    SPECULATIVE_EXTRACTION: bool = os.getenv("SPECULATIVE_EXTRACTION", "True").lower() == "true"
+
+    # Local Intent Classifier (router fast path, see scripts/train_intent_classifier.py)
+    INTENT_CLASSIFIER_ENABLED: bool = os.getenv("INTENT_CLASSIFIER_ENABLED", "True").lower() == "true"
+    INTENT_MODEL_PATH: str = os.getenv("INTENT_MODEL_PATH", "models/intent_classifier.json")
+    # Overrides the threshold tuned at training time (leave empty to use the model's)
+    INTENT_CONFIDENCE_THRESHOLD: Optional[float] = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD")) if os.getenv("INTENT_CONFIDENCE_THRESHOLD") else None
+
+    # intelligent_chat Answer Cache (invalidated by 'kb_changes' notifications)
+    ANSWER_CACHE_ENABLED: bool = os.getenv("ANSWER_CACHE_ENABLED", "True").lower() == "true"
+    ANSWER_CACHE_MAX_ENTRIES: int = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+    ANSWER_CACHE_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+    # Used instead when DB_INSTALL_TRIGGERS is false: without 'kb_changes' the TTL is the only invalidation
+    ANSWER_CACHE_UNTRIGGERED_TTL_SECONDS: int = int(os.getenv("ANSWER_CACHE_UNTRIGGERED_TTL_SECONDS", "300"))
+    ANSWER_CACHE_SEMANTIC: bool = os.getenv("ANSWER_CACHE_SEMANTIC", "False").lower() == "true"
+    ANSWER_CACHE_SIMILARITY_THRESHOLD: float = float(os.getenv("ANSWER_CACHE_SIMILARITY_THRESHOLD", "0.93"))
+    ANSWER_CACHE_EMBEDDING_MODEL: str = os.getenv("ANSWER_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+    ANSWER_CACHE_EMBEDDING_DIMENSIONS: int = int(os.getenv("ANSWER_CACHE_EMBEDDING_DIMENSIONS", "256"))
+
+    # Knowledge base context cache (full KB per agent, see app/services/kb_context_cache.py)
+    KB_CONTEXT_CACHE_ENABLED: bool = os.getenv("KB_CONTEXT_CACHE_ENABLED", "True").lower() == "true"
+    KB_CONTEXT_CACHE_MAX_BYTES: int = int(os.getenv("KB_CONTEXT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    KB_CONTEXT_CACHE_TTL_SECONDS: int = int(os.getenv("KB_CONTEXT_CACHE_TTL_SECONDS", "900"))
+
+    # Knowledge base retrieval (pgvector, see app/services/vector_store_service.py)
+    # KB_RETRIEVAL: "vector" = top-k chunks for the question, "bm25" = top-k chunks from an in-memory
+    # lexical index (app/services/lexical_index.py, no embeddings), "full" = every FAQ and document.
+    # KB_RETRIEVAL_BY_AGENT (JSON) overrides it per agent: {"agent-7": "bm25"}
+    # KB_EMBEDDER: "openai" or "local" (sentence-transformers). Changing KB_EMBEDDING_DIMENSIONS
+    # needs a new column, see install_schema(). "vector" / "bm25" need their tables, which are only
+    # created with DB_INSTALL_TRIGGERS=true (or scripts/index_knowledge_base.py --install-schema).
+    KB_RETRIEVAL: str = os.getenv("KB_RETRIEVAL", "full")
+    KB_RETRIEVAL_BY_AGENT: str = os.getenv("KB_RETRIEVAL_BY_AGENT", "")
+    KB_EMBEDDER: str = os.getenv("KB_EMBEDDER", "openai")
+    KB_EMBEDDING_MODEL: str = os.getenv("KB_EMBEDDING_MODEL", "text-embedding-3-small")
+    KB_EMBEDDING_DIMENSIONS: int = int(os.getenv("KB_EMBEDDING_DIMENSIONS", "512"))
+    KB_VECTOR_INDEX: str = os.getenv("KB_VECTOR_INDEX", "hnsw")
+    KB_IVFFLAT_LISTS: int = int(os.getenv("KB_IVFFLAT_LISTS", "100"))
+    KB_HNSW_EF_SEARCH: int = int(os.getenv("KB_HNSW_EF_SEARCH", "64"))
+    KB_IVFFLAT_PROBES: int = int(os.getenv("KB_IVFFLAT_PROBES", "10"))
+    KB_CHUNK_TOKENS: int = int(os.getenv("KB_CHUNK_TOKENS", "300"))
+    KB_CHUNK_OVERLAP_TOKENS: int = int(os.getenv("KB_CHUNK_OVERLAP_TOKENS", "50"))
+    KB_TOP_K: int = int(os.getenv("KB_TOP_K", "6"))
+    # Ingestion (app/services/kb_ingestion.py): KB_DEDUPE_MAX_DISTANCE = simhash bits under which
+    # two document chunks count as the same text (0 = exact duplicates only)
+    KB_DEDUPE_MAX_DISTANCE: int = int(os.getenv("KB_DEDUPE_MAX_DISTANCE", "3"))
+    KB_INGEST_BATCH_SIZE: int = int(os.getenv("KB_INGEST_BATCH_SIZE", "256"))
+    KB_INGEST_CONCURRENCY: int = int(os.getenv("KB_INGEST_CONCURRENCY", "1"))
+    KB_BM25_K1: float = float(os.getenv("KB_BM25_K1", "1.2"))
+    KB_BM25_B: float = float(os.getenv("KB_BM25_B", "0.75"))
+    KB_LEXICAL_MAX_AGENTS: int = int(os.getenv("KB_LEXICAL_MAX_AGENTS", "1000"))
+
+    # Tables property searches may query (comma separated, empty = every registered vertical).
+    # Each one is only searched once startup finds its columns (see app/services/search_verticals.py).
+    SEARCH_VERTICALS: str = os.getenv("SEARCH_VERTICALS", "")
+
+    # Search Ranking (JSON weights, see app/services/ranking.py)
+    RANKING_ENABLED: bool = os.getenv("RANKING_ENABLED", "True").lower() == "true"
+    RANKING_CANDIDATE_LIMIT: int = int(os.getenv("RANKING_CANDIDATE_LIMIT", "200"))
+    RANKING_WEIGHTS: str = os.getenv("RANKING_WEIGHTS", "")
+    RANKING_AGENT_WEIGHTS: str = os.getenv("RANKING_AGENT_WEIGHTS", "")
     
     # Validate database URL format
     @validator("DATABASE_URL", pre=True)
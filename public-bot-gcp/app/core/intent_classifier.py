@@ -0,0 +1,186 @@
+"""
+Local intent classifier (router fast path).
+
+Multinomial naive Bayes over character n-grams + words, pure Python, no network.
+Trained from logged router decisions by scripts/train_intent_classifier.py and
+stored as JSON. The router only trusts it above a confidence threshold that the
+training script tunes against held-out accuracy; everything else still goes to
+the LLM.
+"""
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+MODEL_VERSION = 1
+NGRAM_RANGE = (2, 4)
+MAX_TEXT_CHARS = 300
+
+_WORD_RE = re.compile(r"[a-z0-9$']+")
+_DIGITS_RE = re.compile(r"\d+")
+
+class IntentSample(NamedTuple):
+    text: str
+    intent: str
+    last_bot_message: str = ""
+    has_table: bool = False
+
+class IntentPrediction(NamedTuple):
+    intent: str
+    confidence: float
+    confident: bool
+
+def featurize(text: str, last_bot_message: str = "", has_table: bool = False) -> List[str]:
+    """
+    Char n-grams inside word boundaries, whole words, and a few context flags.
+    Digits are collapsed so "2000" and "1800" share features.
+    """
+    text = _DIGITS_RE.sub("0", (text or "").lower()[:MAX_TEXT_CHARS])
+    features = []
+    for word in _WORD_RE.findall(text):
+        features.append(f"w:{word}")
+        padded = f" {word} "
+        for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+            features.extend(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+
+    # Context: "yes" means different things after "Want to book?" and after a listing
+    bot = (last_bot_message or "").lower()
+    if any(k in bot for k in ("book", "viewing", "appointment")):
+        features.append("ctx:bot_asked_booking")
+    if any(k in bot for k in ("agent", "human", "contact")):
+        features.append("ctx:bot_offered_human")
+    if "?" in bot:
+        features.append("ctx:bot_asked_question")
+    features.append("ctx:has_table" if has_table else "ctx:no_table")
+    return features
+
+class IntentClassifier:
+    def __init__(self, model: dict):
+        self.classes: List[str] = model["classes"]
+        self.threshold: float = model["threshold"]
+        self.class_log_prior: Dict[str, float] = model["class_log_prior"]
+        self.feature_log_prob: Dict[str, Dict[str, float]] = model["feature_log_prob"]
+        self.unknown_log_prob: Dict[str, float] = model["unknown_log_prob"]
+        self.metrics: dict = model.get("metrics", {})
+
+    # --- Inference ---
+
+    def predict_proba(self, text: str, last_bot_message: str = "", has_table: bool = False) -> Dict[str, float]:
+        features = featurize(text, last_bot_message, has_table)
+        scores = {}
+        for cls in self.classes:
+            log_probs = self.feature_log_prob[cls]
+            unknown = self.unknown_log_prob[cls]
+            scores[cls] = self.class_log_prior[cls] + sum(log_probs.get(f, unknown) for f in features)
+
+        # Naive Bayes log-likelihoods grow with message length and saturate the softmax
+        # at 1.0. Dividing by the feature count keeps the argmax but spreads the
+        # confidences out enough for threshold tuning to mean something.
+        n = max(len(features), 1)
+        scores = {cls: s / n for cls, s in scores.items()}
+
+        # Softmax in log space
+        top = max(scores.values())
+        exp_scores = {cls: math.exp(s - top) for cls, s in scores.items()}
+        total = sum(exp_scores.values())
+        return {cls: v / total for cls, v in exp_scores.items()}
+
+    def predict(self, text: str, last_bot_message: str = "", has_table: bool = False,
+                threshold: Optional[float] = None) -> IntentPrediction:
+        probs = self.predict_proba(text, last_bot_message, has_table)
+        intent = max(probs, key=probs.get)
+        confidence = probs[intent]
+        return IntentPrediction(intent, confidence, confidence >= (threshold if threshold is not None else self.threshold))
+
+    # --- Training ---
+
+    @classmethod
+    def train(cls, samples: Iterable[IntentSample], alpha: float = 0.5, threshold: float = 1.0,
+              min_feature_count: int = 1) -> "IntentClassifier":
+        """
+        Fits the model. threshold defaults to 1.0 (never confident) until the
+        training script has tuned it on held-out data.
+        """
+        class_counts: Counter = Counter()
+        feature_counts: Dict[str, Counter] = defaultdict(Counter)
+        for sample in samples:
+            class_counts[sample.intent] += 1
+            feature_counts[sample.intent].update(featurize(sample.text, sample.last_bot_message, sample.has_table))
+
+        if not class_counts:
+            raise ValueError("No training samples")
+
+        # Drop rare features to keep the JSON small
+        totals: Counter = Counter()
+        for counts in feature_counts.values():
+            totals.update(counts)
+        vocabulary = {f for f, c in totals.items() if c >= min_feature_count}
+
+        n_samples = sum(class_counts.values())
+        classes = sorted(class_counts)
+        model = {
+            "version": MODEL_VERSION,
+            "classes": classes,
+            "threshold": threshold,
+            "class_log_prior": {},
+            "feature_log_prob": {},
+            "unknown_log_prob": {},
+        }
+        for c in classes:
+            counts = {f: n for f, n in feature_counts[c].items() if f in vocabulary}
+            denom = sum(counts.values()) + alpha * (len(vocabulary) + 1)
+            model["class_log_prior"][c] = math.log(class_counts[c] / n_samples)
+            model["feature_log_prob"][c] = {f: round(math.log((n + alpha) / denom), 5) for f, n in counts.items()}
+            model["unknown_log_prob"][c] = math.log(alpha / denom)
+        return cls(model)
+
+    # --- Persistence ---
+
+    def to_dict(self) -> dict:
+        return {
+            "version": MODEL_VERSION,
+            "classes": self.classes,
+            "threshold": self.threshold,
+            "class_log_prior": self.class_log_prior,
+            "feature_log_prob": self.feature_log_prob,
+            "unknown_log_prob": self.unknown_log_prob,
+            "metrics": self.metrics,
+        }
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["IntentClassifier"]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            model = json.load(f)
+        if model.get("version") != MODEL_VERSION:
+            logger.warning(f"Intent model {path} has version {model.get('version')}, expected {MODEL_VERSION}. Ignoring.")
+            return None
+        return cls(model)
+
+@lru_cache(maxsize=1)
+def get_intent_classifier() -> Optional[IntentClassifier]:
+    """Loaded once per process. None (LLM-only routing) if disabled or not trained yet."""
+    if not settings.INTENT_CLASSIFIER_ENABLED:
+        return None
+    try:
+        classifier = IntentClassifier.load(settings.INTENT_MODEL_PATH)
+    except Exception as e:
+        logger.error(f"Failed to load intent model {settings.INTENT_MODEL_PATH}: {e}")
+        return None
+    if classifier:
+        logger.info(f"🧠 Intent classifier loaded ({len(classifier.classes)} intents, threshold {classifier.threshold:.2f})")
+    return classifier
@@ -0,0 +1,175 @@
+"""
+Bounded conversation state: rolling summary + message window.
+
+AgentState.messages is append-only (add_messages), so without compaction every
+checkpoint read / write carries the whole lifetime of a conversation, while the
+nodes only ever look at the last 7-10 messages. After a turn that leaves more
+than MEMORY_COMPACTION_THRESHOLD messages in the thread, a background job:
+
+1. summarises everything but the last MEMORY_WINDOW_MESSAGES, together with the
+   existing conversation_summary (LLM, small tier; an extractive summary if the
+   LLM is unavailable),
+2. writes it back as one state update (graph.aupdate_state, as the otherwise
+   unused "compact_memory" node): RemoveMessage for the folded messages, the new
+   conversation_summary, and compacted_messages += number folded.
+
+The reply has been sent by then, so the user never waits on it. If a turn for the
+same thread lands while the summary is being written, the update is based on a
+newer checkpoint than the one summarised; it is only applied when the summary it
+extends and the messages it folds are still there, otherwise it is dropped and
+the next turn over the threshold redoes it.
+"""
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from langchain_core.messages import RemoveMessage
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.core.prompt_budget import truncate_tokens
+from app.services.llm_gateway import llm_gateway, non_empty_text
+from app.services.openai_service import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("memory_compactions_total", "Conversation compactions by outcome (ok/fallback/stale/failed)")
+metrics.describe("memory_compacted_messages", "Messages folded into the summary per compaction")
+
+# Graph node the compaction update is written as (see master_graph); never routed to
+COMPACTION_NODE = "compact_memory"
+
+# Per message in the summary prompt; the summary itself is capped by MEMORY_SUMMARY_MAX_TOKENS
+MESSAGE_MAX_TOKENS = 300
+
+SUMMARY_PROMPT = """
+You are condensing the older part of a WhatsApp chat between a property rental assistant and a prospective tenant.
+The assistant will only see this summary plus the latest messages, so keep every fact it may still need:
+- the user's requirements (budget, area, room type, move-in date, lease, gender, nationality, pass type)
+- properties that were shown or discussed, and what the user thought of them
+- questions the user asked and what they were told
+- appointment details and anything the assistant promised to do
+
+Merge the existing summary with the new messages into one summary. If a requirement changed, keep only the latest value.
+Plain text, no greeting, at most {max_words} words.
+
+EXISTING SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{history}
+"""
+
+def format_history(messages) -> str:
+    return "\n".join(
+        f"{'User' if m.type == 'human' else 'Assistant'}: {truncate_tokens(str(m.content), MESSAGE_MAX_TOKENS)}"
+        for m in messages
+    )
+
+def with_summary(state, history: str) -> str:
+    """Chat history for a prompt, preceded by the summary of the compacted part (if any)."""
+    summary = state.get("conversation_summary")
+    return f"Earlier in the conversation: {summary}\n{history}" if summary else history
+
+class MemoryManager:
+    def __init__(self, enabled: bool, window: int, threshold: int, summary_max_tokens: int):
+        self.enabled = enabled
+        self.window = max(window, 2)
+        # Compacting below window + a few messages would summarise on every turn
+        self.threshold = max(threshold, self.window + 2)
+        self.summary_max_tokens = summary_max_tokens
+        self._tasks: Set[asyncio.Task] = set()
+        self._running: Set[str] = set()  # thread_ids with a compaction in flight
+
+    def maybe_compact(self, graph, thread_id: str, state: dict):
+        """Called after a turn with the final state; schedules a compaction if the thread is over the threshold."""
+        if not self.enabled or thread_id in self._running:
+            return
+        if len(state.get("messages") or []) <= self.threshold:
+            return
+        self._running.add(thread_id)
+        task = asyncio.create_task(self._run(graph, thread_id))
+        # Keep a reference until done, otherwise the task can be garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _: self._running.discard(thread_id))
+
+    async def drain(self, timeout: float):
+        """Give in-flight compactions a chance to finish on shutdown."""
+        if not self._tasks:
+            return
+        logger.info(f"⏳ Waiting for {len(self._tasks)} memory compaction(s)...")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    async def _run(self, graph, thread_id: str):
+        # Only the thread: the request's DB session is closed by now, and no node runs
+        config = {"configurable": {"thread_id": thread_id}}
+        try:
+            snapshot = await graph.aget_state(config)
+            values = snapshot.values or {}
+            messages = values.get("messages") or []
+            folded = messages[:-self.window]
+            if not folded:
+                return
+            previous = values.get("conversation_summary")
+
+            summary, outcome = await self._summarise(previous, folded)
+
+            # A turn may have finished meanwhile; fold only if the summary still extends what's in the thread
+            current = (await graph.aget_state(config)).values or {}
+            present = {m.id for m in current.get("messages") or []}
+            if current.get("conversation_summary") != previous or any(m.id not in present for m in folded):
+                metrics.incr("memory_compactions_total", outcome="stale")
+                logger.info(f"🧠 Compaction for {thread_id} is stale (thread moved on); skipped.")
+                return
+
+            await graph.aupdate_state(config, {
+                "messages": [RemoveMessage(id=m.id) for m in folded],
+                "conversation_summary": summary,
+                "compacted_messages": (current.get("compacted_messages") or 0) + len(folded),
+            }, as_node=COMPACTION_NODE)
+            metrics.incr("memory_compactions_total", outcome=outcome)
+            metrics.observe("memory_compacted_messages", len(folded))
+            logger.info(f"🧠 Folded {len(folded)} messages of {thread_id} into the summary ({outcome}).")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.incr("memory_compactions_total", outcome="failed")
+            logger.error(f"Memory compaction for {thread_id} failed: {e}")
+
+    async def _summarise(self, previous: Optional[str], messages: List) -> tuple:
+        """(summary, "ok" | "fallback")"""
+        prompt = SUMMARY_PROMPT.format(
+            max_words=int(self.summary_max_tokens * 0.75),
+            summary=previous or "(none)",
+            history=format_history(messages),
+        )
+        try:
+            _, summary = await llm_gateway.complete(
+                "conversation_summary", get_llm_client(),
+                validate=non_empty_text,
+                messages=[{"role": "system", "content": prompt}],
+                temperature=0.2
+            )
+            return truncate_tokens(summary.strip(), self.summary_max_tokens), "ok"
+        except Exception as e:
+            logger.warning(f"Conversation summary LLM call failed ({e}). Using extractive summary.")
+            return self._extractive(previous, messages), "fallback"
+
+    def _extractive(self, previous: Optional[str], messages: List) -> str:
+        """What the user said, newest kept when the budget runs out (their requirements tend to be restated)."""
+        said = "; ".join(str(m.content).strip() for m in messages if m.type == "human")
+        text = f"{previous} User also said: {said}" if previous else f"User said: {said}"
+        if len(text) > self.summary_max_tokens * 4:
+            text = "..." + text[-self.summary_max_tokens * 4:]
+        return truncate_tokens(text, self.summary_max_tokens)
+
+memory_manager = MemoryManager(
+    enabled=settings.MEMORY_COMPACTION_ENABLED,
+    window=settings.MEMORY_WINDOW_MESSAGES,
+    threshold=settings.MEMORY_COMPACTION_THRESHOLD,
+    summary_max_tokens=settings.MEMORY_SUMMARY_MAX_TOKENS,
+)
@@ -0,0 +1,87 @@
+"""
+Minimal in-process metrics, exposed at GET /metrics in Prometheus text format.
+
+Counters, gauges and summaries; values are per worker process and reset on restart.
+"""
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key: LabelKey) -> str:
+    if not key:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in key) + "}"
+
+class Metrics:
+    def __init__(self):
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        # name -> labels -> [count, sum]
+        self._summaries: Dict[str, Dict[LabelKey, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+        self._gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+        self._help: Dict[str, str] = {}
+        self.started_at = time.time()
+
+    def describe(self, name: str, help_text: str):
+        self._help[name] = help_text
+
+    def incr(self, name: str, value: float = 1, **labels):
+        self._counters[name][_key(labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self._gauges[name][_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        entry = self._summaries[name][_key(labels)]
+        entry[0] += 1
+        entry[1] += value
+
+    def get(self, name: str, **labels) -> float:
+        return self._counters.get(name, {}).get(_key(labels), 0)
+
+    def snapshot(self) -> dict:
+        """JSON-friendly view (used by scripts and debugging)."""
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "counters": {
+                name: {_format_labels(k) or "total": v for k, v in series.items()}
+                for name, series in self._counters.items()
+            },
+            "gauges": {
+                name: {_format_labels(k) or "total": v for k, v in series.items()}
+                for name, series in self._gauges.items()
+            },
+            "summaries": {
+                name: {_format_labels(k) or "total": {"count": c, "sum": round(s, 3)} for k, (c, s) in series.items()}
+                for name, series in self._summaries.items()
+            },
+        }
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for name, series in self._counters.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} counter")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name, series in self._gauges.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            for key, value in series.items():
+                lines.append(f"{name}{_format_labels(key)} {value:g}")
+        for name, series in self._summaries.items():
+            if name in self._help:
+                lines.append(f"# HELP {name} {self._help[name]}")
+            lines.append(f"# TYPE {name} summary")
+            for key, (count, total) in series.items():
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total:.3f}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
@@ -1,7 +1,103 @@
+"""
+LangGraph checkpointer: where each conversation's graph state (thread_id = user
+mobile) lives between messages. CHECKPOINT_BACKEND picks one per process:
+
+- "postgres": langgraph-checkpoint-postgres on its own psycopg pool
+  (CHECKPOINT_POOL_MIN_SIZE..MAX_SIZE connections), separate from the app's
+  NullPool engine so checkpoint I/O never waits on a request's session. Durable
+  and shared by every uvicorn worker / instance.
+- "redis": hot state in Redis (app/core/redis_checkpoint.py). Shared across
+  workers and fast, but only the last CHECKPOINT_REDIS_KEEP checkpoints of a
+  thread are kept and idle threads expire after REDIS_SESSION_TTL.
+- "memory" (default): MemorySaver, per process and lost on restart.
+
+postgres is opt-in, and so is its DDL: saver.setup() only runs with
+CHECKPOINT_SETUP=true (like DB_INSTALL_TRIGGERS), so the tables are created
+once by a deploy with DDL rights, not on every boot.
+
+scripts/bench_checkpointer.py measures the per-turn read/write cost of each.
+"""
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Optional, Tuple
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.memory import MemorySaver
 
-_checkpointer = MemorySaver() # Create it once globally
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+Closer = Optional[Callable[[], Awaitable[None]]]
+
+def _conninfo(url: str) -> str:
+    # SQLAlchemy URLs carry the driver ("postgresql+asyncpg://"); psycopg wants plain postgresql://
+    return re.sub(r"^postgres(ql)?(\+\w+)?://", "postgresql://", url)
+
+async def _postgres() -> Tuple[BaseCheckpointSaver, Closer]:
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+
+    pool = AsyncConnectionPool(
+        _conninfo(settings.CHECKPOINT_DATABASE_URL or settings.DATABASE_URL),
+        min_size=settings.CHECKPOINT_POOL_MIN_SIZE,
+        max_size=settings.CHECKPOINT_POOL_MAX_SIZE,
+        kwargs={
+            "autocommit": True,
+            "row_factory": dict_row,
+            "prepare_threshold": None,  # PgBouncer-safe, like the app engine
+            "application_name": "whatsapp_bot_checkpointer",
+        },
+        name="checkpointer",
+        open=False,
+    )
+    await pool.open()
+    saver = AsyncPostgresSaver(pool)
+    if settings.CHECKPOINT_SETUP:
+        await saver.setup()  # Idempotent: creates / migrates the checkpoint tables
+    return saver, pool.close
+
+async def _redis() -> Tuple[BaseCheckpointSaver, Closer]:
+    from app.core.redis_checkpoint import RedisSaver
+    from app.services.redis_service import get_redis
+
+    # The shared client is closed by close_redis() in the app lifespan
+    return RedisSaver(get_redis(), settings.REDIS_SESSION_TTL, keep=settings.CHECKPOINT_REDIS_KEEP), None
+
+async def _memory() -> Tuple[BaseCheckpointSaver, Closer]:
+    return MemorySaver(), None
+
+BACKENDS = {"postgres": _postgres, "redis": _redis, "memory": _memory}
+
+async def create_checkpointer(backend: str) -> Tuple[BaseCheckpointSaver, Closer]:
+    """A new checkpointer for the backend and the coroutine that releases it (if any)."""
+    factory = BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"Unknown CHECKPOINT_BACKEND {backend!r}, expected one of {list(BACKENDS)}")
+    return await factory()
+
+# --- SHARED CHECKPOINTER ---
+_checkpointer: Optional[BaseCheckpointSaver] = None
+_close: Closer = None
+_init_lock = asyncio.Lock()
+
+async def init_checkpointer() -> BaseCheckpointSaver:
+    """Called once from the app lifespan."""
+    global _checkpointer, _close
+    async with _init_lock:
+        if _checkpointer is None:
+            _checkpointer, _close = await create_checkpointer(settings.CHECKPOINT_BACKEND)
+            logger.info(f"💾 Checkpointer ready ({settings.CHECKPOINT_BACKEND})")
+    return _checkpointer
+
+async def close_checkpointer():
+    global _checkpointer, _close
+    if _close is not None:
+        await _close()
+    _checkpointer, _close = None, None
 
-async def get_checkpointer(engine):
-    # We ignore the engine argument completely
-    return _checkpointer
\ No newline at end of file
+async def get_checkpointer() -> BaseCheckpointSaver:
+    # Scripts and workers that skip the FastAPI lifespan still get the shared one
+    return _checkpointer or await init_checkpointer()
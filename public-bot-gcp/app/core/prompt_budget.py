@@ -0,0 +1,190 @@
+"""
+Token-budgeted prompt assembly.
+
+A node describes its prompt as a template plus named sections (KB, properties,
+history, ...), each with a priority. PromptAssembler measures everything with
+tiktoken and fits the sections into the node's budget:
+
+- The template itself (instructions, user message) is always kept.
+- Sections are filled in priority order (0 = most important). A section that
+  doesn't fit is cut item by item (whole FAQs / listings / messages) and the
+  last item that only partly fits is truncated at a token boundary.
+- Sections made of items can drop from the end (keep="head", e.g. KB) or from
+  the start (keep="tail", e.g. chat history, where the newest lines matter).
+"""
+import json
+import logging
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import tiktoken
+
+from app.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("prompt_tokens", "Assembled prompt tokens by node")
+metrics.describe("prompt_section_tokens", "Tokens per prompt section after budgeting, by node and section")
+metrics.describe("prompt_truncations_total", "Prompt sections cut to fit the node budget")
+
+# Prompt budgets (tokens) per node. Leaves room for the reply within the model's window
+# and keeps latency/cost bounded when a KB grows.
+DEFAULT_BUDGET = 4000
+DEFAULT_BUDGETS = {
+    "intelligent_chat": 6000,
+}
+
+TRUNCATION_MARKER = " [...]"
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+def count_tokens(text: str, model: str = "gpt-4o") -> int:
+    return len(_encoding(model).encode(text or "", disallowed_special=()))
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "gpt-4o") -> str:
+    """Cut text to at most max_tokens tokens (marker included)."""
+    enc = _encoding(model)
+    tokens = enc.encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    keep = max_tokens - len(enc.encode(TRUNCATION_MARKER))
+    if keep <= 0:
+        return ""
+    return enc.decode(tokens[:keep]) + TRUNCATION_MARKER
+
+def split_tokens(text: str, max_tokens: int, overlap: int = 0, model: str = "gpt-4o") -> List[str]:
+    """Windows of at most max_tokens tokens, each repeating the last `overlap` tokens of the previous one."""
+    enc = _encoding(model)
+    tokens = enc.encode(text or "", disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return [text] if tokens else []
+    step = max(max_tokens - overlap, 1)
+    return [enc.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens) - overlap, step)]
+
+def _load_budgets() -> Dict[str, int]:
+    budgets = dict(DEFAULT_BUDGETS)
+    if settings.PROMPT_TOKEN_BUDGETS:
+        try:
+            budgets.update({k: int(v) for k, v in json.loads(settings.PROMPT_TOKEN_BUDGETS).items()})
+        except (json.JSONDecodeError, ValueError, AttributeError) as e:
+            logger.error(f"Invalid JSON in PROMPT_TOKEN_BUDGETS: {e}. Using defaults.")
+    return budgets
+
+_BUDGETS = _load_budgets()
+
+def budget_for(node: str) -> int:
+    return _BUDGETS.get(node, DEFAULT_BUDGET)
+
+@dataclass
+class PromptSection:
+    name: str
+    items: List[str]
+    priority: int = 0
+    separator: str = "\n\n"
+    keep: str = "head"                 # "head": drop trailing items, "tail": drop leading items
+    max_item_tokens: Optional[int] = None
+    empty_text: str = ""               # Used when nothing (or nothing that fits) is left
+    item_tokens: Optional[List[int]] = None  # Precomputed counts (e.g. from kb_context_cache)
+
+@dataclass
+class AssembledPrompt:
+    text: str
+    total_tokens: int
+    section_tokens: Dict[str, int] = field(default_factory=dict)
+    truncated: List[str] = field(default_factory=list)
+
+class PromptAssembler:
+    def __init__(self, node: str, budget: Optional[int] = None, model: str = "gpt-4o"):
+        self.node = node
+        self.budget = budget or budget_for(node)
+        self.model = model
+        self.sections: List[PromptSection] = []
+
+    def add(self, name: str, content, priority: int = 0, item_tokens: Optional[List[int]] = None,
+            **kwargs) -> "PromptAssembler":
+        """content: a string (one item) or a list of item strings (item_tokens: their token counts, if known)."""
+        if isinstance(content, str):
+            content = [content]
+        if item_tokens is not None and len(item_tokens) == len(content):
+            pairs = [(c, n) for c, n in zip(content, item_tokens) if c]
+            items, item_tokens = [c for c, _ in pairs], [n for _, n in pairs]
+        else:
+            items, item_tokens = [c for c in content if c], None
+        self.sections.append(PromptSection(name, items, priority, item_tokens=item_tokens, **kwargs))
+        return self
+
+    def assemble(self, template: str, **fixed) -> AssembledPrompt:
+        """Formats template with the fixed values and the budgeted sections."""
+        # The template with empty sections is the part that is never cut
+        base = template.format(**fixed, **{s.name: "" for s in self.sections})
+        base_tokens = count_tokens(base, self.model)
+        remaining = self.budget - base_tokens
+
+        rendered: Dict[str, str] = {}
+        section_tokens: Dict[str, int] = {}
+        truncated: List[str] = []
+        for section in sorted(self.sections, key=lambda s: s.priority):
+            text, used, was_cut = self._fit(section, max(remaining, 0))
+            rendered[section.name] = text or section.empty_text
+            section_tokens[section.name] = used
+            remaining -= used
+            if was_cut:
+                truncated.append(section.name)
+
+        text = template.format(**fixed, **rendered)
+        total = count_tokens(text, self.model)
+        self._report(total, section_tokens, truncated)
+        return AssembledPrompt(text, total, section_tokens, truncated)
+
+    def _fit(self, section: PromptSection, available: int):
+        items = list(section.items)
+        tokens = list(section.item_tokens) if section.item_tokens else [count_tokens(i, self.model) for i in items]
+        was_cut = False
+        if section.max_item_tokens:
+            for idx, n in enumerate(tokens):
+                if n > section.max_item_tokens:
+                    items[idx] = truncate_tokens(items[idx], section.max_item_tokens, self.model)
+                    tokens[idx] = count_tokens(items[idx], self.model)
+                    was_cut = True
+
+        sep_tokens = count_tokens(section.separator, self.model)
+        ordered = list(zip(items, tokens))
+        if section.keep != "head":
+            ordered.reverse()
+        kept: List[str] = []
+        used = 0
+        for item, item_tokens in ordered:
+            cost = item_tokens + (sep_tokens if kept else 0)
+            if used + cost <= available:
+                kept.append(item)
+                used += cost
+                continue
+            # Partial last item (only at the front of the prompt order, i.e. keep="head")
+            room = available - used - (sep_tokens if kept else 0)
+            if section.keep == "head" and room > 20:
+                kept.append(truncate_tokens(item, room, self.model))
+                used = available
+            was_cut = True
+            break
+
+        if section.keep == "tail":
+            kept.reverse()
+        return section.separator.join(kept), used, was_cut
+
+    def _report(self, total: int, section_tokens: Dict[str, int], truncated: List[str]):
+        metrics.observe("prompt_tokens", total, node=self.node)
+        for name, used in section_tokens.items():
+            metrics.observe("prompt_section_tokens", used, node=self.node, section=name)
+        for name in truncated:
+            metrics.incr("prompt_truncations_total", node=self.node, section=name)
+
+        breakdown = ", ".join(f"{k}={v}" for k, v in section_tokens.items())
+        cut = f" ✂️ truncated: {', '.join(truncated)}" if truncated else ""
+        logger.info(f"🧮 {self.node} prompt: {total}/{self.budget} tokens ({breakdown}){cut}")
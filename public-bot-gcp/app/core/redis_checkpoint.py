@@ -0,0 +1,231 @@
+"""
+LangGraph checkpointer on plain Redis (no RedisJSON / RediSearch modules, so it
+runs on Memorystore). Meant for hot conversation state: only the last `keep`
+checkpoints of a thread are kept, and a thread's keys expire `ttl` seconds after
+its last write.
+
+Keys per thread and namespace ({p} = "ckpt:{thread_id}:{checkpoint_ns}"):
+    {p}:ids           sorted set of checkpoint ids (all score 0: ids are uuid6, so
+                      lexicographic order is creation order)
+    {p}:c:{id}        hash: checkpoint (without channel values), metadata, parent, versions
+    {p}:w:{id}        hash: pending writes, "{task_path}|{task_id}|{idx}" -> channel + value
+    {p}:blobs         hash: "{channel}|{version}" -> serialized channel value
+
+Channel values are stored once per version, like the Postgres saver does, so a
+step that only touches `next_step` doesn't rewrite the whole message history.
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+SEP = b"\x00"
+
+def _typed(type_: bytes, data: bytes) -> Tuple[str, bytes]:
+    return type_.decode(), data
+
+class RedisSaver(BaseCheckpointSaver):
+    def __init__(self, client, ttl_seconds: int, keep: int = 2, serde=None):
+        super().__init__(serde=serde)
+        self.redis = client
+        self.ttl_seconds = ttl_seconds
+        self.keep = max(keep, 1)
+
+    # --- Keys ---
+
+    @staticmethod
+    def _prefix(thread_id: str, checkpoint_ns: str) -> str:
+        return f"ckpt:{thread_id}:{checkpoint_ns}"
+
+    def _pack(self, value: Any) -> bytes:
+        type_, data = self.serde.dumps_typed(value)
+        return type_.encode() + SEP + data
+
+    def _unpack(self, raw: bytes) -> Any:
+        type_, data = raw.split(SEP, 1)
+        return self.serde.loads_typed(_typed(type_, data))
+
+    # --- Reads ---
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        prefix = self._prefix(thread_id, checkpoint_ns)
+        checkpoint_id = get_checkpoint_id(config)
+        if not checkpoint_id:
+            latest = await self.redis.zrevrangebylex(f"{prefix}:ids", "+", "-", start=0, num=1)
+            if not latest:
+                return None
+            checkpoint_id = latest[0].decode()
+        return await self._load(thread_id, checkpoint_ns, checkpoint_id)
+
+    async def _load(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> Optional[CheckpointTuple]:
+        prefix = self._prefix(thread_id, checkpoint_ns)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hgetall(f"{prefix}:c:{checkpoint_id}")
+            pipe.hgetall(f"{prefix}:w:{checkpoint_id}")
+            saved, writes = await pipe.execute()
+        if not saved:
+            return None
+
+        checkpoint = self._unpack(saved[b"checkpoint"])
+        versions = checkpoint["channel_versions"]
+        fields = [f"{channel}|{version}" for channel, version in versions.items()]
+        blobs = await self.redis.hmget(f"{prefix}:blobs", fields) if fields else []
+        channel_values = {}
+        for channel, raw in zip(versions, blobs):
+            if raw is None or raw.startswith(b"empty" + SEP):
+                continue
+            channel_values[channel] = self._unpack(raw)
+
+        pending = []
+        for field, raw in writes.items():
+            task_path, task_id, idx = field.decode().rsplit("|", 2)
+            channel, value = raw.split(SEP, 1)
+            pending.append(((task_path, task_id, int(idx)), (task_id, channel.decode(), self._unpack(value))))
+        pending.sort(key=lambda item: item[0])
+
+        parent_id = saved.get(b"parent", b"").decode()
+        return CheckpointTuple(
+            config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+            }},
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self._unpack(saved[b"metadata"]),
+            parent_config={"configurable": {
+                "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent_id,
+            }} if parent_id else None,
+            pending_writes=[write for _, write in pending],
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Newest first. Only the checkpoints still kept; needs a thread_id."""
+        if not config:
+            raise ValueError("RedisSaver.alist needs a thread_id")
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        upper = "+"
+        if before and get_checkpoint_id(before):
+            upper = "(" + get_checkpoint_id(before)
+        ids = await self.redis.zrevrangebylex(f"{self._prefix(thread_id, checkpoint_ns)}:ids", upper, "-")
+        found = 0
+        for raw_id in ids:
+            item = await self._load(thread_id, checkpoint_ns, raw_id.decode())
+            if item is None:
+                continue
+            if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            yield item
+            found += 1
+            if limit is not None and found >= limit:
+                return
+
+    # --- Writes ---
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        prefix = self._prefix(thread_id, checkpoint_ns)
+        checkpoint_id = checkpoint["id"]
+
+        saved = checkpoint.copy()
+        values = saved.pop("channel_values")
+        blobs = {
+            f"{channel}|{version}": self._pack(values[channel]) if channel in values else b"empty" + SEP
+            for channel, version in new_versions.items()
+        }
+        async with self.redis.pipeline(transaction=True) as pipe:
+            if blobs:
+                pipe.hset(f"{prefix}:blobs", mapping=blobs)
+            pipe.hset(f"{prefix}:c:{checkpoint_id}", mapping={
+                "checkpoint": self._pack(saved),
+                "metadata": self._pack(get_checkpoint_metadata(config, metadata)),
+                "parent": config["configurable"].get("checkpoint_id") or "",
+                "versions": json.dumps([f"{c}|{v}" for c, v in saved["channel_versions"].items()]),
+            })
+            pipe.zadd(f"{prefix}:ids", {checkpoint_id: 0})
+            for key in ("blobs", f"c:{checkpoint_id}", "ids"):
+                pipe.expire(f"{prefix}:{key}", self.ttl_seconds)
+            await pipe.execute()
+
+        await self._prune(prefix)
+        return {"configurable": {
+            "thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id,
+        }}
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = f"{self._prefix(thread_id, checkpoint_ns)}:w:{config['configurable']['checkpoint_id']}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                write_idx = WRITES_IDX_MAP.get(channel, idx)
+                field = f"{task_path}|{task_id}|{write_idx}"
+                raw = channel.encode() + SEP + self._pack(value)
+                # Special writes (errors, interrupts) replace; regular ones are written once
+                if write_idx < 0:
+                    pipe.hset(key, field, raw)
+                else:
+                    pipe.hsetnx(key, field, raw)
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def _prune(self, prefix: str):
+        """Drops checkpoints beyond the newest `keep`, their writes, and blobs no kept checkpoint uses."""
+        ids_key = f"{prefix}:ids"
+        old = await self.redis.zrange(ids_key, 0, -(self.keep + 1))
+        if not old:
+            return
+        kept = await self.redis.zrange(ids_key, -self.keep, -1)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for raw_id in kept:
+                pipe.hget(f"{prefix}:c:{raw_id.decode()}", "versions")
+            pipe.hkeys(f"{prefix}:blobs")
+            *kept_versions, blob_fields = await pipe.execute()
+
+        referenced = set()
+        for raw in kept_versions:
+            if raw:
+                referenced.update(json.loads(raw))
+        unused = [f for f in blob_fields if f.decode() not in referenced]
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(ids_key, *old)
+            pipe.delete(*[f"{prefix}:{kind}:{raw_id.decode()}" for raw_id in old for kind in ("c", "w")])
+            if unused:
+                pipe.hdel(f"{prefix}:blobs", *unused)
+            await pipe.execute()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        keys = [key async for key in self.redis.scan_iter(match=f"ckpt:{thread_id}:*", count=500)]
+        if keys:
+            await self.redis.delete(*keys)
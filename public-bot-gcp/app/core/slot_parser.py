@@ -0,0 +1,285 @@
+"""
+Deterministic parser for one-field answers ("2k", "next month", "female", "Indian").
+
+When the generator has just asked for a specific filter, the reply usually
+contains nothing else. parse_slot() reads it without an LLM call, but only when
+the whole message is accounted for: the value plus filler words ("around",
+"I'm", "from", ...). Anything else ("2k but near an MRT", "depends") returns
+None and the message goes through the normal router / LLM extraction.
+"""
+import calendar
+import re
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Filters the parser can fill (the location question stays with the LLM, which
+# normalises area / MRT names)
+SLOT_FIELDS = ("budget_max", "move_in_date", "tenant_gender", "tenant_nationality")
+
+_COMMON_FILLER = {
+    "i", "im", "i'm", "am", "a", "an", "the", "my", "is", "it", "its", "it's", "we", "are", "me",
+    "ok", "okay", "yes", "yeah", "yep", "sure", "hi", "hello", "please", "pls", "thanks", "thank", "you",
+    "just", "only", "so", "um", "hmm", "erm", "actually", "probably", "maybe", "about", "around",
+}
+
+_CLEAN_RE = re.compile(r"[^\w$.,/'\-\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+def _clean(text: str) -> str:
+    text = _CLEAN_RE.sub(" ", (text or "").lower())
+    return _SPACE_RE.sub(" ", text).strip(" .,!")
+
+def _only_filler(text: str, filler: set) -> bool:
+    words = [w.strip(".,-/") for w in text.split()]
+    return all(not w or w in filler or w in _COMMON_FILLER for w in words)
+
+def _consume(pattern: re.Pattern, text: str) -> Tuple[List[re.Match], str]:
+    """All matches of pattern, and the text with them removed."""
+    matches = list(pattern.finditer(text))
+    return matches, pattern.sub(" ", text)
+
+# ---------------------------------------------
+# BUDGET
+# ---------------------------------------------
+
+MIN_BUDGET = 200
+MAX_BUDGET = 50000
+
+_AMOUNT_RE = re.compile(
+    r"(?:s\$|sgd|\$)?\s*(\d{1,3}(?:,\d{3})+|\d+(?:\.\d+)?)\s*(k|thousand)?\s*(?:sgd|dollars?|bucks)?(?!\w)"
+)
+_BUDGET_FILLER = {
+    "budget", "max", "maximum", "below", "under", "within", "up", "to", "upto", "less", "than",
+    "per", "month", "monthly", "a", "pm", "mth", "/month", "/mth", "range", "between", "and", "or", "at", "most",
+    "can", "afford", "willing", "pay", "spend", "rent", "approx", "approximately", "roughly", "ish", "like",
+    "is", "-", "dollars", "sgd",
+}
+
+# Caps spelled as a negated minimum; read as "max" before the lower-bound check
+_NEGATED_MIN_RE = re.compile(r"\b(?:not|no) (?:more than|over|above|exceeding)\b")
+# "more than 2k" is a minimum, not a budget cap: leave it to the LLM
+_LOWER_BOUND_RE = re.compile(
+    r"\b(?:more than|at least|above|over|min|minimum|from|starting|or more|and above|plus)\b|\d\s*k?\s*\+"
+)
+
+def parse_budget(text: str) -> Optional[int]:
+    """'2k' -> 2000, 'around $1,800/month' -> 1800, '1.5k-2k' -> 2000 (upper end of a range)."""
+    lowered = _NEGATED_MIN_RE.sub(" max ", (text or "").lower())
+    if _LOWER_BOUND_RE.search(lowered):
+        return None
+    cleaned = _clean(lowered).replace("/ month", "/month")
+    matches, rest = _consume(_AMOUNT_RE, cleaned)
+    if not matches or not _only_filler(rest, _BUDGET_FILLER):
+        return None
+
+    values = []
+    for m in matches:
+        number = float(m.group(1).replace(",", ""))
+        if m.group(2):
+            number *= 1000
+        elif number < 100:
+            return None  # "2" or "2.5" without a "k" is ambiguous
+        values.append(int(round(number)))
+
+    budget = max(values)
+    return budget if MIN_BUDGET <= budget <= MAX_BUDGET else None
+
+# ---------------------------------------------
+# MOVE-IN DATE
+# ---------------------------------------------
+
+_MONTHS = {
+    "jan": 1, "january": 1, "feb": 2, "february": 2, "mar": 3, "march": 3, "apr": 4, "april": 4,
+    "may": 5, "jun": 6, "june": 6, "jul": 7, "july": 7, "aug": 8, "august": 8, "sep": 9, "sept": 9,
+    "september": 9, "oct": 10, "october": 10, "nov": 11, "november": 11, "dec": 12, "december": 12,
+}
+_MONTH = r"(" + "|".join(sorted(_MONTHS, key=len, reverse=True)) + r")"
+_ORD = r"(?:st|nd|rd|th)?"
+_NUMBER_WORDS = {"a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6}
+
+_DATE_FILLER = {
+    "will", "be", "would", "like", "to", "move", "moving", "move-in", "movein", "in", "planning", "plan",
+    "by", "on", "from", "latest", "earliest", "ideally", "hopefully", "of", "start", "starting", "want",
+    "looking", "at", "sometime", "somewhere", "onwards", "or", "date", "can", "could", "possible",
+    "approximately", "roughly", "ill", "i'll", "need", "room", "place", "there", "before", "this", "year",
+}
+
+def _add_months(d: date, months: int) -> date:
+    month_index = d.month - 1 + months
+    year, month = d.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(d.day, calendar.monthrange(year, month)[1]))
+
+def _last_day(year: int, month: int) -> date:
+    return date(year, month, calendar.monthrange(year, month)[1])
+
+def _upcoming(today: date, month: int, day: Optional[int], year: Optional[str]) -> Optional[date]:
+    """Month/day without a year means the next time that date comes around."""
+    y = int(year) if year else today.year
+    if y < 100:
+        y += 2000
+    try:
+        d = date(y, month, day) if day else (today if (y, month) == (today.year, today.month) else date(y, month, 1))
+    except ValueError:
+        return None
+    if d < today and not year:
+        return _upcoming(today, month, day, str(y + 1))
+    return d
+
+def _part_of_month(today: date, part: Optional[str], month: int, year: Optional[str]) -> Optional[date]:
+    first = _upcoming(today, month, 1, year) if (month, year) != (today.month, None) else date(today.year, month, 1)
+    if not first:
+        return None
+    if part in ("mid", "middle of"):
+        d = first.replace(day=15)
+    elif part in ("end of", "late"):
+        d = _last_day(first.year, first.month)
+    else:
+        d = first
+    # "early June" when it's already June 10 -> today, not last year
+    if d < today:
+        d = _upcoming(today, month, d.day, None) if part else today
+    return d
+
+_RULES: List[Tuple[re.Pattern, Callable[..., Optional[date]]]] = [
+    # 2025-03-01
+    (re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b"),
+     lambda t, m: _upcoming(t, int(m.group(2)), int(m.group(3)), m.group(1))),
+    # 15/3, 15/03/2025 (day first, as written in Singapore)
+    (re.compile(r"\b(\d{1,2})[/.](\d{1,2})(?:[/.](\d{2,4}))?\b"),
+     lambda t, m: _upcoming(t, int(m.group(2)), int(m.group(1)), m.group(3)) if 1 <= int(m.group(2)) <= 12 else None),
+    # 1st March, 1 of march 2025
+    (re.compile(rf"\b(\d{{1,2}}){_ORD}\s+(?:of\s+)?{_MONTH}\b(?:\s+(\d{{4}}))?"),
+     lambda t, m: _upcoming(t, _MONTHS[m.group(2)], int(m.group(1)), m.group(3))),
+    # March 1st, march 1, 2025
+    (re.compile(rf"\b{_MONTH}\s+(\d{{1,2}}){_ORD}\b(?:,?\s+(\d{{4}}))?"),
+     lambda t, m: _upcoming(t, _MONTHS[m.group(1)], int(m.group(2)), m.group(3))),
+    # early / mid / end of March
+    (re.compile(rf"\b(early|beginning of|start of|mid|middle of|end of|late)?\s*{_MONTH}\b(?:\s+(\d{{4}}))?"),
+     lambda t, m: _part_of_month(t, m.group(1) if m.group(1) in ("mid", "middle of", "end of", "late") else None,
+                                 _MONTHS[m.group(2)], m.group(3))),
+    (re.compile(r"\b(?:asap|as soon as possible|immediately|right away|now|today)\b"),
+     lambda t, m: t),
+    (re.compile(r"\btomorrow\b"), lambda t, m: t + timedelta(days=1)),
+    (re.compile(r"\bnext week\b"), lambda t, m: t + timedelta(days=7)),
+    (re.compile(r"\bend of (?:this |the )?month\b"), lambda t, m: _last_day(t.year, t.month)),
+    (re.compile(r"\bthis month\b"), lambda t, m: t),
+    (re.compile(r"\b(early |beginning of |start of |mid |middle of |end of |late )?next month\b"),
+     lambda t, m: _part_of_month(t, (m.group(1) or "").strip() or None, _add_months(t, 1).month,
+                                 str(_add_months(t, 1).year))),
+    (re.compile(r"\bin (\d+|a|an|one|two|three|four|five|six) (day|week|month)s?(?: time)?\b"),
+     lambda t, m: _in_period(t, m.group(1), m.group(2))),
+]
+
+def _in_period(today: date, amount: str, unit: str) -> date:
+    n = int(amount) if amount.isdigit() else _NUMBER_WORDS[amount]
+    if unit == "day":
+        return today + timedelta(days=n)
+    if unit == "week":
+        return today + timedelta(weeks=n)
+    return _add_months(today, n)
+
+def parse_move_in_date(text: str, today: Optional[date] = None) -> Optional[str]:
+    """'next month' -> first of next month, 'mid march' -> YYYY-03-15, '15/3' -> YYYY-03-15. ISO string."""
+    today = today or datetime.now().date()
+    cleaned = _clean(text)
+    for pattern, resolve in _RULES:
+        matches, rest = _consume(pattern, cleaned)
+        if len(matches) != 1:
+            continue
+        if not _only_filler(rest, _DATE_FILLER):
+            return None
+        d = resolve(today, matches[0])
+        return d.isoformat() if d and d >= today else None
+    return None
+
+# ---------------------------------------------
+# GENDER
+# ---------------------------------------------
+
+_GENDERS = {
+    "Male": {"male", "m", "man", "guy", "boy", "gentleman", "dude", "he", "him", "mr"},
+    "Female": {"female", "f", "woman", "girl", "lady", "she", "her", "ms", "mrs", "miss"},
+    "Couple": {"couple", "wife", "husband", "partner", "girlfriend", "boyfriend", "spouse", "married"},
+}
+_GENDER_FILLER = {"and", "single", "myself", "gender", "both", "of", "us", "with", "will", "be", "staying", "living"}
+
+def parse_gender(text: str) -> Optional[str]:
+    words = [w.strip(".,-/") for w in _clean(text).split()]
+    found = {label for label, synonyms in _GENDERS.items() for w in words if w in synonyms}
+    rest = " ".join(w for w in words if not any(w in s for s in _GENDERS.values()))
+    if not _only_filler(rest, _GENDER_FILLER):
+        return None
+    if "Couple" in found:
+        return "Couple"  # "me and my wife"
+    return found.pop() if len(found) == 1 else None
+
+# ---------------------------------------------
+# NATIONALITY
+# ---------------------------------------------
+
+_NATIONALITIES = {
+    "Singaporean": ["singaporean", "singapore", "sg", "singapore citizen"],
+    "Malaysian": ["malaysian", "malaysia"],
+    "Indian": ["indian", "india"],
+    "Chinese": ["chinese", "china", "prc"],
+    "Filipino": ["filipino", "filipina", "philippines", "pinoy", "pinay"],
+    "Indonesian": ["indonesian", "indonesia"],
+    "Vietnamese": ["vietnamese", "vietnam"],
+    "Thai": ["thai", "thailand"],
+    "Burmese": ["burmese", "myanmar"],
+    "Bangladeshi": ["bangladeshi", "bangladesh"],
+    "Sri Lankan": ["sri lankan", "sri lanka"],
+    "Pakistani": ["pakistani", "pakistan"],
+    "Nepali": ["nepali", "nepalese", "nepal"],
+    "Korean": ["korean", "korea", "south korea", "south korean"],
+    "Japanese": ["japanese", "japan"],
+    "Taiwanese": ["taiwanese", "taiwan"],
+    "Hong Konger": ["hong konger", "hongkonger", "hong kong", "hk"],
+    "American": ["american", "usa", "united states"],
+    "British": ["british", "uk", "english", "united kingdom", "england"],
+    "Australian": ["australian", "australia", "aussie"],
+    "Canadian": ["canadian", "canada"],
+    "New Zealander": ["new zealander", "new zealand", "kiwi"],
+    "French": ["french", "france"],
+    "German": ["german", "germany"],
+    "Italian": ["italian", "italy"],
+    "Spanish": ["spanish", "spain"],
+    "Dutch": ["dutch", "netherlands", "holland"],
+    "Russian": ["russian", "russia"],
+}
+_NATIONALITY_FILLER = {"from", "nationality", "citizen", "citizenship", "passport", "holder", "national",
+                       "originally", "both", "of", "us", "country", "come", "comes", "am"}
+# Longest names first so "sri lanka" wins over a bare "sri"
+_NATIONALITY_RE = re.compile(
+    r"\b(" + "|".join(re.escape(a) for a in sorted(
+        (alias for aliases in _NATIONALITIES.values() for alias in aliases), key=len, reverse=True
+    )) + r")\b"
+)
+_NATIONALITY_BY_ALIAS = {alias: label for label, aliases in _NATIONALITIES.items() for alias in aliases}
+
+def parse_nationality(text: str) -> Optional[str]:
+    matches, rest = _consume(_NATIONALITY_RE, _clean(text))
+    labels = {_NATIONALITY_BY_ALIAS[m.group(1)] for m in matches}
+    if len(labels) != 1 or not _only_filler(rest, _NATIONALITY_FILLER):
+        return None
+    return labels.pop()
+
+# ---------------------------------------------
+# ENTRY POINT
+# ---------------------------------------------
+
+_PARSERS: Dict[str, Callable[[str], Any]] = {
+    "budget_max": parse_budget,
+    "move_in_date": parse_move_in_date,
+    "tenant_gender": parse_gender,
+    "tenant_nationality": parse_nationality,
+}
+
+MAX_ANSWER_CHARS = 60
+
+def parse_slot(field: Optional[str], text: str) -> Optional[Any]:
+    """Value for `field` if the message is a confident, self-contained answer to it; else None."""
+    parser = _PARSERS.get(field or "")
+    if not parser or not text or len(text) > MAX_ANSWER_CHARS:
+        return None
+    return parser(text)
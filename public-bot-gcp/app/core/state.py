@@ -1,6 +1,7 @@
 from typing import TypedDict, Annotated, List, Optional, Dict, Any
 from langgraph.graph.message import add_messages
 from app.schemas.property_search import PropertySearchFilters
+from app.schemas.property_card import PropertyCard
 
 def replace_value(existing, new):
     if new is None:
@@ -9,7 +10,9 @@ def replace_value(existing, new):
 
 class AgentState(TypedDict):
     # 1. Chat History
-    messages: Annotated[List, add_messages]
+    messages: Annotated[List, add_messages]  # Recent window only, once compacted (app/core/memory_manager.py)
+    conversation_summary: Optional[str]  # Running summary of the messages folded out of the window
+    compacted_messages: Optional[int]    # How many messages the summary covers
     
     # 2. The "Form" we are filling out
     filters: Optional[PropertySearchFilters]
@@ -26,18 +29,24 @@ class AgentState(TypedDict):
     next_step: Optional[str]
     target_table: Optional[str]
     clarification_question: Optional[str]
+    router_intent: Optional[Dict[str, Any]]  # {"intent", "source": rule/classifier/llm, ...} for the chat log
+    prefetched_extraction: Optional[Dict[str, Any]]  # {"flow": SEARCH/APPOINTMENT, "delta": {...}} from the fused router call
+    filter_updates: Optional[Dict[str, Any]]  # Filters the extractor changed this turn (generator acknowledgement)
+    pending_slot: Optional[str]  # Filter the generator just asked for (e.g. "budget_max"); valid for the next turn only
     
     # --- CRITICAL MISSING FIELD ---
     active_flow: Optional[str] # <--- ADD THIS ("APPOINTMENT", "SEARCH", etc.)
 
     # 5. Search Results
-    found_properties: Optional[List[Dict[str, Any]]]
+    found_properties: Optional[List[PropertyCard]]  # Full rows: property_details cache
     shown_count: Optional[int]
     last_extraction_was_empty: Optional[bool]
     validation_error: Optional[str]
+    relaxation_offer: Optional[Dict[str, Any]]   # Best single-filter relaxation after a zero-result search
+    active_relaxation: Optional[Dict[str, Any]]  # Offer the user accepted; applied to the next search only
 
     # 6. Appointment Data
-    selected_property: Optional[Dict[str, Any]] 
+    selected_property: Optional[PropertyCard]
     appointment_state: Optional[Dict[str, Any]] 
     available_slots: Optional[str]
 
@@ -23,7 +23,9 @@ class AgentRepository:
                     Agent.bio,                   # Needed for AI Prompt
                     Agent.registration_no,       # Needed for AI Prompt
                     Agent.whatsapp_access_token, # Needed to reply
-                    Agent.whatsapp_phone_number_id
+                    Agent.whatsapp_phone_number_id,
+                    Agent.tokens_available,      # Needed for the token quota check
+                    Agent.current_plan
                 )
             )
         )
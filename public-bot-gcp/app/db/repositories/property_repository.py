@@ -0,0 +1,113 @@
+from functools import lru_cache
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.schemas.inventory import InventorySummary
+from app.services.search_verticals import VERTICALS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Tables that share the co-living column layout (gender_preference, room_type, ...)
+FACET_TABLES = ["coliving_property", "rooms_for_rent"]
+
+# Width of one rent histogram bucket (SGD)
+RENT_BUCKET_SIZE = 500
+
+# One round trip: every facet is a grouping set over the same filtered scan.
+# There is no 'environment' column, so the environment facet is derived from
+# gender_preference with the search's own env_* predicates and base conditions
+# (filled in from the vertical registry): a listing is only counted as e.g.
+# female stock if an environment=female search returns it. Listings no
+# environment search matches are left out of the facet.
+FACET_SUMMARY_SQL = """
+    SELECT
+        CASE
+            WHEN GROUPING(env) = 0 THEN 'environment'
+            WHEN GROUPING(gender_pref) = 0 THEN 'gender_preference'
+            WHEN GROUPING(room) = 0 THEN 'room_type'
+            WHEN GROUPING(rent_bucket) = 0 THEN 'rent_bucket'
+            WHEN GROUPING(district) = 0 THEN 'district'
+            WHEN GROUPING(mrt) = 0 THEN 'mrt'
+            ELSE 'total'
+        END AS facet,
+        COALESCE(env, gender_pref, room, rent_bucket::text, district, mrt) AS value,
+        COUNT(*) AS n,
+        MIN(monthly_rent) AS min_rent,
+        MAX(monthly_rent) AS max_rent
+    FROM (
+        SELECT
+            CASE
+                WHEN {env_female} THEN 'female'
+                WHEN {env_male} THEN 'male'
+                WHEN {env_mixed} THEN 'mixed'
+            END AS env,
+            LOWER(COALESCE(NULLIF(TRIM(p.gender_preference), ''), 'any')) AS gender_pref,
+            COALESCE(NULLIF(TRIM(p.room_type), ''), 'Unspecified') AS room,
+            (p.monthly_rent / :bucket) * :bucket AS rent_bucket,
+            NULLIF(TRIM(p.district), '') AS district,
+            NULLIF(TRIM(p.nearest_mrt), '') AS mrt,
+            p.monthly_rent
+        FROM {table_name} p
+        WHERE p.agent_id = :agent_id
+        {base_conditions}
+    ) f
+    GROUP BY GROUPING SETS ((env), (gender_pref), (room), (rent_bucket), (district), (mrt), ())
+"""
+
+@lru_cache(maxsize=None)
+def facet_summary_sql(table_name: str) -> str:
+    vertical = VERTICALS[table_name]
+    return FACET_SUMMARY_SQL.format(
+        table_name=vertical.table,
+        env_female=vertical.predicates["env_female"],
+        env_male=vertical.predicates["env_male"],
+        env_mixed=vertical.predicates["env_mixed"],
+        base_conditions="\n        ".join(f"AND {cond}" for cond in vertical.base_conditions),
+    )
+
+class PropertyRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_facet_summary(self, agent_id: str, table_name: str):
+        """
+        Aggregates every inventory facet for one agent in a single query.
+        Returns None if the table is not supported or the query fails.
+        """
+        if table_name not in FACET_TABLES:
+            return None
+
+        query = text(facet_summary_sql(table_name))
+
+        try:
+            result = await self.db.execute(query, {"agent_id": agent_id, "bucket": RENT_BUCKET_SIZE})
+            rows = result.mappings().all()
+        except Exception as e:
+            logger.error(f"Facet summary query failed for {table_name} / {agent_id}: {e}")
+            return None
+
+        summary = InventorySummary(agent_id=agent_id, table_name=table_name)
+        facet_fields = {
+            "environment": summary.environments,
+            "gender_preference": summary.gender_preferences,
+            "room_type": summary.room_types,
+            "district": summary.districts,
+            "mrt": summary.mrts,
+        }
+
+        for row in rows:
+            facet, value, count = row["facet"], row["value"], int(row["n"])
+
+            if facet == "total":
+                summary.total = count
+                summary.min_rent = row["min_rent"]
+                summary.max_rent = row["max_rent"]
+            elif value is None:
+                # NULL district / MRT / rent -> nothing useful to report
+                continue
+            elif facet == "rent_bucket":
+                summary.rent_histogram[int(value)] = count
+            else:
+                facet_fields[facet][value] = count
+
+        return summary
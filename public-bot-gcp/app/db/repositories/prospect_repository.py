@@ -128,4 +128,30 @@ class ProspectRepository:
             
         except Exception as e:
             logger.error(f"Error updating real email: {e}")
-            await self.db.rollback()
\ No newline at end of file
+            await self.db.rollback()
+
+    async def update_chat_summary(self, agent_id: str, user_id: str, email: str, summary: str) -> int:
+        """
+        Stores the booking chat summary. Matches on the phone-based user_id or the
+        (real or placeholder) email. Returns the number of rows updated; raises on
+        DB errors so background callers can retry.
+        """
+        query = text("""
+            UPDATE prospect_info
+            SET chat_summary = :summary, last_interaction = NOW()
+            WHERE agent_id = :agent_id
+              AND (user_id = :user_id OR email = :email OR email = :dummy_email)
+        """)
+        try:
+            result = await self.db.execute(query, {
+                "summary": summary,
+                "agent_id": agent_id,
+                "user_id": user_id,
+                "email": email,
+                "dummy_email": f"{user_id}@whatsapp.user",
+            })
+            await self.db.commit()
+            return result.rowcount
+        except Exception:
+            await self.db.rollback()
+            raise
@@ -0,0 +1,58 @@
+# app/db/triggers.py
+from sqlalchemy import text
+from app.db.session import engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Channel -> tables whose row changes are broadcast on it.
+# Every table listed here must have an 'agent_id' column.
+CHANGE_CHANNELS = {
+    "listing_changes": ["coliving_property", "rooms_for_rent"],
+    "kb_changes": ["knowledge_base_faqs", "knowledge_base_documents"],
+}
+
+# Generic NOTIFY function: sends {"table", "op", "agent_id"} on the channel passed as trigger argument.
+NOTIFY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION notify_agent_change() RETURNS trigger AS $$
+DECLARE
+    changed_agent TEXT;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        changed_agent := OLD.agent_id;
+    ELSE
+        changed_agent := NEW.agent_id;
+    END IF;
+
+    PERFORM pg_notify(
+        TG_ARGV[0],
+        json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'agent_id', changed_agent)::text
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+async def install_change_triggers():
+    """
+    Idempotently installs the NOTIFY triggers used by the ChangeListener.
+    Tables that don't exist in this database are skipped.
+    """
+    async with engine.begin() as conn:
+        await conn.execute(text(NOTIFY_FUNCTION_SQL))
+
+        for channel, tables in CHANGE_CHANNELS.items():
+            for table in tables:
+                exists = await conn.execute(text("SELECT to_regclass(:t)"), {"t": table})
+                if not exists.scalar():
+                    logger.warning(f"Skipping change trigger for missing table '{table}'")
+                    continue
+
+                trigger_name = f"{table}_{channel}_notify"
+                await conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name} ON {table}"))
+                await conn.execute(text(f"""
+                    CREATE TRIGGER {trigger_name}
+                    AFTER INSERT OR UPDATE OR DELETE ON {table}
+                    FOR EACH ROW EXECUTE FUNCTION notify_agent_change('{channel}')
+                """))
+                logger.info(f"🔔 Installed change trigger {trigger_name}")
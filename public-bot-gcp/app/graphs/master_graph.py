@@ -14,6 +14,7 @@ from app.graphs.nodes.display_results import display_results_node
 from app.graphs.nodes.clear_memory import clear_memory_node
 from app.graphs.nodes.appointment_manager import appointment_manager_node
 from app.graphs.nodes.human_handoff import human_handoff_node
+from app.core.memory_manager import COMPACTION_NODE
 
 # --- HELPER NODE: CLARIFICATION ---
 async def clarification_node(state: AgentState):
@@ -39,6 +40,9 @@ workflow.add_node("display_results", display_results_node)
 workflow.add_node("appointment_manager", appointment_manager_node)
 workflow.add_node("human_handoff", human_handoff_node)
 
+# Memory compaction writes its state updates as this node (memory_manager); never routed to
+workflow.add_node(COMPACTION_NODE, lambda state: {})
+
 # 2. Set Entry Point
 workflow.set_entry_point("router")
 
@@ -151,6 +155,7 @@ workflow.add_edge("clarification", END)
 workflow.add_edge("intelligent_chat", END)
 workflow.add_edge("appointment_manager", END)
 workflow.add_edge("human_handoff", END)
+workflow.add_edge(COMPACTION_NODE, END)
 
 # --- COMPILE FUNCTION ---
 def get_master_graph(checkpointer):
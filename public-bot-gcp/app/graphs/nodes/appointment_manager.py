@@ -2,7 +2,10 @@ from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
 from app.services.n8n_client import N8NClient
-from app.services.openai_service import OpenAIService
+from app.services.booking_summary import booking_summary_jobs
+from app.core.memory_manager import with_summary
+from app.schemas.property_card import as_card, as_cards
+from app.services.search_verticals import get_vertical
 import json
 import logging
 import re
@@ -33,9 +36,10 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
     last_lower = last_message.lower()
     
     # --- 1. IDENTIFY PROPERTY ---
-    found_props = state.get("found_properties") or []
+    vertical = get_vertical(state.get("target_table"))
+    found_props = as_cards(state.get("found_properties"), vertical)
     selected_prop_name = appt.get("property_reference")
-    target_property = state.get("selected_property") 
+    target_property = as_card(state.get("selected_property"), vertical)
     
     # Only try to identify if not already selected
     if not target_property:
@@ -65,7 +69,7 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
             # CASE C: Name Matching (Fuzzy)
             if not target_property:
                 for p in found_props:
-                    p_name = p.get("property_name", "").lower()
+                    p_name = (p.name or "").lower()
                     if p_name in last_lower or last_lower in p_name:
                         target_property = p
                         break
@@ -73,7 +77,7 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
             # CASE D: Room Number Matching
             if not target_property:
                 for p in found_props:
-                    r_num = str(p.get("room_number", "")).lower()
+                    r_num = (p.unit_ref or "").lower()
                     if r_num and r_num in last_lower:
                         target_property = p
                         break
@@ -93,7 +97,7 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
     if not appt.get("email"):
         return {
             **state_update,
-            "messages": [AIMessage(content=f"Awesome choice! 🎉 To lock in a viewing for **{target_property.get('property_name')}**, could you share your email with me?")]
+            "messages": [AIMessage(content=f"Awesome choice! 🎉 To lock in a viewing for **{target_property.name}**, could you share your email with me?")]
         }
 
     if not appt.get("pass_type"):
@@ -206,25 +210,17 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
     filter_dict = filters.model_dump() if filters else {}
     def get_f(k): return filter_dict.get(k, "-")
 
-    # Summary
-    llm = OpenAIService().client
-    chat_summary = f"User {state.get('user_name')} booked {target_property.get('property_name')}."
-    try:
-        history_str = "\n".join([f"{m.type}: {m.content}" for m in state["messages"][-10:]])
-        summary_res = await llm.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "system", "content": SUMMARY_PROMPT.format(
-                user_name=state.get("user_name"),
-                property_name=target_property.get("property_name"),
-                viewing_type=appt.get("viewing_type"),
-                filters=json.dumps(filter_dict, default=str),
-                history=history_str
-            )}],
-            temperature=0.5
-        )
-        chat_summary = summary_res.choices[0].message.content
-    except:
-        pass
+    # Summary: written in the background once the slot is reserved (booking_summary_jobs).
+    # n8n gets a one-line placeholder now; the full summary is attached afterwards.
+    chat_summary = f"User {state.get('user_name')} booked {target_property.name}."
+    history_str = with_summary(state, "\n".join([f"{m.type}: {m.content}" for m in state["messages"][-10:]]))
+    summary_prompt = SUMMARY_PROMPT.format(
+        user_name=state.get("user_name"),
+        property_name=target_property.name,
+        viewing_type=appt.get("viewing_type"),
+        filters=json.dumps(filter_dict, default=str),
+        history=history_str
+    )
 
     # Payload
     payload = [{
@@ -232,10 +228,10 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
         "name": state.get("user_name"),
         "clientgender": get_f("tenant_gender"),
         "clientnationality": get_f("tenant_nationality"),
-        "property": target_property.get("property_name"),
-        "property_address": target_property.get("property_address"),
-        "roomnumber": target_property.get("room_number", "N/A"),
-        "monthly_rent": target_property.get("monthly_rent"),
+        "property": target_property.name,
+        "property_address": target_property.address,
+        "roomnumber": target_property.unit_ref or "N/A",
+        "monthly_rent": target_property.price,
         "session_id": state["user_mobile"],
         "email": appt["email"],
         "userpass": appt["pass_type"],
@@ -251,6 +247,21 @@ async def appointment_manager_node(state: AgentState, config: RunnableConfig):
     success = await n8n.schedule_appointment(payload)
 
     if success:
+        booking_summary_jobs.submit({
+            "agent_id": state["agent_id"],
+            "user_id": state["user_mobile"],
+            "email": appt["email"],
+            "prompt": summary_prompt,
+            "fallback_summary": chat_summary,
+            "booking": {
+                "agent_id": state["agent_id"],
+                "session_id": state["user_mobile"],
+                "email": appt["email"],
+                "property": target_property.name,
+                "appointment_date": clean_date,
+                "time": clean_time,
+            },
+        })
         return {
             "messages": [AIMessage(content=f"✅ **Appointment Confirmed!**\n\n**Date:** {clean_date}\n**Time:** {clean_time}\n\nYou will receive a confirmation email shortly at {appt['email']}. Is there anything else I can help you with?")],
             "active_flow": None,
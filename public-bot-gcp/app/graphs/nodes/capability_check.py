@@ -1,6 +1,7 @@
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
+from app.services.search_verticals import VERTICALS, is_enabled
 from sqlalchemy import text
 
 async def capability_check_node(state: AgentState, config: RunnableConfig):
@@ -12,28 +13,19 @@ async def capability_check_node(state: AgentState, config: RunnableConfig):
     agent_id = state["agent_id"]
     target_table = state["target_table"]
     
-    # 1. Map Table Names to DB Columns & Human Friendly Names
+    # 1. Map Table Names to DB Columns & Human Friendly Names (from the vertical registry)
     # Key: Table Name (from Router)
     # Value: (DB Column Name, Readable Name)
     service_map = {
-        "coliving_property": ("co_living_property", "Co-living Spaces"),
-        "rooms_for_rent": ("rooms_for_rent", "Standard Rooms"),
-        "residential_properties_for_rent": ("residential_property_rent", "Whole Unit Rentals"),
-        "residential_properties_for_resale": ("residential_property_resale", "Residential Sales"),
-        "residential_properties_for_sale_by_developers": ("residential_property_developer", "New Launch Residential"),
-        "commercial_properties_for_rent": ("commercial_property_rent", "Commercial Rentals"),
-        "commercial_properties_for_resale": ("commercial_property_resale", "Commercial Sales"),
-        "commercial_properties_for_sale_by_developers": ("commercial_property_developer", "New Launch Commercial")
+        table: (vertical.capability_column, vertical.label)
+        for table, vertical in VERTICALS.items()
     }
     
     # Get target details
-    target_info = service_map.get(target_table)
-    
-    if not target_info:
-        # Fallback for unknown tables
+    if not target_table:
         return {"next_step": "GENERAL"}
-
-    target_column, target_human_name = target_info
+    # Unknown tables are rejected like a vertical the agent doesn't offer (never searched as co-living)
+    target_column, target_human_name = service_map.get(target_table, (None, "that type of property"))
 
     # 2. Query ALL capability columns for this agent at once
     # We construct the SELECT statement dynamically
@@ -48,7 +40,8 @@ async def capability_check_node(state: AgentState, config: RunnableConfig):
         return {"next_step": "GENERAL"} 
 
     # 3. Check if the specific requested feature is enabled
-    is_allowed = agent_row.get(target_column)
+    # (for the agent, and for search: see SEARCH_VERTICALS)
+    is_allowed = target_column and agent_row.get(target_column) and is_enabled(target_table)
     
     if is_allowed:
         # Success! Proceed to extraction
@@ -58,7 +51,7 @@ async def capability_check_node(state: AgentState, config: RunnableConfig):
     # Find what they CAN do
     available_services = []
     for table_key, (col_name, human_name) in service_map.items():
-        if agent_row.get(col_name):
+        if agent_row.get(col_name) and is_enabled(table_key):
             available_services.append(human_name)
             
     if available_services:
@@ -17,5 +17,7 @@ async def clear_memory_node(state: AgentState, config: RunnableConfig):
     # The 'target_table' was already updated by the Router before reaching here.
     return {
         "filters": None, 
+        "relaxation_offer": None,
+        "active_relaxation": None,
         "next_step": "CHECK_CAPABILITY" # Proceed to verify if agent handles the new request
     }
\ No newline at end of file
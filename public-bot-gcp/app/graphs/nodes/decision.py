@@ -1,10 +1,30 @@
 from app.core.state import AgentState
+from app.services.search_verticals import get_vertical
+
+# Question step for each filter a vertical can require (asked in this order)
+ASK_STEPS = {
+    "location_query": "ask_location",
+    "budget_max": "ask_budget",
+    "move_in_date": "ask_date",
+    "tenant_gender": "ask_gender",
+    "tenant_nationality": "ask_nationality",
+}
+
+POSITIVE_KEYWORDS = ["yes", "show", "more", "next", "okay", "sure", "go ahead", "yup","yeah","yea","please"]
 
 def decision_node(state: AgentState):
     """
     Traffic Cop Logic:
     Checks the 'filters' state to decide what to do next.
     """
+    update = _decide(state)
+
+    # A relaxation offer is only valid for the turn right after it was made
+    if state.get("relaxation_offer") and "relaxation_offer" not in update:
+        update["relaxation_offer"] = None
+    return update
+
+def _decide(state: AgentState):
     filters = state.get("filters")
     inv_status = state.get("inventory_check_status")
 
@@ -14,30 +34,26 @@ def decision_node(state: AgentState):
     if inv_status == "PENDING":
         return {"next_step": "check_inventory"}
 
+    # User accepted the zero-result relaxation we offered -> search again with it
+    offer = state.get("relaxation_offer")
+    if offer:
+        last_msg = state["messages"][-1].content.lower()
+        if any(w in last_msg for w in POSITIVE_KEYWORDS):
+            return {"next_step": "execute_search", "active_relaxation": offer, "relaxation_offer": None}
+
     if props and shown < len(props):
         last_msg = state["messages"][-1].content.lower()
-        positive_keywords = ["yes", "show", "more", "next", "okay", "sure", "go ahead", "yup","yeah","yea","please"]
         
         # If user says "Yes/More", go to display node
-        if any(w in last_msg for w in positive_keywords):
+        if any(w in last_msg for w in POSITIVE_KEYWORDS):
             return {"next_step": "display_results"}
         
-    # --- PRIORITY 1: CRITICAL SEARCH FIELDS ---
-    if not filters.location_query:
-        return {"next_step": "ask_location"}
-    
-    if not filters.budget_max:
-        return {"next_step": "ask_budget"}
-    
-    if not filters.move_in_date:
-        return {"next_step": "ask_date"}
-
-    # --- PRIORITY 2: ESSENTIAL DEMOGRAPHICS ---
-    if not filters.tenant_gender:
-        return {"next_step": "ask_gender"}
-
-    if not filters.tenant_nationality:
-        return {"next_step": "ask_nationality"}
+    # --- REQUIRED FIELDS (Search criteria first, then demographics) ---
+    # Which fields are mandatory depends on the vertical (no gender question for resale)
+    required = get_vertical(state.get("target_table")).required_filters
+    for field, step in ASK_STEPS.items():
+        if field in required and not getattr(filters, field):
+            return {"next_step": step}
 
     # --- IF ALL FIELDS ARE PRESENT ---
     return {"next_step": "execute_search"}
\ No newline at end of file
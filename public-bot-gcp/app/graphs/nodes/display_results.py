@@ -1,14 +1,16 @@
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
-import json
+from app.services.search_verticals import get_vertical
+from app.schemas.property_card import as_cards
 
 async def display_results_node(state: AgentState, config: RunnableConfig):
     """
     Formats and displays properties in batches of 3.
     Now includes Description, Room Number, and Image Link.
     """
-    properties = state.get("found_properties") or []
+    vertical = get_vertical(state.get("target_table"))
+    properties = as_cards(state.get("found_properties"), vertical)
     start_idx = state.get("shown_count", 0)
     batch_size = 3
     
@@ -25,8 +27,18 @@ async def display_results_node(state: AgentState, config: RunnableConfig):
         msg = (
             f"I searched based on your criteria (Location: {loc}, "
             f"Budget: ${bud}), but I couldn't find any exact matches nearby.\n\n"
-            "Would you like to try a different location or adjust your budget?"
         )
+
+        # Offer the single change that unblocks the most listings (computed by search_node)
+        offer = state.get("relaxation_offer")
+        if offer:
+            msg += (
+                f"Good news though: if you can {offer['label']}, I have "
+                f"*{offer['count']}* option{'s' if offer['count'] != 1 else ''} for you. "
+                "Should I show them?"
+            )
+        else:
+            msg += "Would you like to try a different location or adjust your budget?"
         return {
             "messages": [AIMessage(content=msg)],
             "next_step": "complete"
@@ -48,45 +60,23 @@ async def display_results_node(state: AgentState, config: RunnableConfig):
         msg = "Here are a few more options:\n\n"
 
     for p in current_batch:
-        # 1. Extract Basic Info
-        name = p.get('property_name') or "Coliving Unit"
-        rent = p.get('monthly_rent') or "N/A"
-        rtype = p.get('room_type') or "Room"
-        mrt = p.get('nearest_mrt') or "nearby transport"
-        room_no = p.get('room_number') or ""
-        desc = p.get('description') or ""
-        
-        # 2. Parse Media (Get the first image)
-        media_str = p.get('media')
-        image_url = ""
-        if media_str:
-            try:
-                # If it's a JSON string list '["url1", "url2"]'
-                if isinstance(media_str, str) and media_str.startswith('['):
-                    media_list = json.loads(media_str)
-                    if media_list and isinstance(media_list, list):
-                        image_url = media_list[0]
-                # If it's just a string URL
-                elif isinstance(media_str, str):
-                    image_url = media_str
-                # If it's already a list
-                elif isinstance(media_str, list) and media_str:
-                    image_url = media_str[0]
-            except Exception:
-                pass # Fallback to no image if parsing fails
+        # 1. Basic Info (the card was built from the vertical's card columns by search_node)
+        name = p.name or vertical.default_name
+        rent = p.price or "N/A"
+        rtype = p.subtitle or "Room"
+        mrt = p.location or "nearby transport"
+        room_no = p.unit_ref or ""
 
-        # 3. Format the Message Card
+        # 2. Format the Message Card (description already cut to ~100 chars, first image only)
         msg += f"🏠 *{name}* {f'(Room {room_no})' if room_no else ''}\n"
-        msg += f"💰 ${rent}/mo | 🛏 {rtype}\n"
+        msg += f"💰 ${rent}{vertical.price_suffix} | 🛏 {rtype}\n"
         msg += f"📍 Near {mrt}\n"
         
-        if desc:
-            # Truncate description to ~100 chars to keep WhatsApp message clean
-            short_desc = (desc[:100] + '...') if len(desc) > 100 else desc
-            msg += f"📝 _{short_desc}_\n"
+        if p.description:
+            msg += f"📝 _{p.description}_\n"
             
-        if image_url:
-            msg += f"🖼 {image_url}\n"
+        if p.image:
+            msg += f"🖼 {p.image}\n"
         
         msg += "\n" + "-"*20 + "\n" # Separator
 
@@ -3,7 +3,10 @@ from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
 from app.schemas.property_search import PropertySearchFilters
 from app.schemas.appointment import AppointmentInfo
-from app.services.openai_service import OpenAIService
+from app.services.openai_service import get_llm
+from app.services.llm_gateway import llm_gateway, function_args, ValidationFailed
+from app.core.prompt_budget import truncate_tokens
+from app.core.memory_manager import with_summary
 from app.db.repositories.prospect_repository import ProspectRepository
 from datetime import datetime
 import logging
@@ -15,6 +18,23 @@ logger = logging.getLogger(__name__)
 # PROMPTS
 # ---------------------------------------------
 
+# Shared with the fused router prompt (router.py), which extracts in the same call
+SEARCH_EXTRACTION_RULES = """1. Analyze recent history for updates.
+2. Gender: If user says female-only → extract female. If male-only → extract male.
+3. Date Parsing: Convert month names to future dates (e.g., "January" from Nov 2025 = Jan 2026).
+4. Update only fields explicitly mentioned.
+5. Budget: Convert "2k", "2 grand" to 2000."""
+
+APPOINTMENT_EXTRACTION_RULES = """Extract the following fields:
+- email: User's email address
+- pass_type: Type of pass (EP, SP, Student, Citizen, etc.)
+- lease_months: Lease duration in months (convert "1 year" → "12", "6 months" → "6")
+- viewing_type: "In-Person" or "Virtual"
+- time_preference: "Morning", "After Lunch", or "After Work" (extract from user's message)
+- selected_slot: If user selects a specific time slot, extract it
+
+Only include fields that are explicitly mentioned by the user."""
+
 SEARCH_EXTRACTOR_PROMPT = """
 You are an expert data extractor for a Real Estate Bot.
 Your job is to update the PropertySearchFilters based on the conversation history.
@@ -25,12 +45,7 @@ You must output your response in valid JSON format.
 - Current Filters: {current_filters}
 
 ### INSTRUCTIONS
-1. Analyze recent history for updates.
-2. Gender: If user says female-only → extract female. If male-only → extract male.
-3. Date Parsing: Convert month names to future dates (e.g., "January" from Nov 2025 = Jan 2026).
-4. Update only fields explicitly mentioned.
-5. Budget: Convert "2k", "2 grand" to 2000.
-"""
+""" + SEARCH_EXTRACTION_RULES + "\n"
 
 APPOINTMENT_EXTRACTOR_PROMPT = """
 You are an expert appointment extractor.
@@ -40,79 +55,242 @@ Output valid JSON only.
 - Current Data: {current_data}
 
 ### INSTRUCTIONS
-Extract the following fields:
-- email: User's email address
-- pass_type: Type of pass (EP, SP, Student, Citizen, etc.)
-- lease_months: Lease duration in months (convert "1 year" → "12", "6 months" → "6")
-- viewing_type: "In-Person" or "Virtual"
-- time_preference: "Morning", "After Lunch", or "After Work" (extract from user's message)
-- selected_slot: If user selects a specific time slot, extract it
-
-Only include fields that are explicitly mentioned by the user.
-"""
+""" + APPOINTMENT_EXTRACTION_RULES + "\n"
 
 # ---------------------------------------------
-# MAIN FUNCTION
+# 1. LLM EXTRACTION (deltas only)
 # ---------------------------------------------
 
-async def extractor_node(state: AgentState, config: RunnableConfig):
+# Validators: raising escalates the call to the next model tier (llm_gateway)
+
+def filter_problems(updated: PropertySearchFilters) -> dict:
+    """Schema-valid isn't enough: a small model may put 'next month' in move_in_date. {field: problem}"""
+    problems = {}
+    if updated.move_in_date:
+        try:
+            datetime.strptime(updated.move_in_date, "%Y-%m-%d")
+        except ValueError:
+            problems["move_in_date"] = f"Not an ISO date {updated.move_in_date!r}"
+    if updated.budget_max is not None and updated.budget_max <= 0:
+        problems["budget_max"] = f"Implausible budget {updated.budget_max}"
+    return problems
+
+def check_filter_updates(updated: PropertySearchFilters) -> PropertySearchFilters:
+    problems = filter_problems(updated)
+    if problems:
+        raise ValueError("; ".join(problems.values()))
+    return updated
+
+def valid_filter_delta(updated: PropertySearchFilters) -> dict:
+    """The fields that were set, minus the invalid ones: used when every tier got a field wrong."""
+    delta = updated.model_dump(exclude_unset=True)
+    for field, problem in filter_problems(updated).items():
+        logger.warning(f"Dropping invalid filter update: {problem}")
+        delta.pop(field, None)
+    return delta
+
+def validate_filter_updates(response) -> PropertySearchFilters:
+    return check_filter_updates(PropertySearchFilters.model_validate(function_args(response)))
+
+def _validate_appointment(response) -> dict:
+    args = function_args(response)
+    AppointmentInfo.model_validate(args)
+    return args
+
+# A pasted wall of text shouldn't blow up every router / extractor prompt
+HISTORY_MESSAGE_MAX_TOKENS = 300
+
+def build_history(messages) -> str:
+    recent_messages = messages[-7:] if len(messages) >= 7 else messages
+
+    history_text = ""
+    for m in recent_messages:
+        role = "User" if isinstance(m, HumanMessage) else "AI"
+        history_text += f"{role}: {truncate_tokens(m.content, HISTORY_MESSAGE_MAX_TOKENS)}\n"
+    return history_text
+
+async def extract_appointment_delta(llm, state: AgentState, history_text: str) -> dict:
+    """Fields the user just mentioned, as a plain dict (empty values dropped)."""
+    current_appt = state.get("appointment_state") or {}
+
+    _, new_data = await llm_gateway.complete(
+        "extractor_appointment", llm,
+        validate=_validate_appointment,
+        messages=[
+            {"role": "system",
+             "content": APPOINTMENT_EXTRACTOR_PROMPT.format(
+                 current_data=json.dumps(current_appt, default=str)
+             )},
+            {"role": "user", "content": f"History:\n{history_text}"}
+        ],
+        response_format={"type": "json_object"},
+        functions=[{
+            "name": "extract_appt",
+            "parameters": AppointmentInfo.model_json_schema()
+        }],
+        function_call={"name": "extract_appt"}
+    )
+
+    return {k: v for k, v in new_data.items() if v}
+
+async def extract_search_delta(llm, state: AgentState, history_text: str) -> dict:
+    """Only the PropertySearchFilters fields the LLM actually set (exclude_unset)."""
+    today_str = datetime.now().strftime("%Y-%m-%d")
+    current_filters = state.get("filters") or PropertySearchFilters()
+
     try:
-        # Prepare history
-        messages = state["messages"]
-        recent_messages = messages[-7:] if len(messages) >= 7 else messages
+        _, updated_data = await llm_gateway.complete(
+            "extractor_search", llm,
+            validate=validate_filter_updates,
+            messages=[
+                {"role": "system",
+                 "content": SEARCH_EXTRACTOR_PROMPT.format(
+                     current_date=today_str,
+                     current_filters=current_filters.model_dump_json()
+                 )},
+                {"role": "user",
+                 "content": f"Recent Conversation History:\n{history_text}"}
+            ],
+            response_format={"type": "json_object"},
+            functions=[{
+                "name": "update_filters",
+                "description": "Updates the property search filters",
+                "parameters": PropertySearchFilters.model_json_schema()
+            }],
+            function_call={"name": "update_filters"}
+        )
+    except ValidationFailed as e:
+        if e.response is None:
+            raise
+        # Every tier got something wrong: keep the rest of the turn's updates, drop only the bad fields
+        return valid_filter_delta(PropertySearchFilters.model_validate(function_args(e.response)))
+
+    return updated_data.model_dump(exclude_unset=True)
 
-        history_text = ""
-        for m in recent_messages:
-            role = "User" if isinstance(m, HumanMessage) else "AI"
-            history_text += f"{role}: {m.content}\n"
+# ---------------------------------------------
+# 2. APPLY DELTAS TO STATE
+# ---------------------------------------------
 
-        llm = OpenAIService().client
-        validation_msg = None
+def apply_appointment_delta(state: AgentState, delta: dict) -> dict:
+    current_appt = state.get("appointment_state") or {}
+    updated_appt = {**current_appt, **{k: v for k, v in delta.items() if v}}
+    validation_msg = None
+
+    # Validation → lease must be >= 3 months
+    if updated_appt.get("lease_months") and updated_appt["lease_months"] < 3:
+        validation_msg = (
+            "Please note the minimum lease duration is 3 months. "
+            "Could you confirm if that works for you?"
+        )
+        updated_appt["lease_months"] = None
+
+    return {
+        "appointment_state": updated_appt,
+        "validation_error": validation_msg
+    }
+
+async def apply_search_delta(state: AgentState, config: RunnableConfig, delta: dict) -> dict:
+    current_filters = state.get("filters") or PropertySearchFilters()
+    validation_msg = None
+
+    new_filters = current_filters.copy(update=delta)
+
+    # --- Date validation
+    if new_filters.move_in_date:
+        try:
+            target_date = datetime.strptime(new_filters.move_in_date, "%Y-%m-%d").date()
+            today = datetime.now().date()
+
+            if target_date < today:
+                logger.warning("Move-in date is in the past.")
+                new_filters.move_in_date = None
+                validation_msg = (
+                    f"The date {target_date.strftime('%d %b %Y')} has passed. "
+                    f"Please provide a future move-in date."
+                )
+
+        except ValueError:
+            pass
+
+    # --------------------------------------------------------
+    # CLEAN, FIXED — INVENTORY CHECK LOGIC
+    # --------------------------------------------------------
+
+    last_msg = state["messages"][-1].content.lower()
+    confirmation_keywords = ["yes", "sure", "okay", "ok", "fine", "proceed"]
+    is_confirmation = any(k in last_msg for k in confirmation_keywords)
+
+    old_env = getattr(current_filters, "environment", None)
+    new_env = new_filters.environment
+
+    inv_status = state.get("inventory_check_status")
+
+    # 1. ENVIRONMENT HAS CHANGED → ALWAYS REQUIRE CHECK
+    if new_env and new_env != old_env:
+        logger.info(f"🔄 Environment changed from {old_env} to {new_env}. Forcing Inventory Check.")
+        inv_status = "PENDING"
+
+    # 2. NEW ENVIRONMENT SET BUT NEVER CHECKED → REQUIRE CHECK
+    elif new_env and inv_status is None:
+        inv_status = "PENDING"
+
+    # 3. USER CONFIRMED MIXED-ONLY WARNING → MARK DONE
+    if is_confirmation:
+        inv_status = "DONE"
+
+    # 4. MIXED = NO CHECK NEEDED
+    if not new_env or new_env.lower() == "mixed":
+        inv_status = "DONE"
+
+    # --- Save to DB (CRM)
+    db_session = config.get("configurable", {}).get("db_session")
+    if db_session:
+        repo = ProspectRepository(db_session)
+        prospect_data = {
+            "user_id": state["user_mobile"],
+            "agent_id": state["agent_id"],
+            "name": state.get("user_name"),
+            "email": None,
+            "gender": new_filters.tenant_gender,
+            "nationality": new_filters.tenant_nationality,
+            "move_in_date": new_filters.move_in_date,
+            "budget": new_filters.budget_max,
+            "location": new_filters.location_query
+        }
+        await repo.upsert_prospect(prospect_data)
+
+    return {
+        "filters": new_filters,
+        "inventory_check_status": inv_status,
+        "validation_error": validation_msg
+    }
 
+# ---------------------------------------------
+# MAIN FUNCTION
+# ---------------------------------------------
+
+def _prefetched_delta(state: AgentState, flow: str):
+    """Delta already extracted this turn by the fused router, if it is for this flow."""
+    prefetched = state.get("prefetched_extraction")
+    if prefetched and prefetched.get("flow") == flow:
+        return prefetched.get("delta") or {}
+    return None
+
+async def extractor_node(state: AgentState, config: RunnableConfig):
+    try:
         active_flow = state.get("active_flow")
 
         # --------------------------------------------------------
         # MODE A — APPOINTMENT BOOKING
         # --------------------------------------------------------
         if active_flow == "APPOINTMENT":
+            delta = _prefetched_delta(state, "APPOINTMENT")
+            if delta is None:
+                delta = await extract_appointment_delta(get_llm(config), state, with_summary(state, build_history(state["messages"])))
+            else:
+                logger.info("♻️ Using appointment fields from the fused router call.")
 
-            current_appt = state.get("appointment_state") or {}
-
-            completion = await llm.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system",
-                     "content": APPOINTMENT_EXTRACTOR_PROMPT.format(
-                         current_data=json.dumps(current_appt, default=str)
-                     )},
-                    {"role": "user", "content": f"History:\n{history_text}"}
-                ],
-                response_format={"type": "json_object"},
-                functions=[{
-                    "name": "extract_appt",
-                    "parameters": AppointmentInfo.model_json_schema()
-                }],
-                function_call={"name": "extract_appt"}
-            )
-
-            args = completion.choices[0].message.function_call.arguments
-            new_data = json.loads(args)
-
-            updated_appt = {**current_appt,
-                            **{k: v for k, v in new_data.items() if v}}
-
-            # Validation → lease must be >= 3 months
-            if updated_appt.get("lease_months") and updated_appt["lease_months"] < 3:
-                validation_msg = (
-                    "Please note the minimum lease duration is 3 months. "
-                    "Could you confirm if that works for you?"
-                )
-                updated_appt["lease_months"] = None
-
-            return {
-                "appointment_state": updated_appt,
-                "validation_error": validation_msg
-            }
+            return {**apply_appointment_delta(state, delta), "prefetched_extraction": None}
 
         # --------------------------------------------------------
         # MODE B — HUMAN HANDOFF
@@ -122,114 +300,26 @@ async def extractor_node(state: AgentState, config: RunnableConfig):
 
             return {
                 "handoff_data": {"reason": user_msg},
-                "validation_error": None
+                "validation_error": None,
+                "prefetched_extraction": None
             }
 
         # --------------------------------------------------------
         # MODE C — PROPERTY SEARCH EXTRACTION
         # --------------------------------------------------------
         else:
-
-            today_str = datetime.now().strftime("%Y-%m-%d")
-            current_filters = state.get("filters") or PropertySearchFilters()
-
-            completion = await llm.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system",
-                     "content": SEARCH_EXTRACTOR_PROMPT.format(
-                         current_date=today_str,
-                         current_filters=current_filters.model_dump_json()
-                     )},
-                    {"role": "user",
-                     "content": f"Recent Conversation History:\n{history_text}"}
-                ],
-                response_format={"type": "json_object"},
-                functions=[{
-                    "name": "update_filters",
-                    "description": "Updates the property search filters",
-                    "parameters": PropertySearchFilters.model_json_schema()
-                }],
-                function_call={"name": "update_filters"}
-            )
-
-            function_args = completion.choices[0].message.function_call.arguments
-            updated_data = PropertySearchFilters.model_validate_json(function_args)
-
-            new_filters = current_filters.copy(
-                update=updated_data.dict(exclude_unset=True)
-            )
-
-            # --- Date validation
-            if new_filters.move_in_date:
-                try:
-                    target_date = datetime.strptime(new_filters.move_in_date, "%Y-%m-%d").date()
-                    today = datetime.now().date()
-
-                    if target_date < today:
-                        logger.warning("Move-in date is in the past.")
-                        new_filters.move_in_date = None
-                        validation_msg = (
-                            f"The date {target_date.strftime('%d %b %Y')} has passed. "
-                            f"Please provide a future move-in date."
-                        )
-
-                except ValueError:
-                    pass
-
-            # --------------------------------------------------------
-            # CLEAN, FIXED — INVENTORY CHECK LOGIC
-            # --------------------------------------------------------
-
-            last_msg = state["messages"][-1].content.lower()
-            confirmation_keywords = ["yes", "sure", "okay", "ok", "fine", "proceed"]
-            is_confirmation = any(k in last_msg for k in confirmation_keywords)
-
-            old_env = getattr(current_filters, "environment", None)
-            new_env = new_filters.environment
-
-            inv_status = state.get("inventory_check_status")
-
-            # 1. ENVIRONMENT HAS CHANGED → ALWAYS REQUIRE CHECK
-            if new_env and new_env != old_env:
-                logger.info(f"🔄 Environment changed from {old_env} to {new_env}. Forcing Inventory Check.")
-                inv_status = "PENDING"
-
-            # 2. NEW ENVIRONMENT SET BUT NEVER CHECKED → REQUIRE CHECK
-            elif new_env and inv_status is None:
-                inv_status = "PENDING"
-
-            # 3. USER CONFIRMED MIXED-ONLY WARNING → MARK DONE
-            if is_confirmation:
-                inv_status = "DONE"
-
-            # 4. MIXED = NO CHECK NEEDED
-            if not new_env or new_env.lower() == "mixed":
-                inv_status = "DONE"
-
-            # --- Save to DB (CRM)
-            db_session = config.get("configurable", {}).get("db_session")
-            if db_session:
-                repo = ProspectRepository(db_session)
-                prospect_data = {
-                    "user_id": state["user_mobile"],
-                    "agent_id": state["agent_id"],
-                    "name": state.get("user_name"),
-                    "email": None,
-                    "gender": new_filters.tenant_gender,
-                    "nationality": new_filters.tenant_nationality,
-                    "move_in_date": new_filters.move_in_date,
-                    "budget": new_filters.budget_max,
-                    "location": new_filters.location_query
-                }
-                await repo.upsert_prospect(prospect_data)
+            delta = _prefetched_delta(state, "SEARCH")
+            if delta is None:
+                delta = await extract_search_delta(get_llm(config), state, with_summary(state, build_history(state["messages"])))
+            else:
+                logger.info("♻️ Using filter updates from the router (fused call or slot answer).")
 
             return {
-                "filters": new_filters,
-                "inventory_check_status": inv_status,
-                "validation_error": validation_msg
+                **await apply_search_delta(state, config, delta),
+                "filter_updates": delta,
+                "prefetched_extraction": None
             }
 
     except Exception as e:
         logger.error(f"Error in extractor node: {e}")
-        return {"filters": state.get("filters")}
\ No newline at end of file
+        return {"filters": state.get("filters"), "filter_updates": None, "prefetched_extraction": None}
@@ -1,9 +1,26 @@
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
-from app.services.openai_service import OpenAIService
-from app.services.query_builder import get_available_environments
+from app.services.openai_service import get_llm
+from app.services.llm_gateway import llm_gateway, non_empty_text, LLMUnavailable
+from app.services.inventory_service import inventory_service
+from app.graphs.nodes.decision import ASK_STEPS
+from app.core.slot_parser import SLOT_FIELDS
+from app.core.metrics import metrics
+from app.services import question_templates
+from app.config import settings
 import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# next_step -> filter being asked, so the router can parse a one-word reply without the LLM
+STEP_SLOTS = {step: field for field, step in ASK_STEPS.items() if field in SLOT_FIELDS}
+
+metrics.describe("generator_replies_total", "Generator replies by mode (template/llm)")
+
+# Messages that need a real answer rather than the next question
+FREE_FORM_MIN_WORDS = 13
 
 # UPDATED PROMPT: Includes Inventory Status Logic & Smarter Reactions
 GENERATOR_SYSTEM_PROMPT = """
@@ -73,6 +90,7 @@ async def generator_node(state: AgentState, config: RunnableConfig):
 
     # --- INVENTORY CHECK LOGIC ---
     inventory_msg = "Normal"
+    inventory_state, available = None, ""
     filters = state.get("filters")
     
     # Check if the user's last message was a confirmation ("Yes", "Okay")
@@ -90,37 +108,22 @@ async def generator_node(state: AgentState, config: RunnableConfig):
         
         # Only run check for co-living/rooms where environment matters
         if target_table in ["coliving_property", "rooms_for_rent"]:
-            # Fetch what is actually in the DB
-            available_envs = await get_available_environments(db, agent_id, target_table)
-            
-            req_env = filters.environment.lower()
-            
-            # Logic: Check matching
-            has_match = False
-            
-            # Check Female Request
-            if "female" in req_env:
-                 if "female" in available_envs or "ladies" in available_envs:
-                     has_match = True
-            
-            # Check Male Request
-            elif "male" in req_env:
-                 if "male" in available_envs or "men" in available_envs:
-                     has_match = True
-            
-            # Check Mixed Request
-            elif "mixed" in req_env:
-                 if "mixed" in available_envs or "any" in available_envs:
-                     has_match = True
+            # Served from the in-memory facet summary (no per-turn DB query)
+            summary = await inventory_service.get_summary(db, agent_id, target_table)
+
+            if summary is None:
+                # Summary unavailable -> don't block the user with a false "unavailable"
+                inventory_msg = "Normal"
 
             # RESULT
-            if has_match:
+            elif summary.has_environment(filters.environment):
+                inventory_state = "CONFIRMED"
                 inventory_msg = f"CONFIRMED: We have {filters.environment} options available."
             else:
                 # We DON'T have it. Construct helpful error message.
-                # If list is empty or only has 'mixed', say 'Mixed/Shared'
-                avail_list = [e.title() for e in available_envs if e != 'any']
+                avail_list = [e.title() for e in summary.available_environments()]
                 if not avail_list: avail_list = ["Mixed/Shared"]
+                inventory_state, available = "UNAVAILABLE", ", ".join(avail_list)
                 
                 inventory_msg = (
                     f"UNAVAILABLE: User wants '{filters.environment}', but we ONLY have: {', '.join(avail_list)}. "
@@ -136,30 +139,84 @@ async def generator_node(state: AgentState, config: RunnableConfig):
         "ask_nationality": "their nationality"
     }
     
+    # --- TEMPLATE MODE ---
+    # Plain slot-filling turns are answered deterministically; the LLM only gets free-form messages.
+    if settings.GENERATOR_MODE == "template" and not _is_free_form(last_human_message):
+        reply = _template_reply(state, next_step, validation_error, inventory_state, available, is_confirmation)
+        if reply:
+            metrics.incr("generator_replies_total", mode="template")
+            return {"messages": [AIMessage(content=reply)], "pending_slot": STEP_SLOTS.get(next_step)}
+
+    metrics.incr("generator_replies_total", mode="llm")
     missing_field_desc = missing_map.get(next_step, "more details")
     filters_json = filters.model_dump_json() if filters else "None"
 
     # --- CALL OPENAI ---
-    llm = OpenAIService().client 
+    llm = get_llm(config)
     agent_name = state.get("agent_name") or "Aba"
     company_name = state.get("company_name") or "PropPanda"
 
-    response = await llm.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": GENERATOR_SYSTEM_PROMPT.format(
-                agent_name=agent_name,
-                company_name=company_name,
-                missing_field=missing_field_desc,
-                last_user_message=last_human_message,
-                current_filters=filters_json,
-                validation_error=validation_error,
-                inventory_status=inventory_msg # <--- Pass the check result
-            )},
-            {"role": "user", "content": last_human_message}
-        ],
-        temperature=0.7 
+    try:
+        _, ai_text = await llm_gateway.complete(
+            "generator", llm,
+            validate=non_empty_text,
+            messages=[
+                {"role": "system", "content": GENERATOR_SYSTEM_PROMPT.format(
+                    agent_name=agent_name,
+                    company_name=company_name,
+                    missing_field=missing_field_desc,
+                    last_user_message=last_human_message,
+                    current_filters=filters_json,
+                    validation_error=validation_error,
+                    inventory_status=inventory_msg # <--- Pass the check result
+                )},
+                {"role": "user", "content": last_human_message}
+            ],
+            temperature=0.7 
+        )
+    except LLMUnavailable as e:
+        # Provider degraded: the template (or a plain question) keeps the form moving
+        logger.warning(f"Generator LLM unavailable ({e}). Using template reply.")
+        ai_text = (
+            _template_reply(state, next_step, validation_error, inventory_state, available, is_confirmation)
+            or f"Could you tell me {missing_field_desc}?"
+        )
+
+    return {"messages": [AIMessage(content=ai_text)], "pending_slot": STEP_SLOTS.get(next_step)}
+
+def _is_free_form(message: str) -> bool:
+    """Questions and longer messages deserve an actual reaction, not just the next question."""
+    return "?" in message or len(message.split()) >= FREE_FORM_MIN_WORDS
+
+def _template_reply(state: AgentState, next_step, validation_error: str, inventory_state, available: str,
+                    is_confirmation: bool):
+    """Template reply for this step, or None if the LLM should write it."""
+    agent_id = state["agent_id"]
+    turn = (state.get("compacted_messages") or 0) + len(state["messages"])
+    filters = state.get("filters")
+    values = question_templates.format_values(
+        filters,
+        agent_name=state.get("agent_name") or "Aba",
+        company_name=state.get("company_name") or "PropPanda",
+        environment=(getattr(filters, "environment", None) or "").lower(),
+        available=available,
     )
-    
-    ai_text = response.choices[0].message.content
-    return {"messages": [AIMessage(content=ai_text)]}
\ No newline at end of file
+
+    # 1. Validation messages are already written for the user
+    if validation_error != "None":
+        return validation_error
+
+    # 2. Inventory: the apology replaces the question
+    if inventory_state == "UNAVAILABLE":
+        return question_templates.render(agent_id, "inventory_unavailable", turn, **values) or None
+
+    ack = question_templates.acknowledgement(agent_id, turn, state.get("filter_updates"), is_confirmation, values)
+
+    if next_step == "check_inventory" and inventory_state == "CONFIRMED":
+        body = question_templates.render(agent_id, "inventory_confirmed", turn, **values)
+    elif question_templates.has_template(agent_id, next_step):
+        body = question_templates.render(agent_id, next_step, turn, **values)
+    else:
+        return None
+
+    return f"{ack} {body}".strip() if body else None
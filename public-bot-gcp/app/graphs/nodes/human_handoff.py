@@ -1,6 +1,8 @@
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
+from app.schemas.property_card import as_card
+from app.services.search_verticals import get_vertical
 from app.services.n8n_client import N8NClient
 import logging
 
@@ -29,7 +31,7 @@ async def human_handoff_node(state: AgentState, config: RunnableConfig):
     def get_f(k): return filter_dict.get(k, "-")
     
     appt = state.get("appointment_state") or {}
-    prop = state.get("selected_property") or {}
+    prop = as_card(state.get("selected_property"), get_vertical(state.get("target_table")))
 
     # Construct Payload (Your exact requested structure)
     payload = [{
@@ -45,8 +47,8 @@ async def human_handoff_node(state: AgentState, config: RunnableConfig):
         "clientprofession": "-", 
         "clientnoofpax": "1", 
         
-        "propertyname": prop.get("property_name") or "-",
-        "roomnumber": prop.get("room_number") or "-",
+        "propertyname": (prop and prop.name) or "-",
+        "roomnumber": (prop and prop.unit_ref) or "-",
         "clientmoveindate": get_f("move_in_date"),
         "clientleaseperiod": str(appt.get("lease_months") or "-"),
         
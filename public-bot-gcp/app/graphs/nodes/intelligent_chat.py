@@ -1,31 +1,56 @@
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
+from app.schemas.property_card import as_card, as_cards
+from app.services.property_cache import property_details
+from app.services.search_verticals import get_vertical
 from app.tools.knowledge_base import KnowledgeBaseTool
-from app.services.openai_service import OpenAIService
+from app.services.kb_context_cache import build_context
+from app.services.openai_service import get_llm
+from app.services.llm_gateway import llm_gateway, non_empty_text, LLMUnavailable
 from app.services.n8n_client import N8NClient
+from app.services.inventory_service import inventory_service
+from app.services.answer_cache import answer_cache, is_cacheable_question
+from app.core.metrics import metrics
+from app.core.prompt_budget import PromptAssembler
+from app.config import settings
 import json
+from dataclasses import asdict
 from datetime import datetime
 import pytz
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Reply while the LLM provider is degraded (llm_gateway circuit open / deadline missed)
+UNAVAILABLE_REPLY = "Sorry, I'm having a little trouble answering that right now. Could you try again in a few minutes?"
+
 # UPDATED PROMPT: Relaxed Guardrails + Slang Support
 SUPER_SYSTEM_PROMPT = """
 You are {agent_name}, a warm, engaging, and helpful Real Estate Agent at {company_name}. 🏠
 
 ### 1. COMPANY KNOWLEDGE (Policies, Fees, Rules)
-{kb_context}
+## FREQUENTLY ASKED QUESTIONS (FAQs)
+{kb_faqs}
+
+## COMPANY DOCUMENTS & POLICIES
+{kb_documents}
 
 ### 2. CURRENT SEARCH RESULTS (Properties discussed)
 {properties_json}
 
+### 3. CURRENT INVENTORY OVERVIEW (All live listings)
+{inventory_overview}
+
+### 4. EARLIER IN THE CONVERSATION (Summary)
+{conversation_summary}
+
 ### INSTRUCTIONS
 
 1. **Analyze the Question:**
    - If it's about **company rules, contracts, viewings, deposits, policies** → Use Section 1.
    - If it's about a **specific property** already discussed → Use Section 2.
+   - If it's about **what we have in general** (areas, price range, room types, ladies-only units) → Use Section 3.
    - If it's about **Singapore living, nearby amenities, transport, neighbourhoods, safety, lifestyle, restaurants, gyms, malls, schools**, or anything a real estate agent normally knows → Use your **general knowledge**.
    - If it's **small talk or greetings** → Be warm.
 
@@ -43,6 +68,7 @@ You are {agent_name}, a warm, engaging, and helpful Real Estate Agent at {compan
    - If the user asks a **valid and relevant** question, but the answer is NOT in:
        - Section 1 (company knowledge),
        - Section 2 (properties),
+       - Section 3 (inventory overview),
        - or your general Singapore real estate knowledge,
    - **Do NOT guess.**
    - Respond with exactly:
@@ -63,28 +89,49 @@ async def intelligent_chat_node(state: AgentState, config: RunnableConfig):
     db = config.get("configurable", {}).get("db_session")
     agent_id = state["agent_id"]
     last_message = state["messages"][-1].content
+    llm = get_llm(config)
+    is_first_interaction = len(state["messages"]) <= 1
+
+    # 0. Answer Cache (KB questions that don't depend on listings or the search)
+    # The first reply carries a greeting, so it is never served from / stored in the cache.
+    cacheable = settings.ANSWER_CACHE_ENABLED and not is_first_interaction and is_cacheable_question(last_message)
+    question_embedding = None
+    if cacheable:
+        cached_reply, question_embedding = await answer_cache.lookup(
+            agent_id, last_message, llm if settings.ANSWER_CACHE_SEMANTIC else None
+        )
+        if cached_reply:
+            logger.info(f"💾 Answer cache hit for agent {agent_id}: '{last_message}'")
+            return {"messages": [AIMessage(content=cached_reply)]}
+    else:
+        metrics.incr("answer_cache_requests_total", result="skipped")
     
     # 1. Fetch Contexts
     kb_tool = KnowledgeBaseTool(db)
-    kb_context = await kb_tool.search(agent_id, last_message) or "No specific company documents found."
-
-    properties = state.get("found_properties", [])
-    if properties:
-        context_props = []
-        for i, p in enumerate(properties[:3]):
-            p_copy = p.copy()
-            p_copy['reference_index'] = i + 1
-            context_props.append(p_copy)
-        props_json = json.dumps(context_props, indent=2, default=str)
-    else:
-        props_json = "No active search results."
+    try:
+        kb = await kb_tool.retrieve(agent_id, last_message)
+    except Exception as e:
+        logger.error(f"KB Fetch Error: {e}")
+        kb = build_context([], [])
+
+    # State keeps cards only; questions about a listing need the full row (shared detail cache)
+    cards = as_cards(state.get("found_properties"), get_vertical(state.get("target_table")))[:3]
+    rows = await property_details.get_many(db, agent_id, cards)
+    context_props = []
+    for i, (card, row) in enumerate(zip(cards, rows)):
+        p_copy = dict(row) if row is not None else asdict(card)  # Listing gone: what the user was shown
+        p_copy['reference_index'] = i + 1
+        context_props.append(json.dumps(p_copy, separators=(",", ":"), default=str))
+
+    # Inventory overview comes from the in-memory facet summary (no per-turn DB query)
+    summary = await inventory_service.get_summary(db, agent_id, state.get("target_table") or "coliving_property")
+    inventory_overview = summary.describe() if summary else "Inventory overview not available."
 
     # 2. Determine Greeting
     tz = pytz.timezone('Asia/Singapore')
     h = datetime.now(tz).hour
     greeting = "Good morning" if 5<=h<12 else "Good afternoon" if 12<=h<18 else "Good evening"
     
-    is_first_interaction = len(state["messages"]) <= 1
     if is_first_interaction:
         agent_name = state.get("agent_name") or "Aba"
         company_name = state.get("company_name") or "Adobha"
@@ -93,27 +140,41 @@ async def intelligent_chat_node(state: AgentState, config: RunnableConfig):
         greeting_instruction = "Do NOT start with a formal greeting. Answer naturally."
 
     # 3. Call AI
-    llm = OpenAIService().client
     agent_name = state.get("agent_name") or "Aba"
     company_name = state.get("company_name") or "Adobha"
     
-    response = await llm.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": SUPER_SYSTEM_PROMPT.format(
-                agent_name=agent_name,
-                company_name=company_name,
-                kb_context=kb_context,
-                properties_json=props_json,
-                user_message=last_message,
-                time_greeting=greeting,
-                greeting_instruction=greeting_instruction
-            )}
-        ],
-        temperature=0.3
+    # Sections are fitted into the node's token budget, most important first
+    prompt = (
+        PromptAssembler("intelligent_chat")
+        .add("kb_faqs", kb.faqs, priority=0, item_tokens=kb.faq_tokens, separator="\n\n",
+             empty_text="No FAQs found.")
+        .add("properties_json", context_props, priority=1, separator="\n",
+             empty_text="No active search results.")
+        .add("conversation_summary", state.get("conversation_summary") or "", priority=1,
+             empty_text="(none)")
+        .add("inventory_overview", inventory_overview, priority=2)
+        .add("kb_documents", kb.docs, priority=3, item_tokens=kb.doc_tokens, max_item_tokens=800,
+             empty_text="No specific company documents found.")
+        .assemble(
+            SUPER_SYSTEM_PROMPT,
+            agent_name=agent_name,
+            company_name=company_name,
+            user_message=last_message,
+            time_greeting=greeting,
+            greeting_instruction=greeting_instruction
+        )
     )
-    
-    ai_reply = response.choices[0].message.content.strip()
+
+    try:
+        _, ai_reply = await llm_gateway.complete(
+            "intelligent_chat", llm,
+            validate=non_empty_text,
+            messages=[{"role": "system", "content": prompt.text}],
+            temperature=0.3
+        )
+    except LLMUnavailable as e:
+        logger.warning(f"intelligent_chat LLM unavailable ({e}). Sending fallback reply.")
+        return {"messages": [AIMessage(content=UNAVAILABLE_REPLY)]}
 
     # --- 4. AUTO-HANDOFF LOGIC ---
     if "NO_DATA_HANDOFF" in ai_reply:
@@ -124,7 +185,7 @@ async def intelligent_chat_node(state: AgentState, config: RunnableConfig):
         filter_dict = filters.model_dump() if filters else {}
         def get_f(k): return filter_dict.get(k, "-")
         
-        prop = state.get("selected_property") or {}
+        prop = as_card(state.get("selected_property"), get_vertical(state.get("target_table")))
         appt = state.get("appointment_state") or {}
 
         payload = [{
@@ -138,8 +199,8 @@ async def intelligent_chat_node(state: AgentState, config: RunnableConfig):
             "clientPass": appt.get("pass_type") or "-",
             "clientprofession": "-",
             "clientnoofpax": "1",
-            "propertyname": prop.get("property_name") or "-",
-            "roomnumber": prop.get("room_number") or "-",
+            "propertyname": (prop and prop.name) or "-",
+            "roomnumber": (prop and prop.unit_ref) or "-",
             "clientmoveindate": get_f("move_in_date"),
             "clientleaseperiod": str(appt.get("lease_months") or "-"),
             "chatsummary": f"Auto-Handoff: Bot could not answer question: '{last_message}'"
@@ -155,4 +216,6 @@ async def intelligent_chat_node(state: AgentState, config: RunnableConfig):
         }
 
     # Normal Reply
+    if cacheable:
+        answer_cache.set(agent_id, last_message, ai_reply, question_embedding)
     return {"messages": [AIMessage(content=ai_reply)]}
\ No newline at end of file
@@ -1,7 +1,23 @@
 from app.core.state import AgentState
-from app.services.openai_service import OpenAIService
+from app.core.intent_classifier import get_intent_classifier
+from app.config import settings
+from app.core.metrics import metrics
+from app.graphs.nodes.extractor import (
+    SEARCH_EXTRACTION_RULES, APPOINTMENT_EXTRACTION_RULES, build_history, extract_search_delta,
+    check_filter_updates, valid_filter_delta, HISTORY_MESSAGE_MAX_TOKENS
+)
+from app.core.prompt_budget import truncate_tokens
+from app.core.memory_manager import with_summary
+from app.core.slot_parser import parse_slot
+from app.schemas.property_search import PropertySearchFilters
+from app.schemas.routing import FusedRouterOutput
+from app.services.openai_service import get_llm
+from app.services.llm_gateway import llm_gateway, json_content, function_args, LLMUnavailable, ValidationFailed
+from app.services.search_verticals import VERTICALS
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.runnables import RunnableConfig
+from datetime import datetime
+import asyncio
 import json
 import logging
 import re
@@ -66,11 +82,268 @@ Classify the user's latest message into one of the following intents.
 - commercial_properties_for_sale_by_developers
 """
 
+# FUSED_ROUTING: same classification rules, plus the extractor's job in the same call.
+# The extractor node then applies these deltas instead of calling the LLM again.
+FUSED_EXTRACTION_PROMPT = """
+### DATA EXTRACTION (same call)
+- Today's Date: {current_date}
+- Current Search Filters: {current_filters}
+- Current Appointment Data: {current_appointment}
+
+If intent is PROPERTY_SEARCH or SWITCH_SEARCH, fill "filter_updates":
+{search_rules}
+
+If intent is APPOINTMENT, fill "appointment_updates":
+{appointment_rules}
+
+For any other intent leave both empty.
+"""
+
+VALID_INTENTS = {"PROPERTY_SEARCH", "APPOINTMENT", "HUMAN_HANDOFF", "SWITCH_SEARCH", "CLARIFICATION", "INTELLIGENT_CHAT"}
+
+def _check_decision(intent, target_table, clarification_question):
+    """Confidence check for the small tier: anything off escalates to the large model."""
+    if intent not in VALID_INTENTS:
+        raise ValueError(f"Unknown intent {intent!r}")
+    if target_table and target_table not in VERTICALS:
+        raise ValueError(f"Unknown table {target_table!r}")
+    if intent == "SWITCH_SEARCH" and not target_table:
+        raise ValueError("SWITCH_SEARCH without target_table")
+    if intent == "CLARIFICATION" and not clarification_question:
+        raise ValueError("CLARIFICATION without a question")
+
+def _validate_decision(response) -> dict:
+    data = json_content(response)
+    _check_decision(data.get("intent"), data.get("target_table"), data.get("clarification_question"))
+    return data
+
+def _validate_fused(response) -> FusedRouterOutput:
+    output = FusedRouterOutput.model_validate(function_args(response))
+    _check_decision(output.intent, output.target_table, output.clarification_question)
+    if output.filter_updates is not None:
+        check_filter_updates(output.filter_updates)
+    return output
+
+def _salvage_fused(failed: ValidationFailed) -> FusedRouterOutput:
+    """Every tier failed validation: still use the last answer if only its filter updates were wrong."""
+    try:
+        output = FusedRouterOutput.model_validate(function_args(failed.response))
+        _check_decision(output.intent, output.target_table, output.clarification_question)
+    except (ValueError, KeyError, TypeError, AttributeError):
+        raise failed
+    return output
+
+# Intents the local classifier may decide alone. The others need fields only the
+# LLM produces (a clarification question, a new target_table).
+FAST_PATH_INTENTS = {"INTELLIGENT_CHAT", "APPOINTMENT", "HUMAN_HANDOFF", "PROPERTY_SEARCH"}
+
+def _route_for_intent(intent: str, data: dict, target_table, msg_lower: str) -> dict:
+    """Maps a classified intent (+ LLM extras like target_table) onto the next graph step."""
+    if intent == "APPOINTMENT":
+        return {"next_step": "APPOINTMENT", "active_flow": "APPOINTMENT"}
+        
+    if intent == "HUMAN_HANDOFF":
+        return {"next_step": "HUMAN_HANDOFF"}
+
+    if intent == "PROPERTY_SEARCH":
+        new_table = data.get("target_table")
+        
+        # SAFEGUARD: If AI forgets table, keep old one
+        if not new_table and target_table:
+            return {"next_step": "PROPERTY_SEARCH"} 
+        
+        # SAFEGUARD: Prevent Implicit Switching
+        if new_table and target_table and new_table != target_table:
+            explicit_switch_keywords = ["buy", "rent", "commercial", "residential", "office", "shop", "store"]
+            if not any(k in msg_lower for k in explicit_switch_keywords):
+                return {"next_step": "PROPERTY_SEARCH"} 
+            
+            return {"next_step": "RESET_MEMORY", "target_table": new_table}
+
+        return {"next_step": "CHECK_CAPABILITY", "target_table": new_table or target_table}
+
+    elif intent == "SWITCH_SEARCH":
+         return {"next_step": "RESET_MEMORY", "target_table": data.get("target_table")}
+        
+    elif intent == "CLARIFICATION":
+         return {
+            "next_step": "ASK_CLARIFICATION", 
+            "clarification_question": data.get("clarification_question")
+         }
+        
+    else:
+        return {"next_step": "INTELLIGENT_CHAT"}
+
+async def _fused_classify(llm, state: AgentState, history_str: str, last_message_content: str,
+                          target_table, msg_lower: str) -> dict:
+    """One structured call: intent + target_table + filter/appointment deltas."""
+    current_filters = state.get("filters") or PropertySearchFilters()
+    system_prompt = ROUTER_PROMPT.format(history=history_str) + FUSED_EXTRACTION_PROMPT.format(
+        current_date=datetime.now().strftime("%Y-%m-%d"),
+        current_filters=current_filters.model_dump_json(),
+        current_appointment=json.dumps(state.get("appointment_state") or {}, default=str),
+        search_rules=SEARCH_EXTRACTION_RULES,
+        appointment_rules=APPOINTMENT_EXTRACTION_RULES,
+    )
+
+    try:
+        _, output = await llm_gateway.complete(
+            "router_fused", llm,
+            validate=_validate_fused,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": f"Classify and extract: {last_message_content}"}
+            ],
+            functions=[{
+                "name": "route_and_extract",
+                "description": "Classifies the user's intent and extracts the data for that intent",
+                "parameters": FusedRouterOutput.model_json_schema()
+            }],
+            function_call={"name": "route_and_extract"},
+            temperature=0
+        )
+        filter_delta = output.filter_updates.model_dump(exclude_unset=True) if output.filter_updates is not None else None
+    except ValidationFailed as e:
+        if e.response is None:
+            raise
+        # Keep the decision and the other filter updates, drop only the invalid fields
+        output = _salvage_fused(e)
+        filter_delta = valid_filter_delta(output.filter_updates) if output.filter_updates is not None else None
+
+    intent = output.intent
+    logger.info(f"🛤️ Fused router classified: {intent}")
+
+    result = _route_for_intent(intent, output.model_dump(), target_table, msg_lower)
+    result["router_intent"] = {"intent": intent, "source": "llm_fused", "has_table": bool(target_table)}
+
+    # Hand the deltas to extractor_node (it will skip its own LLM call)
+    if intent in ("PROPERTY_SEARCH", "SWITCH_SEARCH") and filter_delta is not None:
+        result["prefetched_extraction"] = {
+            "flow": "SEARCH",
+            "delta": filter_delta,
+        }
+    elif intent == "APPOINTMENT" and output.appointment_updates is not None:
+        result["prefetched_extraction"] = {
+            "flow": "APPOINTMENT",
+            "delta": output.appointment_updates.model_dump(exclude_none=True),
+        }
+    return result
+
+def _fallback_route(prediction, target_table, msg_lower: str) -> dict:
+    """Provider degraded: best local guess (classifier at any confidence, else keep searching)."""
+    if prediction and prediction.intent in FAST_PATH_INTENTS and (prediction.intent != "PROPERTY_SEARCH" or target_table):
+        intent = prediction.intent
+    elif target_table:
+        intent = "PROPERTY_SEARCH"
+    else:
+        intent = "INTELLIGENT_CHAT"
+
+    result = _route_for_intent(intent, {}, target_table, msg_lower)
+    result["router_intent"] = {"intent": intent, "source": "fallback", "has_table": bool(target_table)}
+    return result
+
+# ---------------------------------------------
+# SPECULATIVE EXTRACTION
+# ---------------------------------------------
+
+metrics.describe("speculative_extraction_total", "Speculative search extractions by outcome (started/committed/cancelled/failed)")
+metrics.describe("router_decisions_total", "Router decisions by source (rule/slot/classifier/llm/llm_fused/fallback)")
+
+def _speculation_likely(state: AgentState) -> bool:
+    """
+    Mid-search turns (table chosen, some filters filled, no other flow active)
+    almost always route to PROPERTY_SEARCH -> extractor.
+    """
+    if not settings.SPECULATIVE_EXTRACTION or settings.FUSED_ROUTING:
+        return False  # Fused routing already extracts in the router call
+    if not state.get("target_table") or state.get("active_flow") in ("APPOINTMENT", "HUMAN_HANDOFF"):
+        return False
+    if _pending_slot_answer(state) is not None:
+        return False  # Filled without any LLM call
+    filters = state.get("filters")
+    return bool(filters and any(v is not None for v in filters.model_dump().values()))
+
+def _goes_to_search_extractor(result: dict, state: AgentState) -> bool:
+    """True if the route will reach extractor_node with the same table and filters."""
+    if result.get("active_flow") in ("APPOINTMENT", "HUMAN_HANDOFF"):
+        return False
+    if result.get("next_step") == "PROPERTY_SEARCH":
+        return True
+    same_table = result.get("target_table") in (None, state.get("target_table"))
+    return result.get("next_step") == "CHECK_CAPABILITY" and same_table
+
+async def _resolve_speculation(task: asyncio.Task, state: AgentState, result: dict) -> dict:
+    if result.get("prefetched_extraction") is None and _goes_to_search_extractor(result, state):
+        try:
+            delta = await task
+        except Exception as e:
+            # extractor_node will simply make its own call
+            logger.warning(f"Speculative extraction failed: {e}")
+            metrics.incr("speculative_extraction_total", outcome="failed")
+            return result
+        metrics.incr("speculative_extraction_total", outcome="committed")
+        logger.info("🔮 Speculative extraction committed.")
+        result["prefetched_extraction"] = {"flow": "SEARCH", "delta": delta}
+        return result
+
+    task.cancel()
+    metrics.incr("speculative_extraction_total", outcome="cancelled")
+    logger.info(f"🔮 Speculative extraction cancelled (router chose {result.get('next_step')}).")
+    return result
+
+# ---------------------------------------------
+# SLOT ANSWERS
+# ---------------------------------------------
+
+def _pending_slot_answer(state: AgentState):
+    """{field: value} if the message is a plain answer to the filter the generator just asked for."""
+    field = state.get("pending_slot")
+    if not field or not state.get("target_table") or state.get("active_flow") in ("APPOINTMENT", "HUMAN_HANDOFF"):
+        return None
+    value = parse_slot(field, state["messages"][-1].content.strip())
+    return {field: value} if value is not None else None
+
 async def router_node(state: AgentState, config: RunnableConfig):
+    # Start the search extraction now instead of after the router's LLM call.
+    # Committed only if the router agrees; cancelled otherwise.
+    speculative = None
+    if _speculation_likely(state):
+        metrics.incr("speculative_extraction_total", outcome="started")
+        speculative = asyncio.create_task(
+            extract_search_delta(get_llm(config), state, with_summary(state, build_history(state["messages"])))
+        )
+        # A failed task we end up cancelling must not log "exception was never retrieved"
+        speculative.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    try:
+        result = await _route(state, config)
+    except BaseException:
+        if speculative:
+            speculative.cancel()
+        raise
+
+    if speculative:
+        result = await _resolve_speculation(speculative, state, result)
+
+    # A prefetched extraction is only valid for the turn that produced it,
+    # a pending slot only for the reply right after the question
+    result.setdefault("prefetched_extraction", None)
+    result.setdefault("pending_slot", None)
+    # A zero-result relaxation offer is only answered on the search flow; a "yes" / "ok" in
+    # a later, unrelated turn must not accept it
+    if result.get("next_step") != "PROPERTY_SEARCH" and state.get("relaxation_offer"):
+        result.setdefault("relaxation_offer", None)
+    # Every turn overwrites router_intent, so keyword-routed turns don't inherit a stale label.
+    # It ends up in the chat log metadata, which is the classifier's training data.
+    result.setdefault("router_intent", {"intent": None, "source": "rule"})
+    metrics.incr("router_decisions_total", source=result["router_intent"].get("source"))
+    return result
+
+async def _route(state: AgentState, config: RunnableConfig):
     messages = state["messages"]
     last_message_content = messages[-1].content.strip()
     msg_lower = last_message_content.lower()
-    llm = OpenAIService().client
+    llm = get_llm(config)
 
     # --- 1. CONTEXT & KEYWORD OVERRIDES ---
     
@@ -88,7 +361,18 @@ async def router_node(state: AgentState, config: RunnableConfig):
         # Otherwise, treat input as the "Reason" and send back to node
         return {"next_step": "HUMAN_HANDOFF"}
 
-    # B. Pagination
+    # B. Direct answer to the question we just asked ("2k", "next month", "female")
+    # Parsed deterministically; extractor_node applies it without an LLM call.
+    slot_answer = _pending_slot_answer(state)
+    if slot_answer:
+        logger.info(f"🎯 Slot answer parsed without LLM: {slot_answer}")
+        return {
+            "next_step": "PROPERTY_SEARCH",
+            "prefetched_extraction": {"flow": "SEARCH", "delta": slot_answer},
+            "router_intent": {"intent": "PROPERTY_SEARCH", "source": "slot"},
+        }
+
+    # C. Pagination
     target_table = state.get("target_table")
     pagination_keywords = ["yes", "yeah", "yep", "sure", "show more", "next", "continue"]
     
@@ -100,19 +384,19 @@ async def router_node(state: AgentState, config: RunnableConfig):
     if target_table and any(w in msg_lower for w in pagination_keywords) and not is_booking_question:
         return {"next_step": "PROPERTY_SEARCH"}
 
-    # C. Specific Room Reference (QA)
+    # D. Specific Room Reference (QA)
     room_pattern = r"\b(room\s+\d+|r\d+)\b"
     if re.search(room_pattern, msg_lower):
         logger.info("✅ Specific Room ID detected. Routing to INTELLIGENT_CHAT.")
         return {"next_step": "INTELLIGENT_CHAT"}
 
-    # D. Booking / Appointment Keywords (CRITICAL MISSING PIECE)
+    # E. Booking / Appointment Keywords (CRITICAL MISSING PIECE)
     booking_keywords = ["book", "booking", "schedule", "arrange", "appointment", "viewing", "visit"]
     if any(w in msg_lower for w in booking_keywords):
         logger.info("✅ Booking keyword found. Routing to APPOINTMENT.")
         return {"next_step": "APPOINTMENT", "active_flow": "APPOINTMENT"}
 
-    # E. Property Type Hard-Match (Happy Path)
+    # F. Property Type Hard-Match (Happy Path)
     if any(k in msg_lower for k in ["co-living", "coliving", "room", "rooms"]):
         if any(x in msg_lower for x in ["standard", "traditional", "landlord", "owner"]):
             return {"next_step": "CHECK_CAPABILITY", "target_table": "rooms_for_rent"}
@@ -121,17 +405,46 @@ async def router_node(state: AgentState, config: RunnableConfig):
             logger.info("✅ Generic 'Room' request. Defaulting to 'coliving_property'.")
             return {"next_step": "CHECK_CAPABILITY", "target_table": "coliving_property"}
 
-    # --- 2. BUILD HISTORY ---
+    # --- 2. LOCAL CLASSIFIER FAST PATH ---
+    # Sub-millisecond, no network. Only high-confidence predictions are used.
+    classifier = get_intent_classifier()
+    prediction = None
+    if classifier:
+        prediction = classifier.predict(
+            last_message_content,
+            last_bot_message=last_bot_msg,
+            has_table=bool(target_table),
+            threshold=settings.INTENT_CONFIDENCE_THRESHOLD,
+        )
+        # PROPERTY_SEARCH without a table still needs the LLM to pick one
+        usable = prediction.intent in FAST_PATH_INTENTS and (prediction.intent != "PROPERTY_SEARCH" or target_table)
+        if prediction.confident and usable:
+            logger.info(f"⚡ Local classifier: {prediction.intent} ({prediction.confidence:.2f})")
+            result = _route_for_intent(prediction.intent, {}, target_table, msg_lower)
+            result["router_intent"] = {
+                "intent": prediction.intent,
+                "source": "classifier",
+                "confidence": round(prediction.confidence, 4),
+                "has_table": bool(target_table),
+            }
+            return result
+
+    # --- 3. BUILD HISTORY ---
     recent_messages = messages[-7:] 
     history_str = ""
     for msg in recent_messages:
         role = "User" if isinstance(msg, HumanMessage) else "Bot"
-        history_str += f"{role}: {msg.content}\n"
+        history_str += f"{role}: {truncate_tokens(msg.content, HISTORY_MESSAGE_MAX_TOKENS)}\n"
+    history_str = with_summary(state, history_str)
 
-    # --- 3. AI CLASSIFICATION ---
+    # --- 4. AI CLASSIFICATION ---
     try:
-        response = await llm.chat.completions.create(
-            model="gpt-4o",
+        if settings.FUSED_ROUTING:
+            return await _fused_classify(llm, state, history_str, last_message_content, target_table, msg_lower)
+
+        _, data = await llm_gateway.complete(
+            "router", llm,
+            validate=_validate_decision,
             messages=[
                 {"role": "system", "content": ROUTER_PROMPT.format(history=history_str)},
                 {"role": "user", "content": f"Classify: {last_message_content}"}
@@ -140,47 +453,17 @@ async def router_node(state: AgentState, config: RunnableConfig):
             temperature=0 
         )
         
-        data = json.loads(response.choices[0].message.content)
         intent = data.get("intent", "INTELLIGENT_CHAT")
         
         logger.info(f"🛤️ Router classified: {intent}")
 
-        # HANDLE INTENTS
-        
-        if intent == "APPOINTMENT":
-            return {"next_step": "APPOINTMENT", "active_flow": "APPOINTMENT"}
-            
-        if intent == "HUMAN_HANDOFF":
-            return {"next_step": "HUMAN_HANDOFF"}
+        result = _route_for_intent(intent, data, target_table, msg_lower)
+        result["router_intent"] = {"intent": intent, "source": "llm", "has_table": bool(target_table)}
+        return result
 
-        if intent == "PROPERTY_SEARCH":
-            new_table = data.get("target_table")
-            
-            # SAFEGUARD: If AI forgets table, keep old one
-            if not new_table and target_table:
-                return {"next_step": "PROPERTY_SEARCH"} 
-            
-            # SAFEGUARD: Prevent Implicit Switching
-            if new_table and target_table and new_table != target_table:
-                explicit_switch_keywords = ["buy", "rent", "commercial", "residential", "office", "shop", "store"]
-                if not any(k in msg_lower for k in explicit_switch_keywords):
-                    return {"next_step": "PROPERTY_SEARCH"} 
-                
-                return {"next_step": "RESET_MEMORY", "target_table": new_table}
-
-            return {"next_step": "CHECK_CAPABILITY", "target_table": new_table or target_table}
-
-        elif intent == "SWITCH_SEARCH":
-             return {"next_step": "RESET_MEMORY", "target_table": data.get("target_table")}
-            
-        elif intent == "CLARIFICATION":
-             return {
-                "next_step": "ASK_CLARIFICATION", 
-                "clarification_question": data.get("clarification_question")
-             }
-            
-        else:
-            return {"next_step": "INTELLIGENT_CHAT"}
+    except LLMUnavailable as e:
+        logger.warning(f"Router LLM unavailable ({e}). Using local fallback route.")
+        return _fallback_route(prediction, target_table, msg_lower)
 
     except Exception as e:
         logger.error(f"Router Error: {e}")
@@ -1,8 +1,12 @@
 from langchain_core.runnables import RunnableConfig
 from app.core.state import AgentState
 from app.tools.property_search import PropertySearchTool
-from app.services.query_builder import build_property_query
-from sqlalchemy import text
+from app.services.query_builder import build_property_query, build_relaxation_query, choose_relaxation
+from app.services.search_verticals import get_vertical, is_enabled
+from app.services.ranking import get_ranking_weights
+from app.services.property_cache import property_details
+from app.schemas.property_card import PropertyCard
+from app.config import settings
 import logging
 import re
 import os
@@ -18,12 +22,32 @@ async def search_node(state: AgentState, config: RunnableConfig):
     agent_id = state["agent_id"]
     filters = state["filters"]
     filter_dict = filters.model_dump() if filters else {}
+    target_table = state.get("target_table")
+    if not is_enabled(target_table):
+        # capability_check turns these away; never query an unknown table or one whose columns weren't verified
+        logger.warning(f"Search for unknown or disabled vertical {target_table} skipped")
+        return {"found_properties": [], "shown_count": 0, "relaxation_offer": None,
+                "active_relaxation": None, "next_step": "display_results"}
+    vertical = get_vertical(target_table)
     
     # ⚠️ REPLACE WITH YOUR REAL KEY
     tool = PropertySearchTool(db, location_iq_key=os.getenv("LOCATION_IQ_KEY"))
     
     properties = []
     location_str = filters.location_query
+
+    # Accepted zero-result relaxation (e.g. budget +10%) applies to this search only
+    relaxation = state.get("active_relaxation")
+    # Arguments of the last query we ran, reused for the relaxation counts
+    last_query_args = None
+
+    # Score a wider candidate set so the first page is the best one, not just the cheapest
+    ranking_args = {}
+    if settings.RANKING_ENABLED:
+        ranking_args = {
+            "ranking": get_ranking_weights(agent_id),
+            "candidate_limit": settings.RANKING_CANDIDATE_LIMIT,
+        }
     
     # --- STRATEGY 1: DIRECT DB TEXT SEARCH ---
     if location_str:
@@ -44,48 +68,68 @@ async def search_node(state: AgentState, config: RunnableConfig):
         
         # Only run if we have a word left
         if len(clean_loc) > 2:
-            query_text, params = build_property_query(
+            last_query_args = dict(
                 filters=filter_dict, 
                 agent_id=agent_id, 
                 lat=None, 
                 lng=None, 
-                text_search_term=clean_loc # Pass the cleaned word
+                text_search_term=clean_loc, # Pass the cleaned word
+                target_table=target_table
             )
+            query_text, params = build_property_query(**last_query_args, relaxation=relaxation, **ranking_args)
             
-            # Use Limit 10 for pagination buffer
-            final_query_str = str(query_text).replace("LIMIT 5", "LIMIT 10")
-            
-            result = await db.execute(text(final_query_str), params)
+            result = await db.execute(query_text, params)
             properties = [dict(row) for row in result.mappings().all()]
             
             if properties:
                 logger.info(f"✅ Text Search found {len(properties)} matches.")
 
     # --- STRATEGY 2: FALLBACK TO GEOCODING ---
-    # Only run if Text Search failed
-    if not properties and location_str:
+    # Only run if Text Search failed (and this vertical has geolocations)
+    if not properties and location_str and vertical.supports_geo:
         logger.info(f"⚠️ Text Search failed. Trying Geocoding for: '{location_str}'")
         
         coords = await tool.get_coordinates(location_str)
         if coords:
             lat, lng = coords
             
-            query_text, params = build_property_query(
+            last_query_args = dict(
                 filters=filter_dict, 
                 agent_id=agent_id, 
                 lat=lat, 
-                lng=lng
+                lng=lng,
+                target_table=target_table
             )
+            query_text, params = build_property_query(**last_query_args, relaxation=relaxation, **ranking_args)
             
-            final_query_str = str(query_text).replace("LIMIT 5", "LIMIT 10")
-            result = await db.execute(text(final_query_str), params)
+            result = await db.execute(query_text, params)
             properties = [dict(row) for row in result.mappings().all()]
         else:
             logger.warning("❌ Geocoding also failed/returned None.")
 
-    # Save to State
+    # --- STRATEGY 3: ZERO RESULTS -> FIND THE BEST SINGLE RELAXATION ---
+    # One COUNT(*) FILTER query tells us which filter is blocking the most listings,
+    # so we can offer a concrete fix instead of a vague "try again".
+    relaxation_offer = None
+    if not properties and last_query_args and not relaxation:
+        count_query, count_params = build_relaxation_query(**last_query_args)
+        if count_query is not None:
+            try:
+                # Savepoint: a failed count must not abort the turn's transaction (chat log, prospect writes)
+                async with db.begin_nested():
+                    result = await db.execute(count_query, count_params)
+                    counts = dict(result.mappings().first() or {})
+                relaxation_offer = choose_relaxation(counts, count_params)
+                logger.info(f"🪄 Relaxation counts: {counts} -> {relaxation_offer and relaxation_offer['name']}")
+            except Exception as e:
+                logger.error(f"Relaxation count query failed: {e}")
+
+    # Save to State: cards only; the full rows go to the shared detail cache
+    property_details.put_many(agent_id, vertical.table, properties)
     return {
-        "found_properties": properties, 
+        "found_properties": [PropertyCard.from_row(p, vertical) for p in properties],
         "shown_count": 0, 
+        "relaxation_offer": relaxation_offer,
+        "active_relaxation": None,
         "next_step": "display_results" 
     }
\ No newline at end of file
@@ -1,15 +1,80 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 # Import the router we defined in endpoints/whatsapp.py
 from app.api.endpoints import whatsapp
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import close_db
+from app.core.persistence import init_checkpointer, close_checkpointer
+from app.db.triggers import install_change_triggers
+from app.services.change_listener import change_listener
+from app.services.inventory_service import inventory_service
+from app.services.property_cache import property_details
+from app.services.answer_cache import answer_cache
+from app.services.openai_service import init_llm_client, close_llm_client
+from app.services.redis_service import close_redis
+from app.services.booking_summary import booking_summary_jobs
+from app.core.memory_manager import memory_manager
+from app.services.token_meter import token_meter
+from app.services.vector_store_service import vector_store, retrieval_modes
+from app.services.kb_ingestion import kb_ingestion
+from app.services.kb_context_cache import kb_context_cache
+from app.services.search_verticals import verify_verticals
+
+# --- LIFESPAN (Startup / Shutdown) ---
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 1. Make sure listing changes are broadcast (opt-in, needs DDL rights)
+    if settings.DB_INSTALL_TRIGGERS:
+        await install_change_triggers()
+        if retrieval_modes() - {"full"}:
+            await kb_ingestion.install_schema()
+        if "vector" in retrieval_modes():
+            await vector_store.install_schema()
+
+    # Searches only query verticals whose registry columns exist
+    await verify_verticals()
+
+    # 2. Keep in-memory caches fresh when listings change
+    change_listener.subscribe("listing_changes", inventory_service.on_listing_change)
+    change_listener.subscribe("listing_changes", property_details.on_listing_change)
+    change_listener.subscribe("kb_changes", answer_cache.on_kb_change)
+    change_listener.subscribe("kb_changes", kb_ingestion.on_kb_change)
+    change_listener.subscribe("kb_changes", kb_context_cache.on_kb_change)
+    await change_listener.start()
+
+    # 3. One pooled LLM client for every graph node
+    init_llm_client()
+
+    # 4. Batch per-agent token usage into agent.tokens_available
+    await token_meter.start()
+
+    # 5. Conversation state store (its own connection pool for the postgres backend)
+    await init_checkpointer()
+
+    yield
+
+    await change_listener.stop()
+    await kb_ingestion.stop()
+    await inventory_service.stop()
+    await booking_summary_jobs.drain(timeout=10)
+    await memory_manager.drain(timeout=10)
+    await token_meter.stop()  # After the jobs, so their usage is flushed too
+    await close_checkpointer()
+    await close_redis()
+    await close_llm_client()
+    await close_db()
 
 # Initialize the App
 app = FastAPI(
     title="PropPanda Chatbot API",
     description="Multi-tenant WhatsApp Chatbot for Real Estate Agents",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # --- CORS MIDDLEWARE ---
@@ -41,6 +106,12 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# --- METRICS ---
+# Prometheus text format; per worker process
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return metrics.render_prometheus()
+
 # --- ENTRY POINT ---
 # Allows you to run: python app/main.py
 if __name__ == "__main__":
@@ -0,0 +1,66 @@
+# app/schemas/inventory.py
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from datetime import datetime
+
+class InventorySummary(BaseModel):
+    """
+    Pre-aggregated facet counts for one agent's live listings.
+    Built by PropertyRepository.get_facet_summary and held in memory by the InventoryService.
+    """
+
+    agent_id: str
+    table_name: str
+    total: int = 0
+    min_rent: Optional[int] = None
+    max_rent: Optional[int] = None
+
+    # Facets: value -> number of live listings
+    environments: Dict[str, int] = Field(default_factory=dict)        # female / male / mixed
+    gender_preferences: Dict[str, int] = Field(default_factory=dict)  # raw landlord preference (lowercased)
+    room_types: Dict[str, int] = Field(default_factory=dict)
+    rent_histogram: Dict[int, int] = Field(default_factory=dict)      # bucket floor (SGD) -> count
+    districts: Dict[str, int] = Field(default_factory=dict)
+    mrts: Dict[str, int] = Field(default_factory=dict)
+
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow)
+
+    def has_environment(self, requested: str) -> bool:
+        """
+        Same matching rules the old DISTINCT check used:
+        'Female' needs a female unit, 'Male' a male unit, 'Mixed' a mixed/any unit.
+        """
+        term = (requested or "").lower()
+        if "female" in term or "ladies" in term:
+            return self.environments.get("female", 0) > 0
+        if "male" in term or "men" in term:
+            return self.environments.get("male", 0) > 0
+        if "mixed" in term or "any" in term:
+            return self.environments.get("mixed", 0) > 0
+        return self.total > 0
+
+    def available_environments(self) -> List[str]:
+        return [env for env, count in self.environments.items() if count > 0]
+
+    def describe(self, max_items: int = 5) -> str:
+        """
+        Compact, prompt-friendly rendering used for "what do you have?" answers.
+        """
+        if not self.total:
+            return "No listings are currently available."
+
+        def top(facet: Dict, suffix: str = "") -> str:
+            items = sorted(facet.items(), key=lambda kv: kv[1], reverse=True)[:max_items]
+            return ", ".join(f"{k}{suffix} ({v})" for k, v in items) or "-"
+
+        lines = [f"Total available listings: {self.total}"]
+        if self.min_rent is not None and self.max_rent is not None:
+            lines.append(f"Rent range: ${self.min_rent} - ${self.max_rent}/mo")
+        lines.append(f"Environments: {top(self.environments)}")
+        lines.append(f"Room types: {top(self.room_types)}")
+        if self.rent_histogram:
+            buckets = sorted(self.rent_histogram.items())
+            lines.append("Rent distribution: " + ", ".join(f"${b}+ ({n})" for b, n in buckets))
+        lines.append(f"Top districts: {top(self.districts)}")
+        lines.append(f"Top MRTs: {top(self.mrts)}")
+        return "\n".join(lines)
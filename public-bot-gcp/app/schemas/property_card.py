@@ -0,0 +1,74 @@
+# app/schemas/property_card.py
+import json
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+DESCRIPTION_MAX_CHARS = 100  # What the WhatsApp card shows
+
+def first_image(media: Any) -> Optional[str]:
+    """First URL of a media column: JSON list string, plain URL or list."""
+    try:
+        if isinstance(media, str) and media.startswith("["):
+            media = json.loads(media)
+        if isinstance(media, str):
+            return media or None
+        if isinstance(media, list) and media:
+            return str(media[0])
+    except Exception:
+        pass  # Unparseable media -> no image
+    return None
+
+@dataclass(slots=True, frozen=True)
+class PropertyCard:
+    """
+    What the conversation state keeps of a search result: the row's id plus the
+    few fields the listing card, property selection and booking payloads use.
+    Full rows (~90 columns) are served on demand by the property detail cache
+    (app/services/property_cache.py), so they never go through the checkpointer.
+    """
+
+    id: str
+    table: str
+    name: Optional[str] = None
+    price: Any = None
+    subtitle: Optional[str] = None
+    location: Optional[str] = None
+    unit_ref: Optional[str] = None
+    address: Optional[str] = None
+    description: Optional[str] = None  # Cut to DESCRIPTION_MAX_CHARS
+    image: Optional[str] = None
+
+    @classmethod
+    def from_row(cls, row: dict, vertical) -> "PropertyCard":
+        """vertical: the VerticalSchema the row came from (its card says which columns to read)."""
+        card = vertical.card
+
+        def col(name):
+            return row.get(name) if name else None
+
+        desc = col(card.description) or None
+        if desc and len(desc) > DESCRIPTION_MAX_CHARS:
+            desc = desc[:DESCRIPTION_MAX_CHARS] + "..."
+        unit_ref = col(card.unit_ref)
+        return cls(
+            id=str(row.get(vertical.id_column)),
+            table=vertical.table,
+            name=col(card.name),
+            price=col(card.price),
+            subtitle=col(card.subtitle),
+            location=col(card.location),
+            unit_ref=str(unit_ref) if unit_ref is not None else None,
+            address=col(card.address),
+            description=desc,
+            image=first_image(col(card.media)),
+        )
+
+def as_cards(items: Optional[List[Any]], vertical) -> List[PropertyCard]:
+    """found_properties as cards; threads checkpointed before cards were introduced still hold full row dicts."""
+    return [item if isinstance(item, PropertyCard) else PropertyCard.from_row(item, vertical) for item in items or []]
+
+def as_card(item: Any, vertical) -> Optional[PropertyCard]:
+    """Same for selected_property."""
+    if item is None or isinstance(item, PropertyCard):
+        return item
+    return PropertyCard.from_row(item, vertical)
@@ -0,0 +1,31 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from app.schemas.property_search import PropertySearchFilters
+from app.schemas.appointment import AppointmentInfo
+
+class FusedRouterOutput(BaseModel):
+    """
+    One structured call that routes the turn and extracts its data (FUSED_ROUTING).
+    Only the extraction block matching the intent is used.
+    """
+    intent: str = Field(
+        ...,
+        description="PROPERTY_SEARCH, APPOINTMENT, HUMAN_HANDOFF, SWITCH_SEARCH, CLARIFICATION or INTELLIGENT_CHAT"
+    )
+    target_table: Optional[str] = Field(
+        None,
+        description="Required if intent is PROPERTY_SEARCH or SWITCH_SEARCH."
+    )
+    clarification_question: Optional[str] = Field(
+        None,
+        description="Required if intent is CLARIFICATION."
+    )
+    filter_updates: Optional[PropertySearchFilters] = Field(
+        None,
+        description="PROPERTY_SEARCH / SWITCH_SEARCH only: search fields the user explicitly mentioned. Omit everything else."
+    )
+    appointment_updates: Optional[AppointmentInfo] = Field(
+        None,
+        description="APPOINTMENT only: booking fields the user explicitly mentioned."
+    )
@@ -0,0 +1,207 @@
+import logging
+import math
+import re
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("answer_cache_requests_total", "intelligent_chat answer cache lookups by result (hit_exact/hit_semantic/miss/skipped)")
+metrics.describe("answer_cache_evictions_total", "Answer cache evictions by reason (lru/ttl/kb_changed)")
+metrics.describe("answer_cache_entries", "Answers currently cached")
+
+# Words that change nothing about the answer
+_FILLER = {
+    "hi", "hello", "hey", "please", "pls", "plz", "thanks", "thank", "you", "can", "could",
+    "may", "i", "ask", "know", "tell", "me", "u", "kindly", "just", "want", "to", "the", "a",
+}
+
+# Questions that refer to listings or the current search depend on state, not only on the KB
+_CONTEXT_DEPENDENT = re.compile(
+    r"\b(this|that|it|its|these|those|first|second|third|last|one|ones|room|rooms|unit|units|"
+    r"property|properties|listing|listings|available|availability|vacant|cheapest|cheaper|"
+    r"near|nearby|mrt|option|options|show|r\d+|#?\d+)\b"
+)
+
+_PUNCT = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+CacheKey = Tuple[str, int, str]   # (agent_id, kb_version, normalized question)
+
+class _Entry(NamedTuple):
+    answer: str
+    stored_at: float
+    embedding: Optional[List[float]]
+    norm: float
+
+def normalize_question(text: str) -> str:
+    """'Hi, what are your FEES??' -> 'what are your fees'"""
+    text = _SPACES.sub(" ", _PUNCT.sub(" ", (text or "").lower())).strip()
+    words = [w for w in text.split(" ") if w and w not in _FILLER]
+    return " ".join(words)
+
+def is_cacheable_question(text: str) -> bool:
+    """Company / policy questions only. Anything about listings or the search goes to the LLM."""
+    normalized = normalize_question(text)
+    return bool(normalized) and len(normalized) <= 200 and not _CONTEXT_DEPENDENT.search(normalized)
+
+def _cosine(a: List[float], b: List[float], norm_a: float, norm_b: float) -> float:
+    if not norm_a or not norm_b:
+        return 0.0
+    return sum(x * y for x, y in zip(a, b)) / (norm_a * norm_b)
+
+class AnswerCache:
+    """
+    Per-agent cache of intelligent_chat answers to knowledge-base questions.
+
+    - Key: (agent, KB version, normalized question). The KB version is bumped by
+      'kb_changes' notifications (app/db/triggers.py), which also drops the agent's entries.
+    - Optional semantic match: cosine similarity over question embeddings of the same
+      agent + KB version, so "what r ur fees" can hit "what are your fees".
+    - LRU bounded by max_entries, with a TTL as a safety net. Without the NOTIFY
+      triggers (DB_INSTALL_TRIGGERS=false) the TTL is the only invalidation, so a
+      short one is used (ANSWER_CACHE_UNTRIGGERED_TTL_SECONDS).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._by_agent: Dict[str, Set[CacheKey]] = defaultdict(set)
+        self._kb_versions: Dict[str, int] = defaultdict(int)
+
+    # --- Versioning ---
+
+    def kb_version(self, agent_id: str) -> int:
+        return self._kb_versions[agent_id]
+
+    async def on_kb_change(self, payload: dict):
+        """ChangeListener callback for 'kb_changes'."""
+        agent_id = payload.get("agent_id")
+        if not agent_id:
+            return
+        self._kb_versions[agent_id] += 1
+        dropped = self.invalidate(agent_id)
+        logger.info(f"📚 KB changed for agent {agent_id} (v{self._kb_versions[agent_id]}). Dropped {dropped} cached answers.")
+
+    def invalidate(self, agent_id: str) -> int:
+        keys = self._by_agent.pop(agent_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys:
+            metrics.incr("answer_cache_evictions_total", len(keys), reason="kb_changed")
+            self._update_size()
+        return len(keys)
+
+    # --- Lookup ---
+
+    async def lookup(self, agent_id: str, question: str, llm=None) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Exact match first; on a miss, embed the question (only if an llm client is
+        given) and try the semantic match. Returns (answer, embedding) so the caller
+        can store the embedding with the new answer without a second API call.
+        """
+        normalized = normalize_question(question)
+        version = self.kb_version(agent_id)
+        key = (agent_id, version, normalized)
+
+        entry = self._entries.get(key)
+        if entry and not self._expired(key, entry):
+            self._entries.move_to_end(key)
+            metrics.incr("answer_cache_requests_total", result="hit_exact")
+            return entry.answer, entry.embedding
+
+        embedding = None
+        if llm is not None:
+            # Needed for the semantic match and stored with the new answer on a miss
+            embedding = await embed_question(llm, question)
+        if embedding is not None:
+            match = self._semantic_match(agent_id, version, embedding)
+            if match:
+                metrics.incr("answer_cache_requests_total", result="hit_semantic")
+                return match, embedding
+
+        metrics.incr("answer_cache_requests_total", result="miss")
+        return None, embedding
+
+    def _semantic_match(self, agent_id: str, version: int, embedding: List[float]) -> Optional[str]:
+        norm = math.sqrt(sum(x * x for x in embedding))
+        best_key, best_score = None, self.similarity_threshold
+        for key in list(self._by_agent.get(agent_id, ())):
+            if key[1] != version:
+                continue
+            entry = self._entries.get(key)
+            if not entry or entry.embedding is None or self._expired(key, entry):
+                continue
+            score = _cosine(embedding, entry.embedding, norm, entry.norm)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        logger.info(f"🧲 Semantic answer cache hit ({best_score:.3f}): '{best_key[2]}'")
+        return self._entries[best_key].answer
+
+    # --- Store ---
+
+    def set(self, agent_id: str, question: str, answer: str, embedding: Optional[List[float]] = None):
+        key = (agent_id, self.kb_version(agent_id), normalize_question(question))
+        norm = math.sqrt(sum(x * x for x in embedding)) if embedding else 0.0
+        self._entries[key] = _Entry(answer, time.monotonic(), embedding, norm)
+        self._entries.move_to_end(key)
+        self._by_agent[agent_id].add(key)
+
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._forget(old_key)
+            metrics.incr("answer_cache_evictions_total", reason="lru")
+        self._update_size()
+
+    # --- Internals ---
+
+    def _expired(self, key: CacheKey, entry: _Entry) -> bool:
+        if time.monotonic() - entry.stored_at < self.ttl_seconds:
+            return False
+        self._entries.pop(key, None)
+        self._forget(key)
+        metrics.incr("answer_cache_evictions_total", reason="ttl")
+        self._update_size()
+        return True
+
+    def _forget(self, key: CacheKey):
+        keys = self._by_agent.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_agent[key[0]]
+
+    def _update_size(self):
+        metrics.set_gauge("answer_cache_entries", len(self._entries))
+
+async def embed_question(llm, question: str) -> Optional[List[float]]:
+    """Embedding for the semantic match; None (exact match only) on any failure."""
+    try:
+        response = await llm.embeddings.create(
+            model=settings.ANSWER_CACHE_EMBEDDING_MODEL,
+            input=normalize_question(question),
+            dimensions=settings.ANSWER_CACHE_EMBEDDING_DIMENSIONS,
+        )
+        return response.data[0].embedding
+    except Exception as e:
+        logger.warning(f"Answer cache embedding failed: {e}")
+        return None
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+    ttl_seconds=(
+        settings.ANSWER_CACHE_TTL_SECONDS if settings.DB_INSTALL_TRIGGERS
+        else min(settings.ANSWER_CACHE_TTL_SECONDS, settings.ANSWER_CACHE_UNTRIGGERED_TTL_SECONDS)
+    ),
+    similarity_threshold=settings.ANSWER_CACHE_SIMILARITY_THRESHOLD,
+)
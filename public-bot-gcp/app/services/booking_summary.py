@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+from typing import Optional, Set
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import async_session_factory
+from app.db.repositories.prospect_repository import ProspectRepository
+from app.services.llm_gateway import llm_gateway, non_empty_text
+from app.services.n8n_client import N8NClient
+from app.services.openai_service import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("booking_summary_jobs_total", "Background booking summary jobs by outcome (ok/failed)")
+metrics.describe("booking_summary_retries_total", "Booking summary attempts that were retried")
+
+class BookingSummaryJobs:
+    """
+    Writes the chat summary for a confirmed booking in the background, so the user
+    gets "Appointment Confirmed" as soon as n8n has reserved the slot.
+
+    Each job: summarise (LLM) -> prospect_info.chat_summary -> n8n booking (if
+    N8N_BOOKING_SUMMARY_URL is set). Failed steps are retried with exponential
+    backoff + jitter; steps that already succeeded are not repeated. If the LLM
+    keeps failing, the one-line fallback summary is stored instead.
+    The request's DB session is closed by then, so jobs open their own.
+    """
+
+    def __init__(self, max_attempts: int, retry_base_seconds: float):
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(self, job: dict):
+        """
+        job: agent_id, user_id, email, prompt (SUMMARY_PROMPT already filled in),
+        fallback_summary, booking (n8n identifiers of the appointment).
+        """
+        task = asyncio.create_task(self._run(job))
+        # Keep a reference until done, otherwise the task can be garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self, timeout: float):
+        """Give in-flight jobs a chance to finish on shutdown."""
+        if not self._tasks:
+            return
+        logger.info(f"⏳ Waiting for {len(self._tasks)} booking summary job(s)...")
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    async def _run(self, job: dict):
+        summary: Optional[str] = None
+        saved = attached = False
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                if summary is None:
+                    try:
+                        summary = await self._summarise(job)
+                    except Exception as e:
+                        if attempt < self.max_attempts - 1:
+                            raise
+                        # Keep the last attempt for the writes; a one-line summary beats none
+                        logger.warning(f"Booking summary LLM call keeps failing ({e}). Using fallback summary.")
+                        summary = job["fallback_summary"]
+                if not saved:
+                    await self._save(job, summary)
+                    saved = True
+                if not attached:
+                    await self._attach(job, summary)
+                    attached = True
+
+                metrics.incr("booking_summary_jobs_total", outcome="ok")
+                logger.info(f"📝 Booking summary saved for {job['user_id']} (attempt {attempt}).")
+                return
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    metrics.incr("booking_summary_jobs_total", outcome="failed")
+                    logger.error(f"Booking summary for {job['user_id']} failed after {attempt} attempts: {e}")
+                    return
+                delay = self.retry_base_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                metrics.incr("booking_summary_retries_total")
+                logger.warning(f"Booking summary attempt {attempt} failed: {e}. Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def _summarise(self, job: dict) -> str:
+        _, summary = await llm_gateway.complete(
+            "appointment_summary", get_llm_client(),
+            validate=non_empty_text,
+            messages=[{"role": "system", "content": job["prompt"]}],
+            temperature=0.5
+        )
+        return summary
+
+    async def _save(self, job: dict, summary: str):
+        async with async_session_factory() as session:
+            repo = ProspectRepository(session)
+            updated = await repo.update_chat_summary(job["agent_id"], job["user_id"], job.get("email"), summary)
+        if not updated:
+            logger.warning(f"No prospect_info row for {job['user_id']} / agent {job['agent_id']}; summary not stored.")
+
+    async def _attach(self, job: dict, summary: str):
+        if not settings.N8N_BOOKING_SUMMARY_URL:
+            return
+        ok = await N8NClient().attach_booking_summary({**job["booking"], "chatsummary": summary})
+        if not ok:
+            raise RuntimeError("n8n booking summary webhook failed")
+
+booking_summary_jobs = BookingSummaryJobs(
+    max_attempts=settings.BOOKING_SUMMARY_MAX_ATTEMPTS,
+    retry_base_seconds=settings.BOOKING_SUMMARY_RETRY_BASE_SECONDS,
+)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, Dict, List
+
+import psycopg
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+ChangeCallback = Callable[[dict], Awaitable[None]]
+
+class ChangeListener:
+    """
+    Listens to Postgres NOTIFY channels (see app/db/triggers.py) and fans each
+    payload out to the in-memory caches that subscribed to it.
+
+    LISTEN needs a session-level connection, so this uses its own direct psycopg
+    connection (DB_LISTEN_URL) instead of the PgBouncer-friendly NullPool engine.
+    """
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self._subscribers: Dict[str, List[ChangeCallback]] = defaultdict(list)
+        self._task = None
+
+    def subscribe(self, channel: str, callback: ChangeCallback):
+        self._subscribers[channel].append(callback)
+
+    async def start(self):
+        if self._task or not self._subscribers:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        backoff = 1
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(self.dsn, autocommit=True) as conn:
+                    for channel in self._subscribers:
+                        await conn.execute(f"LISTEN {channel}")
+                    logger.info(f"👂 Listening for changes on: {', '.join(self._subscribers)}")
+                    backoff = 1
+
+                    async for notify in conn.notifies():
+                        await self._dispatch(notify.channel, notify.payload)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Change listener connection lost: {e}. Reconnecting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60)
+
+    async def _dispatch(self, channel: str, raw_payload: str):
+        try:
+            payload = json.loads(raw_payload) if raw_payload else {}
+        except json.JSONDecodeError:
+            logger.warning(f"Ignoring malformed change payload on {channel}: {raw_payload}")
+            return
+
+        for callback in self._subscribers.get(channel, []):
+            try:
+                await callback(payload)
+            except Exception as e:
+                # One bad subscriber must not kill the listener loop
+                logger.error(f"Change subscriber failed on {channel}: {e}")
+
+def _listen_dsn() -> str:
+    # psycopg wants a plain libpq URL, not the SQLAlchemy dialect form
+    url = settings.DB_LISTEN_URL or settings.DATABASE_URL
+    for prefix in ("postgresql+asyncpg://", "postgresql+psycopg://"):
+        if url.startswith(prefix):
+            return url.replace(prefix, "postgresql://", 1)
+    return url
+
+change_listener = ChangeListener(_listen_dsn())
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from app.config import settings
+from app.db.repositories.property_repository import PropertyRepository, FACET_TABLES
+from app.db.session import async_session_factory
+from app.schemas.inventory import InventorySummary
+
+logger = logging.getLogger(__name__)
+
+# The row-level trigger sends one notification per changed row; a bulk import
+# is refreshed once, after its notifications stop for this long
+REFRESH_DEBOUNCE_SECONDS = 2.0
+
+class InventoryService:
+    """
+    Per-agent facet summaries kept in process memory.
+
+    - Loaded once per (agent, table) with a single GROUPING SETS query.
+    - Refreshed when 'listing_changes' notifications arrive, once per burst
+      (REFRESH_DEBOUNCE_SECONDS) and under the same lock as lookups.
+    - TTL is only a safety net in case a notification is missed.
+    - At most max_entries summaries (LRU).
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, InventorySummary]]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._scheduled: Set[Tuple[str, str]] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def peek(self, agent_id: str, table_name: str) -> Optional[InventorySummary]:
+        """Returns the cached summary (even if stale) without touching the DB."""
+        entry = self._cache.get((agent_id, table_name))
+        return entry[1] if entry else None
+
+    async def get_summary(self, db, agent_id: str, table_name: str) -> Optional[InventorySummary]:
+        if table_name not in FACET_TABLES:
+            return None
+
+        key = (agent_id, table_name)
+        entry = self._cache.get(key)
+        if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+            self._cache.move_to_end(key)
+            return entry[1]
+
+        if db is None:
+            return entry[1] if entry else None
+
+        # Single-flight: concurrent turns for the same agent share one refresh
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._cache.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                return entry[1]
+            return await self._load(db, agent_id, table_name)
+
+    def invalidate(self, agent_id: str, table_name: Optional[str] = None):
+        for key in list(self._cache):
+            if key[0] == agent_id and (table_name is None or key[1] == table_name):
+                del self._cache[key]
+
+    async def on_listing_change(self, payload: dict):
+        """ChangeListener callback: rebuild the summary for the affected agent/table."""
+        agent_id = payload.get("agent_id")
+        table_name = payload.get("table")
+        if not agent_id or table_name not in FACET_TABLES:
+            return
+
+        # Only refresh summaries someone has already asked for, once per burst of changes
+        key = (agent_id, table_name)
+        if key not in self._cache or key in self._scheduled:
+            return
+        self._scheduled.add(key)
+        task = asyncio.create_task(self._refresh_later(key))
+        # Keep a reference until done, otherwise the task can be garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh_later(self, key: Tuple[str, str]):
+        await asyncio.sleep(REFRESH_DEBOUNCE_SECONDS)
+        self._scheduled.discard(key)  # Changes from now on schedule another refresh
+        agent_id, table_name = key
+        logger.info(f"🔄 Listing change for agent {agent_id} ({table_name}). Refreshing facet summary.")
+        try:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                async with async_session_factory() as session:
+                    await self._load(session, agent_id, table_name)
+        except Exception as e:
+            logger.error(f"Facet summary refresh for {agent_id} ({table_name}) failed: {e}")
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _load(self, db, agent_id: str, table_name: str) -> Optional[InventorySummary]:
+        summary = await PropertyRepository(db).get_facet_summary(agent_id, table_name)
+        if summary is None:
+            # Keep serving the previous summary rather than caching a failure
+            entry = self._cache.get((agent_id, table_name))
+            return entry[1] if entry else None
+
+        key = (agent_id, table_name)
+        self._cache[key] = (time.monotonic(), summary)
+        self._cache.move_to_end(key)
+        self._evict()
+        return summary
+
+    def _evict(self):
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        # Locks of keys that aren't cached and aren't held can go
+        for key in [k for k, lock in self._locks.items() if k not in self._cache and not lock.locked()]:
+            del self._locks[key]
+
+inventory_service = InventoryService(
+    ttl_seconds=settings.FACET_CACHE_TTL_SECONDS,
+    max_entries=settings.FACET_CACHE_MAX_ENTRIES,
+)
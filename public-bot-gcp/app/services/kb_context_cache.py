@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.core.prompt_budget import count_tokens
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("kb_context_cache_requests_total", "Knowledge base context cache lookups by result (hit/miss/expired)")
+metrics.describe("kb_context_cache_evictions_total", "Knowledge base context cache evictions by reason (lru/kb_changed)")
+metrics.describe("kb_context_cache_bytes", "Bytes held by the knowledge base context cache")
+
+DOC_CONTEXT_MAX_CHARS = 3000
+
+def render_kb_context(faqs: List[str], docs: List[str]) -> str:
+    """The KB as one text block (FAQs, then documents), as KnowledgeBaseTool.search returns it."""
+    parts = []
+    if faqs:
+        parts.append("## FREQUENTLY ASKED QUESTIONS (FAQs)")
+        parts.extend(faqs)
+        parts.append("-" * 20)
+    if docs:
+        parts.append("## COMPANY DOCUMENTS & POLICIES")
+        parts.extend(doc[:DOC_CONTEXT_MAX_CHARS] for doc in docs)
+    return "\n\n".join(parts)
+
+@dataclass
+class KBContext:
+    faqs: List[str]
+    docs: List[str]
+    faq_tokens: List[int]
+    doc_tokens: List[int]
+    text: str
+    tokens: int
+    size_bytes: int
+    version: int = 0
+    stored_at: float = 0.0
+
+def build_context(faqs: List[str], docs: List[str], version: int = 0,
+                  faq_tokens: Optional[List[int]] = None, doc_tokens: Optional[List[int]] = None) -> KBContext:
+    """
+    Renders the block and measures everything once, so cache hits skip tiktoken too.
+    faq_tokens / doc_tokens: counts already known (e.g. stored by kb_ingestion).
+    """
+    text = render_kb_context(faqs, docs)
+    size = sum(len(s.encode()) for s in faqs) + sum(len(s.encode()) for s in docs) + len(text.encode())
+    return KBContext(
+        faqs=faqs,
+        docs=docs,
+        faq_tokens=faq_tokens if faq_tokens is not None else [count_tokens(f) for f in faqs],
+        doc_tokens=doc_tokens if doc_tokens is not None else [count_tokens(d) for d in docs],
+        text=text,
+        tokens=count_tokens(text),
+        size_bytes=size,
+        version=version,
+        stored_at=time.monotonic(),
+    )
+
+class KBContextCache:
+    """
+    Per-agent full knowledge base (items, rendered block, token counts) in process memory.
+
+    - Keyed by the agent's KB version, bumped by 'kb_changes' notifications
+      (app/db/triggers.py), which also drop the entry. A load that raced with a
+      change is not stored.
+    - LRU bounded by total bytes, not entries: one agent's KB can be 1000x another's.
+    - TTL is only a safety net in case a notification is missed.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: int):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, KBContext]" = OrderedDict()
+        self._versions: Dict[str, int] = defaultdict(int)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._bytes = 0
+
+    def version(self, agent_id: str) -> int:
+        return self._versions[agent_id]
+
+    def get(self, agent_id: str) -> Optional[KBContext]:
+        entry = self._entries.get(agent_id)
+        if entry is None:
+            metrics.incr("kb_context_cache_requests_total", result="miss")
+            return None
+        if entry.version != self._versions[agent_id] or time.monotonic() - entry.stored_at >= self.ttl_seconds:
+            self._drop(agent_id)
+            metrics.incr("kb_context_cache_requests_total", result="expired")
+            return None
+        self._entries.move_to_end(agent_id)
+        metrics.incr("kb_context_cache_requests_total", result="hit")
+        return entry
+
+    async def get_or_load(self, agent_id: str, load) -> KBContext:
+        """load(): awaitable (faqs, docs). Concurrent misses for one agent share a single load."""
+        if not settings.KB_CONTEXT_CACHE_ENABLED:
+            return build_context(*await load())
+
+        entry = self.get(agent_id)
+        if entry:
+            return entry
+
+        lock = self._locks.setdefault(agent_id, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(agent_id)
+            if entry and entry.version == self._versions[agent_id]:
+                return entry
+            version = self._versions[agent_id]
+            context = build_context(*await load(), version=version)
+            if version == self._versions[agent_id]:
+                self._put(agent_id, context)
+            return context
+
+    async def on_kb_change(self, payload: dict):
+        """ChangeListener callback for 'kb_changes'."""
+        agent_id = payload.get("agent_id")
+        if not agent_id:
+            return
+        self._versions[agent_id] += 1
+        if self._drop(agent_id):
+            metrics.incr("kb_context_cache_evictions_total", reason="kb_changed")
+            logger.info(f"📚 KB context for agent {agent_id} dropped (v{self._versions[agent_id]}).")
+
+    def _put(self, agent_id: str, context: KBContext):
+        if context.size_bytes > self.max_bytes:
+            logger.warning(f"KB context for agent {agent_id} ({context.size_bytes} bytes) exceeds the cache; not cached.")
+            return
+        self._drop(agent_id)
+        self._entries[agent_id] = context
+        self._bytes += context.size_bytes
+        while self._bytes > self.max_bytes:
+            old_agent, _ = next(iter(self._entries.items()))
+            self._drop(old_agent)
+            metrics.incr("kb_context_cache_evictions_total", reason="lru")
+        metrics.set_gauge("kb_context_cache_bytes", self._bytes)
+
+    def _drop(self, agent_id: str) -> bool:
+        entry = self._entries.pop(agent_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.size_bytes
+        metrics.set_gauge("kb_context_cache_bytes", self._bytes)
+        return True
+
+kb_context_cache = KBContextCache(
+    max_bytes=settings.KB_CONTEXT_CACHE_MAX_BYTES,
+    ttl_seconds=settings.KB_CONTEXT_CACHE_TTL_SECONDS,
+)
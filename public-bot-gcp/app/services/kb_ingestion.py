@@ -0,0 +1,320 @@
+"""
+Incremental knowledge base ingestion.
+
+FAQs and documents are turned into passages (one per FAQ, token windows per
+document) once per content version, in knowledge_base_passages. The retrieval
+indexes are built from passages, never from the raw tables:
+
+    knowledge_base_faqs / _documents --(kb_changes)--> ingest_agent()
+        --> knowledge_base_passages --> vector_store.sync_agent()   (KB_RETRIEVAL=vector)
+                                    --> lexical_index.refresh()     (bm25)
+
+- Change detection runs in Postgres: every row is reduced to an md5 of its text
+  server-side, so only rows that are new or changed are transferred and chunked.
+  Removed rows delete their passages.
+- Chunking and token counting (tiktoken) run in a worker thread; every passage
+  stores its token count so prompt assembly doesn't measure it again.
+- Near-identical document chunks (boilerplate, re-uploaded versions) are kept as
+  duplicates of the first copy (64-bit simhash, KB_DEDUPE_MAX_DISTANCE bits) and
+  left out of the indexes. If the original goes away, its duplicates take over.
+- Everything happens off the chat path: kb_changes is debounced and at most
+  KB_INGEST_CONCURRENCY agents are ingested at a time. Until an agent has
+  passages, retrieval falls back to the full (cached) KB.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.core.prompt_budget import count_tokens, split_tokens
+from app.db.session import async_session_factory, engine
+from app.services.lexical_index import lexical_index
+from app.services.vector_store_service import retrieval_mode, vector_store
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("kb_ingestions_total", "Knowledge base ingestion runs by outcome (ok/unchanged/failed)")
+metrics.describe("kb_passages_ingested_total", "Passages written by ingestion, by kind (new/duplicate)")
+metrics.describe("kb_sources_removed_total", "FAQs / documents whose passages were removed")
+
+# --- 1. Schema ---
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS knowledge_base_passages (
+        id BIGSERIAL PRIMARY KEY,
+        agent_id VARCHAR(50) NOT NULL,
+        source TEXT NOT NULL,
+        source_hash TEXT NOT NULL,
+        title TEXT,
+        chunk_index INTEGER NOT NULL DEFAULT 0,
+        content TEXT NOT NULL,
+        content_hash TEXT NOT NULL,
+        token_count INTEGER NOT NULL,
+        fingerprint BIGINT NOT NULL,
+        duplicate_of TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    )
+    """,
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS knowledge_base_passages_source_idx
+    ON knowledge_base_passages (agent_id, source_hash, chunk_index)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS knowledge_base_passages_content_idx
+    ON knowledge_base_passages (agent_id, content_hash)
+    """,
+]
+
+# --- 2. Change detection (in SQL: only new / changed rows leave the database) ---
+
+FAQ_HASH = "md5('faq' || chr(31) || coalesce(question, '') || chr(31) || coalesce(answer, ''))"
+DOC_HASH = "md5('document' || chr(31) || coalesce(title, '') || chr(31) || coalesce(content, ''))"
+
+SOURCES_SQL = text(f"""
+    SELECT {FAQ_HASH} FROM knowledge_base_faqs WHERE agent_id = :agent_id
+    UNION
+    SELECT {DOC_HASH} FROM knowledge_base_documents WHERE agent_id = :agent_id
+""")
+INGESTED_SQL = text("SELECT DISTINCT source_hash FROM knowledge_base_passages WHERE agent_id = :agent_id")
+CHANGED_FAQS_SQL = text(f"""
+    SELECT DISTINCT ON (source_hash) question, answer, {FAQ_HASH} AS source_hash
+    FROM knowledge_base_faqs
+    WHERE agent_id = :agent_id AND {FAQ_HASH} = ANY(:hashes)
+""")
+CHANGED_DOCS_SQL = text(f"""
+    SELECT DISTINCT ON (source_hash) title, content, {DOC_HASH} AS source_hash
+    FROM knowledge_base_documents
+    WHERE agent_id = :agent_id AND {DOC_HASH} = ANY(:hashes)
+""")
+
+# --- 3. Chunking + fingerprints ---
+
+WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+class Passage(NamedTuple):
+    source: str             # "faq" | "document"
+    source_hash: str
+    title: Optional[str]
+    index: int
+    content: str
+    content_hash: str
+    tokens: int
+    fingerprint: int
+
+def simhash(body: str) -> int:
+    """64-bit simhash over word 3-shingles, as a signed BIGINT."""
+    words = WORD_RE.findall(body.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(len(words) - 2, 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = sum(1 << bit for bit in range(64) if weights[bit] > 0)
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+def hamming(a: int, b: int) -> int:
+    return ((a ^ b) & 0xFFFFFFFFFFFFFFFF).bit_count()
+
+def _passage(source: str, source_hash: str, title: Optional[str], index: int, content: str, body: str) -> Passage:
+    return Passage(
+        source, source_hash, title, index, content,
+        content_hash=hashlib.sha256(f"{source}|{content}".encode()).hexdigest(),
+        tokens=count_tokens(content),
+        fingerprint=simhash(body),
+    )
+
+def build_passages(faq_rows, doc_rows, chunk_tokens: int, overlap: int) -> List[Passage]:
+    """CPU-bound (tiktoken, simhash): call through asyncio.to_thread."""
+    passages = [
+        _passage("faq", row["source_hash"], row["question"], 0,
+                 f"Q: {row['question']}\nA: {row['answer']}", f"{row['question']} {row['answer']}")
+        for row in faq_rows
+    ]
+    for row in doc_rows:
+        title = row["title"]
+        for i, part in enumerate(split_tokens(row["content"] or "", chunk_tokens, overlap)):
+            passages.append(_passage("document", row["source_hash"], title, i,
+                                     f"DOCUMENT TITLE: {title}\nCONTENT:\n{part}", part))
+    return passages
+
+def find_duplicates(candidates: List[Tuple[str, str, int]], kept: List[Tuple[str, int]],
+                    max_distance: int) -> List[Optional[str]]:
+    """
+    candidates: (content_hash, source, fingerprint); kept: (content_hash, fingerprint)
+    of the passages already in the index, extended in place with every candidate kept.
+    Returns, per candidate, the content_hash it duplicates (None = keep).
+    FAQs are only ever exact duplicates: two answers that differ by a number are different answers.
+    """
+    kept_hashes = {h for h, _ in kept}
+    result: List[Optional[str]] = []
+    for content_hash, source, fingerprint in candidates:
+        duplicate_of = content_hash if content_hash in kept_hashes else None
+        if duplicate_of is None and source == "document" and max_distance > 0:
+            duplicate_of = next((h for h, fp in kept if hamming(fp, fingerprint) <= max_distance), None)
+        result.append(duplicate_of)
+        if duplicate_of is None:
+            kept.append((content_hash, fingerprint))
+            kept_hashes.add(content_hash)
+    return result
+
+# --- 4. Pipeline ---
+
+REINDEX_DEBOUNCE_SECONDS = 2.0
+
+INSERT_SQL = text("""
+    INSERT INTO knowledge_base_passages
+        (agent_id, source, source_hash, title, chunk_index, content, content_hash, token_count, fingerprint, duplicate_of)
+    VALUES
+        (:agent_id, :source, :source_hash, :title, :chunk_index, :content, :content_hash, :token_count, :fingerprint, :duplicate_of)
+    ON CONFLICT (agent_id, source_hash, chunk_index) DO NOTHING
+""")
+
+class KBIngestion:
+    def __init__(self, concurrency: int):
+        self._semaphore = asyncio.Semaphore(max(concurrency, 1))
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+        self._scheduled: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def install_schema(self):
+        """Idempotent; needs DDL rights."""
+        async with engine.begin() as conn:
+            for sql in SCHEMA_SQL:
+                await conn.execute(text(sql))
+        logger.info("🧩 knowledge_base_passages ready")
+
+    async def ingest_agent(self, agent_id: str) -> dict:
+        """Brings the agent's passages in line with its FAQs and documents."""
+        async with self._locks[agent_id]:
+            async with async_session_factory() as session:
+                params = {"agent_id": agent_id}
+                current = set((await session.execute(SOURCES_SQL, params)).scalars().all())
+                ingested = set((await session.execute(INGESTED_SQL, params)).scalars().all())
+                new_sources, gone_sources = list(current - ingested), list(ingested - current)
+                if not new_sources and not gone_sources:
+                    return {"sources": len(current), "added": 0, "duplicates": 0, "removed": 0, "promoted": 0}
+
+                passages: List[Passage] = []
+                if new_sources:
+                    changed = {**params, "hashes": new_sources}
+                    faq_rows = (await session.execute(CHANGED_FAQS_SQL, changed)).mappings().all()
+                    doc_rows = (await session.execute(CHANGED_DOCS_SQL, changed)).mappings().all()
+                    passages = await asyncio.to_thread(
+                        build_passages, faq_rows, doc_rows, settings.KB_CHUNK_TOKENS, settings.KB_CHUNK_OVERLAP_TOKENS,
+                    )
+
+                promoted = 0
+                if gone_sources:
+                    removed = (await session.execute(text("""
+                        DELETE FROM knowledge_base_passages
+                        WHERE agent_id = :agent_id AND source_hash = ANY(:hashes)
+                        RETURNING content_hash
+                    """), {**params, "hashes": gone_sources})).scalars().all()
+                    promoted = await self._promote_orphans(session, agent_id, list(set(removed)))
+
+                kept = [(r["content_hash"], r["fingerprint"]) for r in (await session.execute(text("""
+                    SELECT content_hash, fingerprint FROM knowledge_base_passages
+                    WHERE agent_id = :agent_id AND duplicate_of IS NULL
+                """), params)).mappings().all()]
+                duplicates = find_duplicates(
+                    [(p.content_hash, p.source, p.fingerprint) for p in passages], kept, settings.KB_DEDUPE_MAX_DISTANCE,
+                )
+
+                batch = settings.KB_INGEST_BATCH_SIZE
+                for i in range(0, len(passages), batch):
+                    await session.execute(INSERT_SQL, [
+                        {
+                            "agent_id": agent_id, "source": p.source, "source_hash": p.source_hash, "title": p.title,
+                            "chunk_index": p.index, "content": p.content, "content_hash": p.content_hash,
+                            "token_count": p.tokens, "fingerprint": p.fingerprint,
+                            "duplicate_of": duplicate_of,
+                        }
+                        for p, duplicate_of in zip(passages[i:i + batch], duplicates[i:i + batch])
+                    ])
+                await session.commit()
+
+        n_duplicates = sum(1 for d in duplicates if d)
+        metrics.incr("kb_passages_ingested_total", len(passages) - n_duplicates, kind="new")
+        metrics.incr("kb_passages_ingested_total", n_duplicates, kind="duplicate")
+        metrics.incr("kb_sources_removed_total", len(gone_sources))
+        stats = {
+            "sources": len(current), "added": len(passages) - n_duplicates, "duplicates": n_duplicates,
+            "removed": len(gone_sources), "promoted": promoted,
+        }
+        logger.info(f"🧩 KB passages for agent {agent_id}: {stats}")
+        return stats
+
+    async def _promote_orphans(self, session, agent_id: str, removed_hashes: List[str]) -> int:
+        """Duplicates of deleted passages become the kept copy (or a duplicate of another kept one)."""
+        if not removed_hashes:
+            return 0
+        orphans = (await session.execute(text("""
+            SELECT id, content_hash, source, fingerprint FROM knowledge_base_passages
+            WHERE agent_id = :agent_id AND duplicate_of = ANY(:hashes)
+            ORDER BY id
+        """), {"agent_id": agent_id, "hashes": removed_hashes})).mappings().all()
+        if not orphans:
+            return 0
+        kept = [(r["content_hash"], r["fingerprint"]) for r in (await session.execute(text("""
+            SELECT content_hash, fingerprint FROM knowledge_base_passages
+            WHERE agent_id = :agent_id AND duplicate_of IS NULL
+        """), {"agent_id": agent_id})).mappings().all()]
+        duplicates = find_duplicates(
+            [(r["content_hash"], r["source"], r["fingerprint"]) for r in orphans], kept, settings.KB_DEDUPE_MAX_DISTANCE,
+        )
+        await session.execute(text("""
+            UPDATE knowledge_base_passages p SET duplicate_of = d.duplicate_of
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:duplicate_of AS text[])) AS d(id, duplicate_of)
+            WHERE p.id = d.id
+        """), {
+            "ids": [r["id"] for r in orphans],
+            "duplicate_of": duplicates,
+        })
+        return sum(1 for d in duplicates if d is None)
+
+    async def process(self, agent_id: str) -> dict:
+        """Ingest, then update the index the agent retrieves from."""
+        mode = retrieval_mode(agent_id)
+        if mode == "full":
+            return {}
+        async with self._semaphore:
+            stats = await self.ingest_agent(agent_id)
+            if mode == "vector":
+                stats["index"] = await vector_store.sync_agent(agent_id)
+            else:
+                stats["index"] = await lexical_index.refresh(agent_id)
+        return stats
+
+    async def on_kb_change(self, payload: dict):
+        """ChangeListener callback: process the agent once its edits settle."""
+        agent_id = payload.get("agent_id")
+        if not agent_id or retrieval_mode(agent_id) == "full" or agent_id in self._scheduled:
+            return
+        self._scheduled.add(agent_id)
+        task = asyncio.create_task(self._process_later(agent_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_later(self, agent_id: str):
+        await asyncio.sleep(REINDEX_DEBOUNCE_SECONDS)
+        self._scheduled.discard(agent_id)  # Edits from now on schedule another run
+        try:
+            stats = await self.process(agent_id)
+            metrics.incr("kb_ingestions_total", outcome="ok" if stats.get("added") or stats.get("removed") else "unchanged")
+        except Exception as e:
+            metrics.incr("kb_ingestions_total", outcome="failed")
+            logger.error(f"KB ingestion failed for agent {agent_id}: {e}")
+
+    async def stop(self):
+        for task in list(self._tasks):
+            task.cancel()
+
+kb_ingestion = KBIngestion(concurrency=settings.KB_INGEST_CONCURRENCY)
@@ -0,0 +1,236 @@
+"""
+Knowledge base retrieval with an in-memory BM25 index (KB_RETRIEVAL=bm25).
+
+For agents that can't use embeddings: the same passages as the pgvector store
+(one per FAQ, token windows per document, see app/services/kb_ingestion.py) go
+into a per-agent inverted index in process memory. A lookup is a few dict reads
+per query term, so it needs no network and no DB round trip once the index is built.
+
+- Built lazily on the agent's first lookup from knowledge_base_passages, then kept
+  in an LRU of KB_LEXICAL_MAX_AGENTS agents. Agents without passages (not ingested
+  yet) fall back to the full KB for a while.
+- After ingestion, refresh() applies the difference to a loaded agent: passages
+  are keyed by their content hash, so only new text is read and tokenized and
+  only vanished text removed.
+"""
+import asyncio
+import logging
+import math
+import re
+import time
+from collections import Counter, OrderedDict, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import async_session_factory
+from app.services.vector_store_service import NOT_INDEXED_RECHECK_SECONDS, Chunk, RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("kb_lexical_search_us", "BM25 lookup time in microseconds (index already in memory)")
+metrics.describe("kb_lexical_builds_total", "BM25 index builds / refreshes by kind (build/refresh) and outcome")
+metrics.describe("kb_lexical_agents", "Agents with a BM25 index in memory")
+
+# --- 1. Tokenizer ---
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its me my no not of on or our
+so that the their there they this to us was we what when where which who why will with you your
+document title content
+""".split())  # Last line: the labels kb_ingestion puts in every document passage
+FAQ_QUESTION_BOOST = 2  # A match in the FAQ's question counts this many times
+
+def tokenize(text: str) -> List[str]:
+    terms = []
+    for word in TOKEN_RE.findall((text or "").lower()):
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        # Light plural folding so "fees" finds "fee"; no stemmer dependency
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+def chunk_terms(chunk: Chunk) -> List[str]:
+    terms = tokenize(chunk.content)
+    if chunk.source == "faq":
+        terms += tokenize(chunk.title) * (FAQ_QUESTION_BOOST - 1)  # content already holds it once
+    return terms
+
+# --- 2. Index ---
+
+class BM25Index:
+    """Okapi BM25 over one agent's passages; add/remove keep the statistics exact."""
+
+    def __init__(self, k1: float, b: float):
+        self.k1 = k1
+        self.b = b
+        self.passages: Dict[str, Chunk] = {}
+        self._terms: Dict[str, Tuple[str, ...]] = {}       # key -> distinct terms (for remove)
+        self._lengths: Dict[str, int] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}     # term -> {key: term frequency}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.passages)
+
+    def add(self, key: str, chunk: Chunk):
+        if key in self.passages:
+            return
+        counts = Counter(chunk_terms(chunk))
+        for term, n in counts.items():
+            self._postings.setdefault(term, {})[key] = n
+        length = sum(counts.values())
+        self.passages[key] = chunk
+        self._terms[key] = tuple(counts)
+        self._lengths[key] = length
+        self._total_length += length
+
+    def remove(self, key: str):
+        if self.passages.pop(key, None) is None:
+            return
+        for term in self._terms.pop(key):
+            postings = self._postings[term]
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._lengths.pop(key)
+
+    def search(self, query: str, k: int) -> List[Tuple[Chunk, float]]:
+        n = len(self.passages)
+        if not n:
+            return []
+        avg_length = (self._total_length / n) or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[key] / avg_length)
+                scores[key] += idf * tf * (self.k1 + 1) / (tf + norm)
+        top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+        return [(self.passages[key], score) for key, score in top]
+
+# --- 3. Per-agent indexes ---
+
+PASSAGES_SQL = """
+    SELECT source, title, chunk_index, content, content_hash, token_count
+    FROM knowledge_base_passages
+    WHERE agent_id = :agent_id AND duplicate_of IS NULL
+"""
+PASSAGE_HASHES_SQL = text(
+    "SELECT content_hash FROM knowledge_base_passages WHERE agent_id = :agent_id AND duplicate_of IS NULL"
+)
+
+async def _load_passages(session, agent_id: str, hashes: Optional[List[str]] = None) -> Dict[str, Chunk]:
+    """content_hash -> passage; all of the agent's, or only the given ones."""
+    if hashes is None:
+        result = await session.execute(text(PASSAGES_SQL), {"agent_id": agent_id})
+    else:
+        result = await session.execute(
+            text(PASSAGES_SQL + " AND content_hash = ANY(:hashes)"), {"agent_id": agent_id, "hashes": hashes},
+        )
+    return {
+        r["content_hash"]: Chunk(r["source"], r["title"], r["chunk_index"], r["content"], r["token_count"])
+        for r in result.mappings().all()
+    }
+
+class LexicalIndex:
+    def __init__(self, max_agents: int):
+        self.max_agents = max_agents
+        self._indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._not_indexed: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def search(self, db, agent_id: str, query: str, k: int) -> Optional[List[RetrievedChunk]]:
+        """Top-k passages by BM25, or None if the agent has no passages yet or nothing matches."""
+        index = await self._get(db, agent_id)
+        if index is None:
+            metrics.incr("kb_retrieval_total", result="not_indexed")
+            return None
+        started = time.perf_counter()
+        hits = index.search(query, k)
+        metrics.observe("kb_lexical_search_us", (time.perf_counter() - started) * 1_000_000)
+
+        if not hits:
+            metrics.incr("kb_retrieval_total", result="no_match")
+            return None
+        metrics.incr("kb_retrieval_total", result="bm25")
+        return [RetrievedChunk(c.source, c.title, c.content, score, c.tokens) for c, score in hits]
+
+    async def _get(self, db, agent_id: str) -> Optional[BM25Index]:
+        index = self._indexes.get(agent_id)
+        if index is not None:
+            self._indexes.move_to_end(agent_id)
+            return index
+        checked_at = self._not_indexed.get(agent_id)
+        if checked_at and time.monotonic() - checked_at < NOT_INDEXED_RECHECK_SECONDS:
+            return None
+
+        async with self._locks[agent_id]:
+            index = self._indexes.get(agent_id)
+            if index is not None:
+                return index
+            try:
+                # Savepoint: knowledge_base_passages is opt-in; a missing table must not abort the turn
+                async with db.begin_nested():
+                    passages = await _load_passages(db, agent_id)
+            except Exception:
+                # Don't retry the failing query on every turn
+                self._not_indexed[agent_id] = time.monotonic()
+                metrics.incr("kb_lexical_builds_total", kind="build", outcome="failed")
+                raise
+            if not passages:
+                self._not_indexed[agent_id] = time.monotonic()
+                return None
+            index = BM25Index(settings.KB_BM25_K1, settings.KB_BM25_B)
+            for key, chunk in passages.items():
+                index.add(key, chunk)
+            self._put(agent_id, index)
+            metrics.incr("kb_lexical_builds_total", kind="build", outcome="ok")
+            logger.info(f"🔤 BM25 index for agent {agent_id}: {len(index)} passages")
+            return index
+
+    async def refresh(self, agent_id: str) -> Optional[dict]:
+        """
+        Applies the agent's passage changes; no-op if the agent isn't loaded (it is
+        built from fresh rows on its next lookup). Called by kb_ingestion.
+        """
+        self._not_indexed.pop(agent_id, None)
+        async with self._locks[agent_id]:
+            index = self._indexes.get(agent_id)
+            if index is None:
+                return None
+            try:
+                async with async_session_factory() as session:
+                    wanted = set((await session.execute(PASSAGE_HASHES_SQL, {"agent_id": agent_id})).scalars().all())
+                    stale = [key for key in index.passages if key not in wanted]
+                    new = await _load_passages(session, agent_id, [h for h in wanted if h not in index.passages])
+            except Exception:
+                metrics.incr("kb_lexical_builds_total", kind="refresh", outcome="failed")
+                # Drop it rather than serve a KB we know is stale; the next lookup rebuilds
+                self._indexes.pop(agent_id, None)
+                raise
+            for key in stale:
+                index.remove(key)
+            for key, chunk in new.items():
+                index.add(key, chunk)
+
+        metrics.incr("kb_lexical_builds_total", kind="refresh", outcome="ok")
+        stats = {"passages": len(index), "added": len(new), "removed": len(stale)}
+        logger.info(f"🔤 BM25 index for agent {agent_id} refreshed: {stats}")
+        return stats
+
+    def _put(self, agent_id: str, index: BM25Index):
+        self._indexes[agent_id] = index
+        while len(self._indexes) > self.max_agents:
+            self._indexes.popitem(last=False)
+        metrics.set_gauge("kb_lexical_agents", len(self._indexes))
+
+lexical_index = LexicalIndex(max_agents=settings.KB_LEXICAL_MAX_AGENTS)
@@ -0,0 +1,422 @@
+"""
+Shared invocation layer for every graph LLM call.
+
+Tiered models: each node has a chain of tiers (e.g. small -> large). The gateway
+calls the first tier and only escalates when the output fails the node's
+validator: invalid JSON, a pydantic ValidationError, an unknown intent, and so on.
+
+Resilience:
+- Per-node deadline covering all tiers, retries and hedges of one call.
+- Transient errors (timeouts, connection errors, 429, 5xx) are retried with
+  exponential backoff + jitter, within the deadline.
+- Hedging: if a request is still running after the p95 latency of that
+  node/model, a duplicate is sent and the first answer wins.
+- Per-model circuit breaker: while a model fails too often, calls to it fail
+  fast (CircuitOpen); the next tier is tried, and nodes catch LLMUnavailable to
+  switch to their deterministic fallback instead of waiting on the provider.
+
+Every completed call's `usage` is billed to the current agent (token_meter).
+"""
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import openai
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.services.token_meter import token_meter
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_call_latency_ms", "LLM call latency by node and model")
+metrics.describe("llm_calls_total", "LLM calls by node, model and outcome (ok/invalid)")
+metrics.describe("llm_escalations_total", "Calls escalated to the next tier after failed validation")
+metrics.describe("llm_tokens_total", "Tokens by node, model and kind (prompt/completion)")
+metrics.describe("llm_retries_total", "Transient LLM errors retried, by node and model")
+metrics.describe("llm_hedged_requests_total", "Duplicate requests sent after the p95 delay, by node, model and winner")
+metrics.describe("llm_hedge_estimated_tokens_total", "Tokens billed for hedge losers (estimated from the winner), by node and model")
+metrics.describe("llm_unavailable_total", "LLM calls given up (deadline/retries/circuit_open), by node and reason")
+metrics.describe("llm_circuit_state", "Circuit breaker per model: 0 closed, 1 half-open, 2 open")
+
+DEFAULT_TIERS = {
+    "small": "gpt-4o-mini",
+    "large": "gpt-4o",
+}
+
+# Structured, easy-to-validate calls try the small model first
+DEFAULT_NODE_TIERS = {
+    "router": ["small", "large"],
+    "router_fused": ["small", "large"],
+    "extractor_search": ["small", "large"],
+    "extractor_appointment": ["small", "large"],
+    "generator": ["large"],
+    "intelligent_chat": ["large"],
+    "appointment_summary": ["small"],
+    "conversation_summary": ["small"],
+}
+
+# Seconds for the whole call (all tiers, retries, hedges). Routing sits on the
+# critical path of every turn, so it gives up first.
+DEFAULT_NODE_DEADLINES = {
+    "router": 8,
+    "router_fused": 10,
+    "extractor_search": 10,
+    "extractor_appointment": 10,
+    "generator": 15,
+    "intelligent_chat": 20,
+    "appointment_summary": 30,
+    "conversation_summary": 30,
+    "kb_embedding": 5,          # Query embedding, on the critical path of a KB answer
+    "kb_index_embedding": 60,   # Indexer batches, in the background
+}
+
+Validator = Callable[[Any], Any]
+
+class ValidationFailed(ValueError):
+    """Raised by the gateway when every tier produced invalid output. response: the last invalid answer."""
+
+    def __init__(self, message: str, response: Any = None):
+        super().__init__(message)
+        self.response = response
+
+class LLMUnavailable(Exception):
+    """The provider didn't answer in time (deadline, retries exhausted, circuit open). Use the node's fallback."""
+
+class CircuitOpen(LLMUnavailable):
+    pass
+
+def _is_transient(e: BaseException) -> bool:
+    if isinstance(e, (asyncio.TimeoutError, openai.APITimeoutError, openai.APIConnectionError,
+                      openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return (getattr(e, "status_code", None) or 0) >= 500
+
+class LatencyWindow:
+    """Recent successful latencies of one node/model, for the hedging delay."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int) -> Optional[float]:
+        if len(self.samples) < min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[int(q * (len(ordered) - 1))]
+
+class CircuitBreaker:
+    """
+    closed -> open when the failure rate over the last `window` calls reaches
+    `failure_rate` (after `min_calls`); open -> half-open after `cooldown_seconds`,
+    where one probe call decides between closed and open again. A probe that
+    ends without a verdict (cancelled, non-transient error) is released; one
+    that never reports back expires after another cooldown.
+    """
+
+    STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+    def __init__(self, name: str, failure_rate: float, min_calls: int, window: int, cooldown_seconds: float):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.results: Deque[bool] = deque(maxlen=window)
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if self.state == "open":
+            if now - self.opened_at < self.cooldown_seconds:
+                return False
+            self._set_state("half_open")
+            self._probe_in_flight = False
+        if self.state == "half_open":
+            if self._probe_in_flight and now - self._probe_started < self.cooldown_seconds:
+                return False
+            self._probe_in_flight = True
+            self._probe_started = now
+        return True
+
+    def release(self):
+        """The call allowed by allow() ended without saying anything about the model."""
+        if self.state == "half_open":
+            self._probe_in_flight = False
+
+    def record(self, ok: bool):
+        if self.state == "half_open":
+            self._probe_in_flight = False
+            if ok:
+                self.results.clear()
+                self._set_state("closed")
+                logger.info(f"🟢 LLM circuit for {self.name} closed again.")
+            else:
+                self._open()
+            return
+
+        self.results.append(ok)
+        failures = self.results.count(False)
+        if len(self.results) >= self.min_calls and failures / len(self.results) >= self.failure_rate:
+            self._open()
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.results.clear()
+        self._set_state("open")
+        logger.error(f"🔴 LLM circuit for {self.name} opened. Nodes use their fallbacks for {self.cooldown_seconds:.0f}s.")
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set_gauge("llm_circuit_state", self.STATES[state], model=self.name)
+
+def _load_json_setting(name: str, raw: str) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON in {name}: {e}. Using defaults.")
+        return {}
+
+class LLMGateway:
+    def __init__(self, tiers: Dict[str, str], node_tiers: Dict[str, List[str]], node_deadlines: Dict[str, float]):
+        self.tiers = tiers
+        self.node_tiers = node_tiers
+        self.node_deadlines = node_deadlines
+        self._latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def models_for(self, node: str) -> List[str]:
+        chain = self.node_tiers.get(node) or ["large"]
+        return [self.tiers.get(tier, tier) for tier in chain]
+
+    def deadline_for(self, node: str) -> float:
+        return float(self.node_deadlines.get(node, settings.LLM_DEFAULT_DEADLINE_SECONDS))
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(
+                model,
+                failure_rate=settings.LLM_CIRCUIT_FAILURE_RATE,
+                min_calls=settings.LLM_CIRCUIT_MIN_CALLS,
+                window=settings.LLM_CIRCUIT_WINDOW,
+                cooldown_seconds=settings.LLM_CIRCUIT_COOLDOWN_SECONDS,
+            )
+        return self._breakers[model]
+
+    async def complete(self, node: str, llm, validate: Optional[Validator] = None, **kwargs) -> Tuple[Any, Any]:
+        """
+        Calls llm.chat.completions.create(model=<tier>, **kwargs) down the node's tier chain.
+        validate(response) returns the parsed value or raises (ValueError, KeyError,
+        TypeError, AttributeError) to escalate. Returns (response, parsed).
+
+        Raises LLMUnavailable if no tier answered within the node deadline, and
+        ValidationFailed (carrying the last answer) if every answer was invalid.
+        """
+        models = self.models_for(node)
+        deadline = time.monotonic() + self.deadline_for(node)
+        last_error = None
+        unavailable = None
+        last_invalid = None
+
+        for i, model in enumerate(models):
+            try:
+                response = await self._call(node, model, llm, kwargs, deadline)
+            except LLMUnavailable as e:
+                # A degraded tier shouldn't block the next one, if there's time left
+                unavailable = last_error = e
+                continue
+
+            if validate is None:
+                metrics.incr("llm_calls_total", node=node, model=model, outcome="ok")
+                return response, None
+
+            try:
+                parsed = validate(response)
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                last_error = e
+                last_invalid = response
+                metrics.incr("llm_calls_total", node=node, model=model, outcome="invalid")
+                if i + 1 < len(models):
+                    metrics.incr("llm_escalations_total", node=node, from_model=model, to_model=models[i + 1])
+                    logger.info(f"⬆️ {node}: {model} output failed validation ({e}). Escalating to {models[i + 1]}.")
+                continue
+
+            metrics.incr("llm_calls_total", node=node, model=model, outcome="ok")
+            return response, parsed
+
+        if unavailable is last_error:
+            raise unavailable
+        raise ValidationFailed(f"{node}: no tier produced valid output ({last_error})", response=last_invalid)
+
+    # --- Resilience ---
+
+    async def embed(self, node: str, llm, model: str, **kwargs):
+        """
+        llm.embeddings.create(model=model, **kwargs) with the node's deadline, retries,
+        hedging and the model's circuit breaker. Raises LLMUnavailable like complete().
+        """
+        deadline = time.monotonic() + self.deadline_for(node)
+        response = await self._call(node, model, llm, kwargs, deadline, create=llm.embeddings.create)
+        metrics.incr("llm_calls_total", node=node, model=model, outcome="ok")
+        return response
+
+    async def _call(self, node: str, model: str, llm, kwargs: dict, deadline: float, create=None):
+        """One model: bounded retries with jitter, hedging and the circuit breaker, all within deadline."""
+        breaker = self.breaker(model)
+        attempt = 0
+        # A timeout only counts against the model if it had at least its share of the node deadline
+        tier_budget = self.deadline_for(node) / max(len(self.models_for(node)), 1)
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # Spent on earlier tiers / retries: not this model's fault
+                metrics.incr("llm_unavailable_total", node=node, model=model, reason="deadline")
+                raise LLMUnavailable(f"{node}: deadline exceeded before calling {model}")
+
+            if not breaker.allow():
+                metrics.incr("llm_unavailable_total", node=node, model=model, reason="circuit_open")
+                raise CircuitOpen(f"{node}: circuit open for {model}")
+
+            started = time.perf_counter()
+            try:
+                response, duplicates = await asyncio.wait_for(
+                    self._hedged(node, model, create or llm.chat.completions.create, kwargs), remaining
+                )
+            except asyncio.TimeoutError:
+                if remaining >= tier_budget:
+                    breaker.record(False)
+                else:
+                    breaker.release()
+                metrics.incr("llm_unavailable_total", node=node, model=model, reason="deadline")
+                logger.warning(f"⏱️ {node}: {model} missed the {self.deadline_for(node):.0f}s deadline.")
+                raise LLMUnavailable(f"{node}: {model} timed out")
+            except asyncio.CancelledError:
+                breaker.release()  # Caller gave up (speculative task, client gone)
+                raise
+            except Exception as e:
+                if not _is_transient(e):
+                    breaker.release()
+                    raise  # Bad request, auth...: not the provider being degraded
+                breaker.record(False)
+                attempt += 1
+                if attempt > settings.LLM_MAX_RETRIES:
+                    metrics.incr("llm_unavailable_total", node=node, model=model, reason="retries")
+                    raise LLMUnavailable(f"{node}: {model} failed {attempt} times ({e})") from e
+
+                delay = settings.LLM_RETRY_BASE_SECONDS * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                delay = min(delay, max(deadline - time.monotonic(), 0))
+                metrics.incr("llm_retries_total", node=node, model=model)
+                logger.warning(f"🔁 {node}: {model} transient error ({e}). Retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            latency = time.perf_counter() - started
+            breaker.record(True)
+            self._latency(node, model).record(latency)
+            self._record(node, model, response, latency * 1000, duplicates)
+            return response
+
+    def _latency(self, node: str, model: str) -> LatencyWindow:
+        key = (node, model)
+        if key not in self._latencies:
+            self._latencies[key] = LatencyWindow()
+        return self._latencies[key]
+
+    async def _hedged(self, node: str, model: str, create, kwargs: dict) -> Tuple[Any, int]:
+        """
+        Sends a duplicate if the first request outlives the p95; first success wins.
+        Returns (response, duplicates): the other requests still in flight or also
+        answered, which the provider bills too.
+        """
+        hedge_after = None
+        if settings.LLM_HEDGING:
+            hedge_after = self._latency(node, model).percentile(0.95, settings.LLM_HEDGE_MIN_SAMPLES)
+
+        first = self._request(create, model, kwargs)
+        tasks = {first}
+        hedged = False
+        try:
+            if hedge_after is None:
+                return await first, 0
+
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                tasks.add(self._request(create, model, kwargs))
+                hedged = True
+                logger.info(f"🪞 {node}: {model} slower than p95 ({hedge_after:.2f}s). Hedging.")
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if hedged:
+                            metrics.incr("llm_hedged_requests_total", node=node, model=model,
+                                         winner="original" if task is first else "hedge")
+                        # Losers being cancelled, or answered in the same tick
+                        duplicates = len(tasks) + sum(1 for t in done if t is not task and t.exception() is None)
+                        return task.result(), duplicates
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _request(create, model: str, kwargs: dict) -> asyncio.Task:
+        task = asyncio.create_task(create(model=model, **kwargs))
+        # The losing request of a hedge may fail unobserved; don't log "exception was never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    def _record(self, node: str, model: str, response, latency_ms: float, duplicates: int = 0):
+        metrics.observe("llm_call_latency_ms", latency_ms, node=node, model=model)
+        usage = getattr(response, "usage", None)
+        if usage:
+            # Embedding responses have no completion tokens
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            metrics.incr("llm_tokens_total", usage.prompt_tokens or 0, node=node, model=model, kind="prompt")
+            metrics.incr("llm_tokens_total", completion_tokens, node=node, model=model, kind="completion")
+            token_meter.record(node, usage.prompt_tokens, completion_tokens)
+            if duplicates:
+                # Hedge losers are billed by the provider but their usage never reaches us:
+                # charge the winner's usage for each (same prompt, at most a full answer)
+                metrics.incr("llm_hedge_estimated_tokens_total",
+                             duplicates * ((usage.prompt_tokens or 0) + completion_tokens), node=node, model=model)
+                token_meter.record(node, duplicates * (usage.prompt_tokens or 0), duplicates * completion_tokens)
+
+# --- Common validators ---
+
+def function_args(response) -> dict:
+    """Arguments of a forced function call, parsed as JSON."""
+    return json.loads(response.choices[0].message.function_call.arguments)
+
+def json_content(response) -> dict:
+    """JSON body of a response_format=json_object reply."""
+    data = json.loads(response.choices[0].message.content)
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    return data
+
+def non_empty_text(response) -> str:
+    content = (response.choices[0].message.content or "").strip()
+    if not content:
+        raise ValueError("Empty reply")
+    return content
+
+llm_gateway = LLMGateway(
+    tiers={**DEFAULT_TIERS, **_load_json_setting("LLM_TIERS", settings.LLM_TIERS)},
+    node_tiers={**DEFAULT_NODE_TIERS, **_load_json_setting("LLM_NODE_TIERS", settings.LLM_NODE_TIERS)},
+    node_deadlines={**DEFAULT_NODE_DEADLINES, **_load_json_setting("LLM_NODE_DEADLINES", settings.LLM_NODE_DEADLINES)},
+)
@@ -0,0 +1,417 @@
+"""
+Offline stand-in for the OpenAI API, for load tests and benchmarks of the graph.
+
+Modes (LLM_MODE, wired in app/services/openai_service.py):
+- live:    real API, nothing from this module is used.
+- record:  real API; every chat/embedding response is appended to the cassette
+           (LLM_CASSETTE_PATH, JSONL) keyed by the request body.
+- replay:  answers from the cassette; a request that was never recorded gets a
+           rule-generated answer instead (counted as a miss).
+- standin: rule-generated answers only, no network at all.
+
+Replay and standin add a simulated latency per node (LLM_STANDIN_LATENCY), drawn
+from a seeded distribution keyed by the request, so the same run gives the same
+numbers. The same StandIn also backs the HTTP server in scripts/llm_standin_server.py
+for tests that can't inject a client (LLM_BASE_URL).
+
+Rule-generated answers are shaped for this graph's calls (router, fused router,
+extractors, generator, intelligent_chat, booking / conversation summaries) and pass their validators;
+they are plausible, not smart.
+"""
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import re
+import struct
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.core.prompt_budget import count_tokens
+from app.core.slot_parser import parse_budget, parse_gender, parse_move_in_date, parse_nationality
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("llm_standin_requests_total", "Stand-in LLM requests by node and source (cassette/rules)")
+metrics.describe("llm_standin_latency_ms", "Simulated stand-in latency by node")
+
+# --- 1. Recognising the node behind a request ---
+
+FUNCTION_NODES = {
+    "route_and_extract": "router_fused",
+    "update_filters": "extractor_search",
+    "extract_appt": "extractor_appointment",
+}
+
+# First-line markers of each node's system prompt
+PROMPT_MARKERS = [
+    ("Intelligent Intent Classifier", "router"),
+    ("summarizing a real estate conversation", "appointment_summary"),
+    ("condensing the older part of a WhatsApp chat", "conversation_summary"),
+    ("guide the user smoothly through the rental process", "generator"),
+    ("Real Estate Agent at", "intelligent_chat"),
+]
+
+def classify(endpoint: str, body: dict) -> str:
+    if endpoint.startswith("/embeddings"):
+        return "embeddings"
+    if endpoint.startswith("/models"):
+        return "models"
+    function_call = body.get("function_call")
+    if isinstance(function_call, dict) and function_call.get("name") in FUNCTION_NODES:
+        return FUNCTION_NODES[function_call["name"]]
+    system = next((m.get("content") or "" for m in body.get("messages", []) if m.get("role") == "system"), "")
+    for marker, node in PROMPT_MARKERS:
+        if marker in system:
+            return node
+    return "unknown"
+
+def _user_text(node: str, body: dict) -> str:
+    """The user's latest message as the node saw it."""
+    messages = body.get("messages", [])
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    if node in ("router", "router_fused"):
+        return user.split(":", 1)[-1].strip()
+    if node in ("extractor_search", "extractor_appointment"):
+        lines = [l for l in user.splitlines() if l.startswith("User:")]
+        return lines[-1][len("User:"):].strip() if lines else user
+    if node == "intelligent_chat":
+        system = (messages[0].get("content") or "") if messages else ""
+        match = re.search(r'### USER MESSAGE\s*"(.*)"', system, re.S)
+        return match.group(1) if match else ""
+    return user
+
+# --- 2. Rule-generated answers ---
+
+HANDOFF_WORDS = ("human", "real person", "call me", "support", "talk to agent")
+BOOKING_WORDS = ("book", "viewing", "schedule", "visit", "appointment")
+SEARCH_WORDS = ("room", "rent", "budget", "move", "mrt", "near", "stay", "live", "condo", "hdb", "$")
+
+_LOCATION_RE = re.compile(r"\b(?:in|near|around|at)\s+([A-Z][\w']*(?:\s+[A-Z][\w']*)*)")
+_AMOUNT_RE = re.compile(r"\$?\s?(\d{1,2}(?:,\d{3})+|\d{3,5}|\d+(?:\.\d)?\s?k)\b", re.I)
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+_LEASE_RE = re.compile(r"(\d+)\s*(month|year)", re.I)
+_PASS_TYPES = {"ep": "EP", "s pass": "SP", "sp": "SP", "wp": "WP", "student": "Student", "citizen": "Citizen", "pr": "PR"}
+
+def _intent(text: str) -> str:
+    lower = text.lower()
+    if any(w in lower for w in HANDOFF_WORDS):
+        return "HUMAN_HANDOFF"
+    if any(w in lower for w in BOOKING_WORDS):
+        return "APPOINTMENT"
+    if any(w in lower for w in SEARCH_WORDS) or _search_delta(text, bare_location=False):
+        return "PROPERTY_SEARCH"
+    return "INTELLIGENT_CHAT"
+
+def _search_delta(text: str, bare_location: bool = True) -> dict:
+    delta = {}
+    budget = parse_budget(text)
+    if budget is None:
+        match = _AMOUNT_RE.search(text)
+        if match:
+            budget = parse_budget(match.group(1))
+    if budget:
+        delta["budget_max"] = budget
+    for field, parser in (("move_in_date", parse_move_in_date), ("tenant_gender", parse_gender),
+                          ("tenant_nationality", parse_nationality)):
+        value = parser(text)
+        if value:
+            delta[field] = value
+    location = _LOCATION_RE.search(text)
+    if location:
+        delta["location_query"] = location.group(1)
+    elif bare_location and not delta and text.istitle() and len(text.split()) <= 3:
+        delta["location_query"] = text  # A bare "Bedok" answering the location question
+    return delta
+
+def _appointment_delta(text: str) -> dict:
+    lower = text.lower()
+    delta = {}
+    email = _EMAIL_RE.search(text)
+    if email:
+        delta["email"] = email.group(0)
+    for word, label in _PASS_TYPES.items():
+        if re.search(rf"\b{word}\b", lower):
+            delta["pass_type"] = label
+            break
+    lease = _LEASE_RE.search(text)
+    if lease:
+        delta["lease_months"] = int(lease.group(1)) * (12 if lease.group(2).lower() == "year" else 1)
+    if "virtual" in lower or "video" in lower:
+        delta["viewing_type"] = "Virtual"
+    elif "in person" in lower or "in-person" in lower:
+        delta["viewing_type"] = "In-Person"
+    if "morning" in lower:
+        delta["time_preference"] = "Morning"
+    elif "lunch" in lower or "afternoon" in lower:
+        delta["time_preference"] = "After Lunch"
+    elif "work" in lower or "evening" in lower:
+        delta["time_preference"] = "After Work"
+    return delta
+
+CANNED_REPLIES = {
+    "generator": [
+        "Thanks for sharing! Could you tell me a bit more so I can narrow things down?",
+        "Got it. What else should I keep in mind for your search?",
+    ],
+    "intelligent_chat": [
+        "Happy to help! Our rooms come fully furnished and utilities are included in the rent.",
+        "Great question. Viewings can be arranged any day of the week, just let me know a time.",
+    ],
+    "appointment_summary": [
+        "User is looking for a co-living room and has booked a viewing. Requirements as per the chat.",
+    ],
+    "conversation_summary": [
+        "User is looking for a co-living room; requirements and the properties shown are in the chat so far.",
+    ],
+}
+
+def _pick(options: List[str], key: str) -> str:
+    return options[int(key[:8], 16) % len(options)]
+
+def rule_answer(node: str, body: dict, key: str) -> Tuple[Optional[str], Optional[dict]]:
+    """(content, function_call arguments) for a chat completion request."""
+    text = _user_text(node, body)
+    if node == "router":
+        intent = _intent(text)
+        data = {"intent": intent}
+        if intent == "PROPERTY_SEARCH":
+            data["target_table"] = "coliving_property"
+        return json.dumps(data), None
+    if node == "router_fused":
+        intent = _intent(text)
+        data = {"intent": intent}
+        if intent == "PROPERTY_SEARCH":
+            data.update(target_table="coliving_property", filter_updates=_search_delta(text))
+        elif intent == "APPOINTMENT":
+            data["appointment_updates"] = _appointment_delta(text)
+        return None, data
+    if node == "extractor_search":
+        return None, _search_delta(text)
+    if node == "extractor_appointment":
+        return None, _appointment_delta(text)
+    return _pick(CANNED_REPLIES.get(node) or CANNED_REPLIES["intelligent_chat"], key), None
+
+# --- 3. Latency ---
+
+class LatencyModel:
+    """
+    Per-node latency distributions (milliseconds):
+      fixed:300 | uniform:200,800 | normal:600,150 | lognormal:700,0.35 (median, sigma)
+    Samples are seeded by (seed, request key, occurrence), so concurrent runs draw
+    the same latency for the same call regardless of scheduling.
+    """
+
+    KINDS = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2}
+
+    def __init__(self, specs: Dict[str, str], seed: int = 0):
+        self.seed = seed
+        self.specs = {node: self._parse(spec) for node, spec in specs.items()}
+
+    @classmethod
+    def from_setting(cls, raw: str, seed: int = 0) -> "LatencyModel":
+        raw = (raw or "").strip()
+        if not raw:
+            return cls({}, seed)
+        if raw.startswith("{"):
+            return cls(json.loads(raw), seed)
+        return cls({"default": raw}, seed)
+
+    def _parse(self, spec: str) -> Tuple[str, List[float]]:
+        kind, _, params = spec.partition(":")
+        values = [float(p) for p in params.split(",") if p.strip()]
+        if self.KINDS.get(kind) != len(values):
+            raise ValueError(f"Invalid latency spec {spec!r}")
+        return kind, values
+
+    def sample_ms(self, node: str, key: str, occurrence: int) -> float:
+        spec = self.specs.get(node) or self.specs.get("default")
+        if not spec:
+            return 0.0
+        kind, p = spec
+        rng = random.Random(f"{self.seed}:{key}:{occurrence}")
+        if kind == "fixed":
+            return p[0]
+        if kind == "uniform":
+            return rng.uniform(p[0], p[1])
+        if kind == "normal":
+            return max(rng.gauss(p[0], p[1]), 0.0)
+        return rng.lognormvariate(math.log(p[0]), p[1])
+
+# --- 4. Cassette ---
+
+# Prompts carry today's date and a time-of-day greeting; a recording must still match tomorrow
+_VOLATILE = [
+    (re.compile(r"\d{4}-\d{2}-\d{2}"), "<date>"),
+    (re.compile(r"Good (?:morning|afternoon|evening)"), "<greeting>"),
+]
+
+def request_key(endpoint: str, body: dict) -> str:
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    for pattern, placeholder in _VOLATILE:
+        canonical = pattern.sub(placeholder, canonical)
+    return hashlib.sha256(f"{endpoint}|{canonical}".encode()).hexdigest()
+
+class Cassette:
+    """Recorded responses, one JSON object per line: {"key", "node", "response"}."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._responses: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry["response"]
+            logger.info(f"📼 Loaded {len(self._responses)} recorded LLM responses from {path}")
+
+    def get(self, key: str) -> Optional[dict]:
+        return self._responses.get(key)
+
+    def add(self, key: str, node: str, response: dict):
+        if key in self._responses:
+            return
+        self._responses[key] = response
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "node": node, "response": response}) + "\n")
+
+# --- 5. Stand-in ---
+
+class StandIn:
+    """Answers OpenAI-style requests from the cassette (if any) or the rules, after a simulated delay."""
+
+    def __init__(self, latency: LatencyModel, cassette: Optional[Cassette] = None):
+        self.latency = latency
+        self.cassette = cassette
+        self._seen: Dict[str, int] = defaultdict(int)
+        self.calls: Dict[str, int] = defaultdict(int)
+        self.simulated_ms: Dict[str, float] = defaultdict(float)
+
+    async def handle(self, endpoint: str, body: dict) -> dict:
+        node = classify(endpoint, body)
+        key = request_key(endpoint, body)
+
+        payload = self.cassette.get(key) if self.cassette else None
+        source = "cassette" if payload is not None else "rules"
+        if payload is None:
+            payload = self._generate(endpoint, node, body, key)
+        metrics.incr("llm_standin_requests_total", node=node, source=source)
+
+        self._seen[key] += 1
+        delay_ms = self.latency.sample_ms(node, key, self._seen[key])
+        self.calls[node] += 1
+        self.simulated_ms[node] += delay_ms
+        metrics.observe("llm_standin_latency_ms", delay_ms, node=node)
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+        return payload
+
+    def _generate(self, endpoint: str, node: str, body: dict, key: str) -> dict:
+        model = body.get("model", "gpt-4o")
+        if node == "models":
+            return {"id": endpoint.rsplit("/", 1)[-1], "object": "model", "created": 0, "owned_by": "standin"}
+        if node == "embeddings":
+            return self._embeddings(body, model)
+
+        content, arguments = rule_answer(node, body, key)
+        message = {"role": "assistant", "content": content}
+        if arguments is not None:
+            message["function_call"] = {"name": body["function_call"]["name"], "arguments": json.dumps(arguments)}
+        prompt_tokens = sum(count_tokens(m.get("content") or "") for m in body.get("messages", []))
+        completion_tokens = count_tokens(content or json.dumps(arguments))
+        return {
+            "id": f"chatcmpl-standin-{key[:24]}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "function_call" if arguments is not None else "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _embeddings(self, body: dict, model: str) -> dict:
+        inputs = body.get("input")
+        inputs = inputs if isinstance(inputs, list) else [inputs]
+        dims = int(body.get("dimensions") or 256)
+        data = []
+        for i, text in enumerate(inputs):
+            # Deterministic unit vector per text: identical questions embed identically
+            rng = random.Random(hashlib.sha256(str(text).encode()).digest())
+            vector = [rng.gauss(0, 1) for _ in range(dims)]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vector = [v / norm for v in vector]
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{dims}f", *vector)).decode()
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(count_tokens(str(t)) for t in inputs)
+        return {"object": "list", "data": data, "model": model,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+def _endpoint(url: httpx.URL) -> str:
+    """'/v1/chat/completions' -> '/chat/completions' (whatever the base URL prefix)."""
+    path = url.path
+    return path[path.index("/v1") + 3:] if "/v1" in path else path
+
+RECORDED_ENDPOINTS = ("/chat/completions", "/embeddings")
+
+class StandInTransport(httpx.AsyncBaseTransport):
+    """httpx transport for AsyncOpenAI: record passes through, replay/standin never touch the network."""
+
+    def __init__(self, mode: str, standin: StandIn, inner: Optional[httpx.AsyncBaseTransport] = None):
+        if mode == "record" and (inner is None or standin.cassette is None):
+            raise ValueError("record mode needs an inner transport and a cassette")
+        self.mode = mode
+        self.standin = standin
+        self.inner = inner
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        endpoint = _endpoint(request.url)
+        content = await request.aread()
+        body = json.loads(content) if content else {}
+
+        if self.mode == "record":
+            response = await self.inner.handle_async_request(request)
+            raw = await response.aread()
+            await response.aclose()
+            if response.status_code == 200 and endpoint in RECORDED_ENDPOINTS:
+                self.standin.cassette.add(request_key(endpoint, body), classify(endpoint, body), json.loads(raw))
+            # Body is already decoded, so drop the encoding headers
+            headers = [(k, v) for k, v in response.headers.items()
+                       if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")]
+            return httpx.Response(response.status_code, headers=headers, content=raw, request=request)
+
+        payload = await self.standin.handle(endpoint, body)
+        return httpx.Response(200, json=payload, request=request)
+
+    async def aclose(self):
+        if self.inner is not None:
+            await self.inner.aclose()
+
+def create_standin(mode: str, latency: Optional[str] = None, seed: Optional[int] = None,
+                   cassette_path: Optional[str] = None) -> StandIn:
+    """StandIn configured from settings (arguments override)."""
+    latency_model = LatencyModel.from_setting(
+        settings.LLM_STANDIN_LATENCY if latency is None else latency,
+        settings.LLM_STANDIN_SEED if seed is None else seed,
+    )
+    cassette = None
+    if mode in ("record", "replay"):
+        cassette = Cassette(cassette_path or settings.LLM_CASSETTE_PATH)
+    return StandIn(latency_model, cassette)
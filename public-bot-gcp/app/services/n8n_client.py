@@ -1,6 +1,7 @@
 import httpx
 import logging
 import json
+from app.config import settings
 from typing import Dict, Any, List, Optional, Union
 
 logger = logging.getLogger(__name__)
@@ -11,6 +12,8 @@ class N8NClient:
         self.get_slots_url = "https://rajigenzi.app.n8n.cloud/webhook/get_calender_events"
         self.schedule_url = "https://rajigenzi.app.n8n.cloud/webhook/schedule_appointment"
         self.human_handoff_url = "https://rajigenzi.app.n8n.cloud/webhook/human-agent" 
+        # Optional: attaches the chat summary to an already scheduled booking
+        self.booking_summary_url = settings.N8N_BOOKING_SUMMARY_URL
 
     async def trigger_workflow(self, workflow_type: str, payload: Union[Dict[str, Any], List[Dict[str, Any]]]) -> str:
         """
@@ -174,4 +177,22 @@ class N8NClient:
 
         except Exception as e:
             logger.error(f"N8N Schedule Exception: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    async def attach_booking_summary(self, payload: Dict[str, Any]) -> bool:
+        """
+        Sends the chat summary of a booking that schedule_appointment already made
+        (generated in the background, see app/services/booking_summary.py).
+        """
+        if not self.booking_summary_url:
+            return False
+        try:
+            async with httpx.AsyncClient() as client:
+                resp = await client.post(self.booking_summary_url, json=[payload], timeout=15.0)
+                if resp.status_code != 200:
+                    logger.error(f"N8N Booking Summary HTTP Error: {resp.status_code} - {resp.text}")
+                    return False
+                return True
+        except Exception as e:
+            logger.error(f"N8N Booking Summary Exception: {e}")
+            return False
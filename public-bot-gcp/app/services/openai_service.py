@@ -1,32 +1,71 @@
+from typing import Optional
+
+import httpx
 from openai import AsyncOpenAI
+from langchain_core.runnables import RunnableConfig
 import os
 import logging
 
+from app.config import settings
+
 logger = logging.getLogger(__name__)
 
-class OpenAIService:
-    def __init__(self):
-        # FIX: Initialize client here so it belongs to the instance
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            logger.error("OPENAI_API_KEY is missing in environment variables!")
-        
-        self.client = AsyncOpenAI(api_key=api_key)
-
-    async def get_chat_response(self, system_prompt: str, user_message: str):
-        """
-        Sends the prompt and user message to OpenAI and gets a response.
-        """
-        try:
-            response = await self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=0.7
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            logger.error(f"OpenAI Error: {e}")
-            return "I'm having a little trouble connecting right now. Can you try again in a moment?"
\ No newline at end of file
+# --- SHARED CLIENT ---
+# One AsyncOpenAI per process: every node reuses the same keep-alive connection pool
+# instead of paying a new TCP + TLS handshake for each LLM call.
+_llm_client: Optional[AsyncOpenAI] = None
+
+def create_llm_client() -> AsyncOpenAI:
+    api_key = os.getenv("OPENAI_API_KEY")
+    offline = settings.LLM_MODE in ("replay", "standin")
+    if not api_key and not offline:
+        logger.error("OPENAI_API_KEY is missing in environment variables!")
+
+    transport = httpx.AsyncHTTPTransport(
+        http2=settings.LLM_HTTP2,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+    )
+    # Load tests: recorded / rule-generated completions instead of (or on top of) the API
+    if settings.LLM_MODE != "live":
+        from app.services.llm_standin import StandInTransport, create_standin
+        transport = StandInTransport(settings.LLM_MODE, create_standin(settings.LLM_MODE), inner=transport)
+        logger.warning(f"🧪 LLM_MODE={settings.LLM_MODE}: completions are not coming from the live API.")
+
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=5.0),
+    )
+    # Retries, deadlines and hedging are handled per node by llm_gateway
+    return AsyncOpenAI(
+        api_key=api_key or ("standin" if offline else None),
+        base_url=settings.LLM_BASE_URL,
+        http_client=http_client,
+        max_retries=0,
+    )
+
+def init_llm_client() -> AsyncOpenAI:
+    """Called once from the app lifespan."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = create_llm_client()
+        logger.info(f"🔌 Shared LLM client ready (http2={settings.LLM_HTTP2}, max_connections={settings.LLM_MAX_CONNECTIONS})")
+    return _llm_client
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.close()
+        _llm_client = None
+
+def get_llm_client() -> AsyncOpenAI:
+    # Scripts and workers that skip the FastAPI lifespan still get the shared client
+    return _llm_client or init_llm_client()
+
+def get_llm(config: Optional[RunnableConfig] = None) -> AsyncOpenAI:
+    """Graph nodes: the client injected via configurable['llm_client'], else the shared one."""
+    client = (config or {}).get("configurable", {}).get("llm_client")
+    return client or get_llm_client()
@@ -0,0 +1,112 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import async_session_factory
+from app.schemas.property_card import PropertyCard
+from app.services.search_verticals import VERTICALS
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("property_cache_requests_total", "Property detail lookups by result (hit/miss)")
+metrics.describe("property_cache_entries", "Full listing rows held by the property detail cache")
+
+Key = Tuple[str, str, str]  # (agent_id, table, id)
+
+class PropertyDetailCache:
+    """
+    Full listing rows for the PropertyCards kept in conversation state, shared by
+    every conversation in the process.
+
+    - search_node puts the rows it just fetched, so follow-up questions about the
+      listings it showed are usually hits.
+    - Misses (other worker, evicted, expired) are loaded with one query per call.
+    - Bounded LRU (max_entries rows); ttl_seconds is a safety net for tables
+      without change notifications. 'listing_changes' drops the agent's rows.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._rows: "OrderedDict[Key, Tuple[float, dict]]" = OrderedDict()
+
+    def put_many(self, agent_id: str, table: str, rows: Sequence[dict]):
+        vertical = VERTICALS.get(table)
+        if vertical is None:
+            return
+        now = time.monotonic()
+        for row in rows:
+            key = (agent_id, table, str(row.get(vertical.id_column)))
+            self._rows[key] = (now, row)
+            self._rows.move_to_end(key)
+        self._evict()
+
+    async def get_many(self, db, agent_id: str, cards: Sequence[PropertyCard]) -> List[Optional[dict]]:
+        """Full rows in the order of cards; None for listings that no longer exist."""
+        found: Dict[Key, dict] = {}
+        missing: Dict[str, List[str]] = {}
+        now = time.monotonic()
+        for card in cards:
+            key = (agent_id, card.table, card.id)
+            entry = self._rows.get(key)
+            if entry and now - entry[0] < self.ttl_seconds:
+                self._rows.move_to_end(key)
+                found[key] = entry[1]
+                metrics.incr("property_cache_requests_total", result="hit")
+            else:
+                missing.setdefault(card.table, []).append(card.id)
+                metrics.incr("property_cache_requests_total", result="miss")
+
+        for table, ids in missing.items():
+            for row in await self._load(db, agent_id, table, ids):
+                found[(agent_id, table, str(row.get(VERTICALS[table].id_column)))] = row
+        return [found.get((agent_id, card.table, card.id)) for card in cards]
+
+    async def _load(self, db, agent_id: str, table: str, ids: List[str]) -> List[dict]:
+        vertical = VERTICALS.get(table)
+        if vertical is None:
+            return []
+        # Table and column come from the vertical registry, never from user input.
+        # The ::text cast is a no-op for text keys (coliving_property), so the primary key index is still used.
+        query = text(
+            f"SELECT * FROM {vertical.table} "
+            f"WHERE agent_id = :agent_id AND {vertical.id_column}::text = ANY(:ids)"
+        )
+        try:
+            if db is None:
+                async with async_session_factory() as session:
+                    result = await session.execute(query, {"agent_id": agent_id, "ids": ids})
+            else:
+                result = await db.execute(query, {"agent_id": agent_id, "ids": ids})
+            rows = [dict(row) for row in result.mappings().all()]
+        except Exception as e:
+            logger.error(f"Property detail load failed for {table} {ids}: {e}")
+            return []
+        self.put_many(agent_id, table, rows)
+        return rows
+
+    def _evict(self):
+        while len(self._rows) > self.max_entries:
+            self._rows.popitem(last=False)
+        metrics.set_gauge("property_cache_entries", len(self._rows))
+
+    def invalidate(self, agent_id: str, table: Optional[str] = None):
+        for key in [k for k in self._rows if k[0] == agent_id and (table is None or k[1] == table)]:
+            del self._rows[key]
+        metrics.set_gauge("property_cache_entries", len(self._rows))
+
+    async def on_listing_change(self, payload: dict):
+        """ChangeListener callback: the payload names the agent and table, not the row."""
+        agent_id = payload.get("agent_id")
+        if agent_id:
+            self.invalidate(agent_id, payload.get("table"))
+
+property_details = PropertyDetailCache(
+    max_entries=settings.PROPERTY_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PROPERTY_CACHE_TTL_SECONDS,
+)
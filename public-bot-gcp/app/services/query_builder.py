@@ -1,152 +1,369 @@
+import re
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy import text
+from app.services.search_verticals import VerticalSchema, get_vertical, VERTICALS
+from app.services.ranking import RankingWeights
 
-async def get_available_environments(db, agent_id: str, table_name: str):
+DEFAULT_RADIUS_METERS = 3000
+DEFAULT_LIMIT = 10
+
+# --- Zero-result relaxation ---
+# Each relaxation loosens exactly one filter group. Order = tie-break preference.
+RELAXATION_GROUPS = {
+    "budget": ("budget",),
+    "radius": (),                               # geo searches only
+    "move_in": ("move_in",),
+    "room_type": ("room_common", "room_master"),
+    "nationality": ("nationality",),
+}
+BUDGET_RELAX_FACTOR = 1.10
+RADIUS_RELAX_FACTOR = 2
+MOVE_IN_RELAX_DAYS = 30
+
+# Predicates that are amenities the user asked for; the ranking scores how many of them
+# a candidate has (they can differ once a relaxation dropped e.g. the room type)
+AMENITY_KEYS = ("room_common", "room_master", "cooking", "gym", "pool", "wifi")
+
+GEO_RADIUS_SQL = "ST_DWithin(g.location, ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)::geography, {radius})"
+
+# ---------------------------------------------
+# 1. FILTERS -> PREDICATE KEYS
+# ---------------------------------------------
+
+def resolve_predicates(vertical: VerticalSchema, filters: dict) -> Tuple[Tuple[str, ...], Dict]:
     """
-    Checks distinct 'environment' values for a specific table/agent.
-    Used to verify if we even HAVE 'Female Only' or 'Male Only' units before searching.
+    Maps the user's PropertySearchFilters onto the vertical's predicate keys.
+    Returns (keys, params). Keys come out in a fixed order so identical filter
+    combinations always hit the same compiled template.
     """
-    # Safety check
-    allowed_tables = ["coliving_property", "rooms_for_rent"]
-    if table_name not in allowed_tables:
-        return set()
-
-    try:
-        query = text(f"SELECT DISTINCT environment FROM {table_name} WHERE agent_id = :aid")
-        result = await db.execute(query, {"aid": agent_id})
-        
-        envs = set()
-        for row in result.fetchall():
-            val = row[0]
-            if val:
-                envs.add(val.lower())
-            else:
-                # If null, it usually defaults to 'mixed' in your schema
-                envs.add("mixed")
-                
-        return envs
-    except Exception:
-        return set()
-
-def build_property_query(filters: dict, agent_id: str, lat: float = None, lng: float = None, text_search_term: str = None):
-    # ... (Base Query & Location Logic - Keep Same) ...
-    sql_parts = ["""
-        SELECT p.*,
-            CASE 
-                WHEN CAST(:lat AS numeric) IS NOT NULL AND CAST(:lng AS numeric) IS NOT NULL THEN 
-                    ST_Distance(g.location, ST_SetSRID(ST_MakePoint(CAST(:lng AS numeric), CAST(:lat AS numeric)), 4326)::geography)
-                ELSE 0 
-            END as dist_meters
-        FROM coliving_property p
-        LEFT JOIN property_geolocations g ON p.property_id = g.property_id
-        WHERE p.agent_id = :agent_id
-        AND p.listing_status = 'active'
-        AND p.current_listing = 'Available to rent'
-    """]
-    
-    params = {
-        "agent_id": agent_id,
-        "lng": lng,
-        "lat": lat,
-        "text_search": f"%{text_search_term}%" if text_search_term else None
-    }
+    keys: List[str] = []
+    params: Dict = {}
 
-    # 2. Location
-    if lat and lng:
-        sql_parts.append("AND ST_DWithin(g.location, ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)::geography, 3000)")
-    elif text_search_term:
-        sql_parts.append("""
-            AND (
-                p.property_name ILIKE :text_search 
-                OR p.property_address ILIKE :text_search 
-                OR p.nearest_mrt ILIKE :text_search 
-                OR p.district ILIKE :text_search
-            )
-        """)
-
-    # 3. Budget
+    # Budget
     if filters.get("budget_max"):
-        sql_parts.append("AND p.monthly_rent <= :budget")
+        keys.append("budget")
         params["budget"] = filters["budget_max"]
 
-    # --- 4. GENDER & ENVIRONMENT LOGIC (The "Explicit" Check) ---
-    gender = filters.get("tenant_gender")
-    env = filters.get("environment")
-
-    # A. STRICT ENVIRONMENT FILTER (Only if user explicitly asked)
-    if env:
-        term = env.lower()
-        if "female" in term or "ladies" in term:
-            # User said "Female Only" -> Show ONLY 'female' environment
-            sql_parts.append("AND p.environment ILIKE 'female'")
-        elif "male" in term or "men" in term:
-            # User said "Male Only" -> Show ONLY 'male' environment
-            sql_parts.append("AND p.environment ILIKE 'male'")
-        elif "mixed" in term:
-            # User said "Mixed" -> Show 'mixed' environment
-            sql_parts.append("AND p.environment ILIKE 'mixed'")
-            
-
-    # B. LANDLORD COMPATIBILITY (Always Run)
-    # Ensure the landlord allows this person, regardless of environment.
-    if gender:
-        term = gender.lower()
-        if term == 'male':
-            sql_parts.append("AND (p.gender_preference ILIKE 'male' OR p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)")
-            # Safety: Male can't live in Female environment
-            sql_parts.append("AND (p.environment NOT ILIKE 'female' OR p.environment IS NULL)")
-            
-        elif term == 'female':
-            sql_parts.append("AND (p.gender_preference ILIKE 'female' OR p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)")
-            # Safety: Female can't live in Male environment
-            sql_parts.append("AND (p.environment NOT ILIKE 'male' OR p.environment IS NULL)")
-            
-        elif term == 'couple':
-             sql_parts.append("AND (p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'couple' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)")
-             sql_parts.append("AND (p.environment NOT ILIKE 'male' AND p.environment NOT ILIKE 'female')")
-    
+    # A. Strict environment (only if user explicitly asked)
+    env = (filters.get("environment") or "").lower()
+    if "female" in env or "ladies" in env:
+        keys.append("env_female")
+    elif "male" in env or "men" in env:
+        keys.append("env_male")
+    elif "mixed" in env:
+        keys.append("env_mixed")
+
+    # B. Landlord compatibility (always run)
+    gender = (filters.get("tenant_gender") or "").lower()
+    if gender in ("male", "female", "couple"):
+        keys.append(f"gender_{gender}")
+
     nationality = filters.get("tenant_nationality")
     if nationality:
-        sql_parts.append("""
-            AND (
-                p.nationality_preferences ILIKE :nationality_pattern
-                OR p.nationality_preferences ILIKE 'any'
-                OR p.nationality_preferences ILIKE 'all'
-                OR p.nationality_preferences IS NULL
-            )
-        """)
+        keys.append("nationality")
         params["nationality_pattern"] = f"%{nationality}%"
 
-    # 5. Room Type
+    # Room type
     if filters.get("room_type") == "Common" or filters.get("needs_ensuite") is False:
-        sql_parts.append("AND p.room_type ILIKE '%without attached%'")
+        keys.append("room_common")
     elif filters.get("room_type") == "Master" or filters.get("needs_ensuite") is True:
-        sql_parts.append("AND p.room_type ILIKE '%with attached%'")
+        keys.append("room_master")
 
-    # 6. Amenities
+    # Amenities
     if filters.get("needs_cooking"):
-        sql_parts.append("AND (p.cooking_allowed = true OR p.gas_stove = true)")
+        keys.append("cooking")
     if filters.get("needs_gym"):
-        sql_parts.append("AND p.gym = true")
+        keys.append("gym")
     if filters.get("needs_pool"):
-        sql_parts.append("AND p.swimming_pool = true")
+        keys.append("pool")
     if filters.get("needs_wifi"):
-        sql_parts.append("AND (p.wifi ILIKE 'true' OR p.wifi ILIKE 'available' OR p.wifi ILIKE 'free')")
+        keys.append("wifi")
 
-    # 7. Policies
+    # Policies
     if filters.get("has_pets"):
-        sql_parts.append("AND ((p.pet_policy NOT ILIKE '%not allowed%' AND p.pet_policy NOT ILIKE '%no pets%') OR p.pet_policy IS NULL)")
+        keys.append("pets")
     if filters.get("needs_visitor_allowance"):
-        sql_parts.append("AND (p.visitor_policy NOT ILIKE '%not allowed%' OR p.visitor_policy IS NULL)")
+        keys.append("visitors")
 
-    # 8. Availability
+    # Availability
     if filters.get("move_in_date"):
-        sql_parts.append("AND (p.available_from <= :move_in_date OR p.available_from IS NULL)")
+        keys.append("move_in")
         params["move_in_date"] = filters["move_in_date"]
 
-    # Sort & Limit
-    if lat and lng:
-        sql_parts.append("ORDER BY dist_meters ASC LIMIT 10")
+    # Verticals silently ignore filters they can't express (e.g. gender on resale)
+    supported = tuple(k for k in keys if k in vertical.predicates)
+    return supported, params
+
+# ---------------------------------------------
+# 2. COMPILER (cached per vertical + shape)
+# ---------------------------------------------
+
+def _location_mode(vertical: VerticalSchema, lat, lng, text_search_term) -> str:
+    if lat and lng and vertical.supports_geo:
+        return "geo"
+    if text_search_term:
+        return "text"
+    return "none"
+
+def _from_and_where(vertical: VerticalSchema, location_mode: str, radius_param: str = ":radius_m") -> List[str]:
+    """FROM + mandatory WHERE shared by the search and count templates."""
+    parts = [f"FROM {vertical.table} p"]
+    if location_mode == "geo":
+        parts.append("JOIN property_geolocations g ON p.property_id = g.property_id")
+    parts.append("WHERE p.agent_id = :agent_id")
+    parts.extend(f"AND {cond}" for cond in vertical.base_conditions)
+
+    if location_mode == "geo":
+        parts.append("AND " + GEO_RADIUS_SQL.format(radius=radius_param))
+    elif location_mode == "text":
+        ors = " OR ".join(f"p.{col} ILIKE :text_search" for col in vertical.text_columns)
+        parts.append(f"AND ({ors})")
+    return parts
+
+_CANDIDATE_ALIAS = re.compile(r"\bp\.")
+
+def _score_expression(vertical: VerticalSchema, predicate_keys: Tuple[str, ...], location_mode: str,
+                      amenity_keys: Tuple[str, ...]) -> str:
+    """
+    Weighted 0..1 components over the candidate rows (alias c). Components whose
+    inputs are not part of this search shape are left out of the template.
+    """
+    components = []
+    if location_mode == "geo":
+        components.append(":w_distance * EXP(-c.dist_meters / :distance_decay_m)")
+    if "budget" in predicate_keys:
+        price = f"c.{vertical.card.price}"
+        components.append(
+            f":w_budget * GREATEST(0, LEAST(1, CAST(:budget - {price} AS float) / NULLIF(:budget, 0)))"
+        )
+    if "move_in" in predicate_keys and vertical.available_column:
+        available = f"c.{vertical.available_column}"
+        # date - date is an integer: cast both sides, or Postgres types the decay as int (integer division)
+        components.append(
+            f":w_move_in * COALESCE(EXP(-CAST(ABS({available} - CAST(:move_in_date AS date)) AS float8)"
+            f" / CAST(:move_in_decay_days AS float8)), 0.5)"
+        )
+    if amenity_keys:
+        # The same predicate SQL the filter uses, over the candidate row
+        hits = " + ".join(
+            f"(CASE WHEN {_CANDIDATE_ALIAS.sub('c.', vertical.predicates[key])} THEN 1 ELSE 0 END)"
+            for key in amenity_keys
+        )
+        components.append(f":w_amenities * CAST({hits} AS float) / {len(amenity_keys)}")
+    return "\n        + ".join(components) or "0"
+
+@lru_cache(maxsize=1024)
+def compile_search(table: str, predicate_keys: Tuple[str, ...], location_mode: str, ranked: bool = False,
+                   amenity_keys: Tuple[str, ...] = ()):
+    """
+    Builds the SQL template for one (vertical, active filters, location mode) shape.
+    The result is cached: repeated searches only bind new parameter values.
+
+    ranked=True wraps the filtered query in a candidate CTE (:candidate_limit rows in
+    cheap sort order) and re-orders those candidates by a weighted score in the same pass.
+    amenity_keys: the amenities the user asked for (scored, whether or not still filtered on).
+    """
+    vertical = VERTICALS[table]
+
+    if location_mode == "geo":
+        distance = "ST_Distance(g.location, ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)::geography)"
     else:
-        sql_parts.append("ORDER BY p.monthly_rent ASC LIMIT 10")
-    
-    return text("\n".join(sql_parts)), params
\ No newline at end of file
+        distance = "0"
+
+    sql_parts = [f"SELECT p.*, {distance} AS dist_meters"]
+    sql_parts.extend(_from_and_where(vertical, location_mode))
+    sql_parts.extend(f"AND {vertical.predicates[key]}" for key in predicate_keys)
+
+    # Sort & Limit
+    sort_key = "distance" if location_mode == "geo" and "distance" in vertical.sort_keys else "price"
+
+    if not ranked:
+        sql_parts.append(f"ORDER BY {vertical.sort_keys[sort_key]} LIMIT :limit")
+        return text("\n".join(sql_parts))
+
+    sql_parts.append(f"ORDER BY {vertical.sort_keys[sort_key]} LIMIT :candidate_limit")
+    candidates = "\n    ".join(sql_parts)
+    score = _score_expression(vertical, predicate_keys, location_mode, amenity_keys)
+
+    return text(f"""
+    WITH candidates AS (
+    {candidates}
+    )
+    SELECT c.*, (
+        {score}
+    ) AS rank_score
+    FROM candidates c
+    ORDER BY rank_score DESC, c.dist_meters ASC
+    LIMIT :limit
+    """)
+
+@lru_cache(maxsize=1024)
+def compile_relaxation_counts(table: str, predicate_keys: Tuple[str, ...], location_mode: str):
+    """
+    One facet-count query for a zero-result search: for every relaxable filter,
+    COUNT(*) FILTER (...) with only that filter loosened and all others kept.
+    Returns None if nothing in this search can be relaxed.
+    """
+    vertical = VERTICALS[table]
+    preds = {key: vertical.predicates[key] for key in predicate_keys}
+    radius_sql = GEO_RADIUS_SQL.format(radius=":radius_m")
+
+    columns = []
+    for name, group in RELAXATION_GROUPS.items():
+        if name == "radius":
+            if location_mode != "geo":
+                continue
+            # The outer WHERE already uses the wider radius
+            conditions = list(preds.values())
+        else:
+            active = [key for key in group if key in preds]
+            if not active:
+                continue
+            conditions = [sql for key, sql in preds.items() if key not in active]
+            if name == "budget":
+                conditions.append(preds["budget"].replace(":budget", ":relaxed_budget"))
+            elif name == "move_in":
+                conditions.append(preds["move_in"].replace(":move_in_date", ":relaxed_move_in_date"))
+            if location_mode == "geo":
+                conditions.append(radius_sql)
+
+        where = " AND ".join(conditions) or "TRUE"
+        columns.append(f"COUNT(*) FILTER (WHERE {where}) AS {name}")
+
+    if not columns:
+        return None
+
+    sql_parts = ["SELECT " + ",\n    ".join(columns)]
+    sql_parts.extend(_from_and_where(vertical, location_mode, radius_param=":outer_radius_m"))
+    return text("\n".join(sql_parts))
+
+# ---------------------------------------------
+# 3. PUBLIC ENTRY POINT
+# ---------------------------------------------
+
+def _bind_location(params: Dict, location_mode: str, lat, lng, text_search_term):
+    if location_mode == "geo":
+        params.update({"lat": lat, "lng": lng, "radius_m": DEFAULT_RADIUS_METERS})
+    elif location_mode == "text":
+        params["text_search"] = f"%{text_search_term}%"
+
+def _relaxed_values(params: Dict) -> Dict:
+    """The loosened value offered for each relaxation."""
+    values = {
+        "radius": DEFAULT_RADIUS_METERS * RADIUS_RELAX_FACTOR,
+        "nationality": None,
+        "room_type": None,
+    }
+    if params.get("budget"):
+        values["budget"] = int(round(params["budget"] * BUDGET_RELAX_FACTOR))
+    if params.get("move_in_date"):
+        try:
+            move_in = datetime.strptime(params["move_in_date"], "%Y-%m-%d").date()
+            values["move_in"] = (move_in + timedelta(days=MOVE_IN_RELAX_DAYS)).isoformat()
+        except ValueError:
+            pass
+    return values
+
+def _apply_relaxation(predicate_keys: Tuple[str, ...], params: Dict, relaxation: Optional[Dict]):
+    """Applies an accepted relaxation offer (see choose_relaxation) to a search."""
+    if not relaxation:
+        return predicate_keys, params
+
+    name, value = relaxation.get("name"), relaxation.get("value")
+    if name in ("nationality", "room_type"):
+        dropped = RELAXATION_GROUPS[name]
+        predicate_keys = tuple(k for k in predicate_keys if k not in dropped)
+    elif name == "budget" and "budget" in params:
+        params["budget"] = value
+    elif name == "move_in" and "move_in_date" in params:
+        params["move_in_date"] = value
+    elif name == "radius" and "radius_m" in params:
+        params["radius_m"] = value
+    return predicate_keys, params
+
+def build_property_query(filters: dict, agent_id: str, lat: float = None, lng: float = None,
+                         text_search_term: str = None, target_table: str = None, limit: int = DEFAULT_LIMIT,
+                         relaxation: Optional[Dict] = None, ranking: Optional[RankingWeights] = None,
+                         candidate_limit: int = 200):
+    """
+    Returns (query, params). Pass ranking weights to score up to candidate_limit
+    matches and return the best `limit` instead of the cheapest/closest.
+    """
+    vertical = get_vertical(target_table)
+    predicate_keys, params = resolve_predicates(vertical, filters)
+    location_mode = _location_mode(vertical, lat, lng, text_search_term)
+
+    params.update({
+        "agent_id": agent_id,
+        "limit": limit,
+    })
+    _bind_location(params, location_mode, lat, lng, text_search_term)
+    amenity_keys = tuple(k for k in predicate_keys if k in AMENITY_KEYS)
+    predicate_keys, params = _apply_relaxation(predicate_keys, params, relaxation)
+
+    if ranking is not None:
+        params.update(ranking.as_params())
+        params["candidate_limit"] = max(candidate_limit, limit)
+
+    if ranking is None:
+        return compile_search(vertical.table, predicate_keys, location_mode), params
+    return compile_search(vertical.table, predicate_keys, location_mode, True, amenity_keys), params
+
+def build_relaxation_query(filters: dict, agent_id: str, lat: float = None, lng: float = None,
+                           text_search_term: str = None, target_table: str = None):
+    """
+    Same arguments as build_property_query. Returns (query, params), or (None, None)
+    if the search has no relaxable filter.
+    """
+    vertical = get_vertical(target_table)
+    predicate_keys, params = resolve_predicates(vertical, filters)
+    location_mode = _location_mode(vertical, lat, lng, text_search_term)
+
+    query = compile_relaxation_counts(vertical.table, predicate_keys, location_mode)
+    if query is None:
+        return None, None
+
+    params["agent_id"] = agent_id
+    _bind_location(params, location_mode, lat, lng, text_search_term)
+
+    relaxed = _relaxed_values(params)
+    if location_mode == "geo":
+        params["outer_radius_m"] = relaxed["radius"]
+    if "budget" in relaxed:
+        params["relaxed_budget"] = relaxed["budget"]
+    # Always bound: the template references it whenever move_in is active
+    params["relaxed_move_in_date"] = relaxed.get("move_in", params.get("move_in_date"))
+
+    return query, params
+
+def choose_relaxation(counts: Dict[str, int], params: Dict) -> Optional[Dict]:
+    """
+    Picks the single relaxation that unblocks the most listings.
+    Returns an offer dict {name, value, count, label, alternatives} or None.
+    """
+    relaxed = _relaxed_values(params)
+    candidates = [(name, counts.get(name) or 0) for name in RELAXATION_GROUPS if (counts.get(name) or 0) > 0]
+    if not candidates:
+        return None
+
+    # max() keeps the first on ties -> RELAXATION_GROUPS order is the preference
+    best_name, best_count = max(candidates, key=lambda c: c[1])
+    value = relaxed.get(best_name)
+
+    labels = {
+        "budget": lambda v: f"stretch the budget to ${v:,}",
+        "radius": lambda v: f"widen the search to {v // 1000}km",
+        "move_in": lambda v: f"move in a little later (available by {v})",
+        "room_type": lambda v: "consider other room types",
+        "nationality": lambda v: "include listings with other nationality preferences (the landlord may be flexible)",
+    }
+
+    return {
+        "name": best_name,
+        "value": value,
+        "count": best_count,
+        "label": labels[best_name](value),
+        "alternatives": {name: count for name, count in candidates if name != best_name},
+    }
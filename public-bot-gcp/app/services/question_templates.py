@@ -0,0 +1,126 @@
+import json
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Phrasing variants per generator step. Placeholders: {agent_name}, {company_name},
+# {location}, {budget}, {move_in_date}, {environment}, {available}
+DEFAULT_TEMPLATES: Dict[str, List[str]] = {
+    # --- Questions (generator missing_map steps) ---
+    "ask_location": [
+        "Where would you love to live? An area or nearest MRT works.",
+        "Which area or MRT station would you like to be near?",
+    ],
+    "ask_budget": [
+        "What's your monthly rental budget?",
+        "How much are you looking to spend on rent per month?",
+    ],
+    "ask_date": [
+        "When are you planning to move in?",
+        "When would you like to move in?",
+    ],
+    "ask_gender": [
+        "May I know your gender? It helps me match you with suitable flatmates.",
+        "Could you share your gender so I can match you with suitable flatmates?",
+    ],
+    "ask_nationality": [
+        "May I know your nationality?",
+        "Could you share your nationality? Some units have tenant mix preferences.",
+    ],
+
+    # --- Acknowledgements of what the user just gave us ---
+    "ack_location_query": ["Alright, noted — looking around {location}.", "Got it, {location} it is."],
+    "ack_budget_max": ["Got it, working with up to ${budget}.", "Noted, up to ${budget} a month."],
+    "ack_move_in_date": ["Alright, I'll keep {move_in_date} in mind as your move-in date.", "Noted, moving in around {move_in_date}."],
+    "ack_tenant_gender": ["Understood."],
+    "ack_tenant_nationality": ["Understood.", "Thanks."],
+    "ack_confirmation": ["Perfect, thanks."],
+
+    # --- Inventory status ---
+    "inventory_unavailable": [
+        "Sorry, we don't have {environment} units right now — we only have {available} options. "
+        "Would you like to go ahead with those?",
+    ],
+    "inventory_confirmed": [
+        "Good news, we do have {environment} options available. Shall I continue with your search?",
+    ],
+}
+
+# Order in which a multi-field update is acknowledged (only the first one is)
+ACK_FIELDS = ["location_query", "budget_max", "move_in_date", "tenant_gender", "tenant_nationality"]
+
+class _Blank(dict):
+    def __missing__(self, key):
+        return ""
+
+def _parse_json_setting(name: str, raw: str) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON in {name}: {e}. Using defaults.")
+        return {}
+
+@lru_cache(maxsize=None)
+def _default_templates() -> Dict[str, List[str]]:
+    return {**DEFAULT_TEMPLATES, **_parse_json_setting("GENERATOR_TEMPLATES", settings.GENERATOR_TEMPLATES)}
+
+@lru_cache(maxsize=None)
+def _agent_overrides() -> Dict[str, dict]:
+    return _parse_json_setting("GENERATOR_AGENT_TEMPLATES", settings.GENERATOR_AGENT_TEMPLATES)
+
+@lru_cache(maxsize=1024)
+def get_templates(agent_id: str) -> Dict[str, List[str]]:
+    """
+    Global templates (GENERATOR_TEMPLATES) with optional per-agent phrasing
+    (GENERATOR_AGENT_TEMPLATES = {"<agent_id>": {"ask_budget": ["...", "..."]}}).
+    """
+    overrides = _agent_overrides().get(agent_id)
+    if not overrides:
+        return _default_templates()
+    return {**_default_templates(), **overrides}
+
+def has_template(agent_id: str, key: str) -> bool:
+    return bool(get_templates(agent_id).get(key))
+
+def render(agent_id: str, key: str, turn: int, **values) -> str:
+    """
+    One variant of `key`, rotated by turn so a re-asked question is phrased differently.
+    Unknown placeholders render empty.
+    """
+    variants = get_templates(agent_id).get(key) or []
+    if not variants:
+        return ""
+    return variants[turn % len(variants)].format_map(_Blank(values))
+
+def format_values(filters, **extra) -> dict:
+    """Template placeholder values from the current filters."""
+    values = dict(extra)
+    if filters is None:
+        return values
+    if filters.location_query:
+        values["location"] = filters.location_query
+    if filters.budget_max:
+        values["budget"] = f"{filters.budget_max:,}"
+    if filters.move_in_date:
+        try:
+            d = datetime.strptime(filters.move_in_date, "%Y-%m-%d")
+            values["move_in_date"] = f"{d.day} {d:%b}"
+        except ValueError:
+            values["move_in_date"] = filters.move_in_date
+    return values
+
+def acknowledgement(agent_id: str, turn: int, filter_updates: Optional[dict], is_confirmation: bool, values: dict) -> str:
+    """Short reaction to what the user just said (first changed filter, else a plain confirmation)."""
+    for field in ACK_FIELDS:
+        if (filter_updates or {}).get(field):
+            return render(agent_id, f"ack_{field}", turn, **values)
+    if is_confirmation:
+        return render(agent_id, "ack_confirmation", turn, **values)
+    return ""
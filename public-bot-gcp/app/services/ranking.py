@@ -0,0 +1,78 @@
+import json
+import logging
+from functools import lru_cache
+from typing import Dict
+
+from pydantic import BaseModel, Field, ValidationError
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class RankingWeights(BaseModel):
+    """
+    Weights for the multi-criteria ranking stage in query_builder.compile_search.
+    Every component is normalised to 0..1 before weighting. Unknown keys and
+    out-of-range values are rejected (they become SQL parameters).
+    """
+    distance: float = Field(0.4, ge=0)     # exp(-dist / distance_decay_m), geo searches only
+    budget: float = Field(0.3, ge=0)       # Share of the budget left over
+    move_in: float = Field(0.15, ge=0)     # exp(-|available_from - move_in| / move_in_decay_days)
+    amenities: float = Field(0.15, ge=0)   # Share of the amenities the user asked for that the listing has
+
+    distance_decay_m: float = Field(1500, gt=0)
+    move_in_decay_days: float = Field(30, gt=0)
+
+    class Config:
+        extra = "forbid"
+
+    def as_params(self) -> Dict[str, float]:
+        return {
+            "w_distance": self.distance,
+            "w_budget": self.budget,
+            "w_move_in": self.move_in,
+            "w_amenities": self.amenities,
+            "distance_decay_m": self.distance_decay_m,
+            "move_in_decay_days": self.move_in_decay_days,
+        }
+
+def _parse_json_setting(name: str, raw: str) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except json.JSONDecodeError as e:
+        logger.error(f"Invalid JSON in {name}: {e}. Using defaults.")
+        return {}
+
+@lru_cache(maxsize=None)
+def _default_weights() -> RankingWeights:
+    try:
+        return RankingWeights.model_validate(_parse_json_setting("RANKING_WEIGHTS", settings.RANKING_WEIGHTS))
+    except ValidationError as e:
+        logger.error(f"Invalid RANKING_WEIGHTS: {e}. Using defaults.")
+        return RankingWeights()
+
+@lru_cache(maxsize=None)
+def _agent_overrides() -> Dict[str, dict]:
+    overrides = _parse_json_setting("RANKING_AGENT_WEIGHTS", settings.RANKING_AGENT_WEIGHTS)
+    if not isinstance(overrides, dict):
+        logger.error("RANKING_AGENT_WEIGHTS must be a JSON object. Ignoring it.")
+        return {}
+    return overrides
+
+@lru_cache(maxsize=1024)
+def get_ranking_weights(agent_id: str) -> RankingWeights:
+    """
+    Global defaults (RANKING_WEIGHTS) with optional per-agent overrides
+    (RANKING_AGENT_WEIGHTS = {"<agent_id>": {"distance": 0.6, ...}}).
+    """
+    overrides = _agent_overrides().get(agent_id)
+    if not overrides:
+        return _default_weights()
+    try:
+        # Validated like the defaults (model_copy(update=...) would skip validation)
+        return RankingWeights.model_validate({**_default_weights().model_dump(), **overrides})
+    except (ValidationError, TypeError) as e:
+        logger.error(f"Invalid ranking weights for agent {agent_id}: {e}. Using defaults.")
+        return _default_weights()
@@ -0,0 +1,25 @@
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# --- SHARED CLIENT ---
+# One connection pool per process, opened on first use (values are bytes: callers serialize).
+_redis: Optional[redis.Redis] = None
+
+def get_redis() -> redis.Redis:
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(settings.REDIS_URL, decode_responses=False)
+        logger.info("🔌 Shared Redis client ready")
+    return _redis
+
+async def close_redis():
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
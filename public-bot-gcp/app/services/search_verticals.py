@@ -0,0 +1,292 @@
+"""
+Schema registry for every property vertical the router can target.
+
+Each VerticalSchema describes one table: how to filter it, how to sort it and
+which columns make up a listing card. The query compiler in query_builder.py
+turns these descriptions into cached SQL templates, so adding a vertical is a
+registry entry, not new query code.
+
+NOTE: Only coliving_property is mirrored in app/db/models.py. Column names for the
+other tables follow the same naming conventions and are kept here in one place so
+they can be corrected without touching the compiler. Every vertical (or the ones
+listed in SEARCH_VERTICALS) is searchable once verify_verticals() has found all of
+its columns in the live table at startup; until then, and for any vertical whose
+columns don't match, only the mirrored coliving_property is searched.
+"""
+import logging
+import re
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Set
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class CardFields(BaseModel):
+    """Which columns feed the WhatsApp listing card."""
+    name: str = "property_name"
+    price: str = "monthly_rent"
+    subtitle: Optional[str] = "room_type"
+    location: Optional[str] = "nearest_mrt"
+    unit_ref: Optional[str] = "room_number"
+    address: Optional[str] = "property_address"
+    description: Optional[str] = "description"
+    media: Optional[str] = "media"
+
+class VerticalSchema(BaseModel):
+    table: str
+    label: str                       # Human friendly name ("Co-living Spaces")
+    id_column: str = "property_id"   # Primary key (PropertyCard.id, property detail cache)
+    capability_column: str           # Agent column that enables this vertical
+    default_name: str = "Property"   # Card fallback when property_name is empty
+    price_suffix: str = "/mo"
+
+    # --- Filtering ---
+    base_conditions: List[str] = Field(default_factory=lambda: ["p.listing_status = 'active'"])
+    text_columns: List[str] = Field(default_factory=lambda: ["property_name", "property_address", "district"])
+    supports_geo: bool = False       # Has rows in property_geolocations
+    predicates: Dict[str, str] = Field(default_factory=dict)   # predicate key -> SQL fragment
+
+    # --- Sorting & Ranking ---
+    sort_keys: Dict[str, str] = Field(default_factory=dict)    # "price" / "distance" -> ORDER BY clause
+    available_column: Optional[str] = None                    # Date column for the move-in gap score
+
+    # --- Conversation ---
+    required_filters: List[str] = Field(default_factory=lambda: ["location_query", "budget_max"])
+    card: CardFields = Field(default_factory=CardFields)
+
+    class Config:
+        frozen = True
+
+# ---------------------------------------------
+# SHARED PREDICATES
+# ---------------------------------------------
+
+# Co-living style rooms. There is no 'environment' column: the living environment
+# is what the landlord's gender_preference allows.
+ROOM_PREDICATES = {
+    "budget": "p.monthly_rent <= :budget",
+
+    # A. Strict environment (only if the user explicitly asked)
+    "env_female": "(p.gender_preference ILIKE 'female%' OR p.gender_preference ILIKE 'ladies%' OR p.gender_preference ILIKE 'women%')",
+    "env_male": "(p.gender_preference ILIKE 'male%' OR p.gender_preference ILIKE 'men%')",
+    "env_mixed": "(p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)",
+
+    # B. Landlord compatibility (always run)
+    "gender_male": "(p.gender_preference ILIKE 'male' OR p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)",
+    "gender_female": "(p.gender_preference ILIKE 'female' OR p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)",
+    "gender_couple": "(p.gender_preference ILIKE 'any' OR p.gender_preference ILIKE 'couple' OR p.gender_preference ILIKE 'mixed' OR p.gender_preference IS NULL)",
+
+    "nationality": """(
+            p.nationality_preferences ILIKE :nationality_pattern
+            OR p.nationality_preferences ILIKE 'any'
+            OR p.nationality_preferences ILIKE 'all'
+            OR p.nationality_preferences IS NULL
+        )""",
+
+    "room_common": "p.room_type ILIKE '%without attached%'",
+    "room_master": "p.room_type ILIKE '%with attached%'",
+
+    "cooking": "(p.cooking_allowed = true OR p.gas_stove = true)",
+    "gym": "p.gym = true",
+    "pool": "p.swimming_pool = true",
+    "wifi": "(p.wifi ILIKE 'true' OR p.wifi ILIKE 'available' OR p.wifi ILIKE 'free')",
+
+    "pets": "((p.pet_policy NOT ILIKE '%not allowed%' AND p.pet_policy NOT ILIKE '%no pets%') OR p.pet_policy IS NULL)",
+    "visitors": "(p.visitor_policy NOT ILIKE '%not allowed%' OR p.visitor_policy IS NULL)",
+
+    "move_in": "(p.available_from <= CAST(:move_in_date AS date) OR p.available_from IS NULL)",
+}
+
+ROOM_SORT_KEYS = {
+    "price": "p.monthly_rent ASC",
+    "distance": "dist_meters ASC",
+}
+
+ROOM_REQUIRED_FILTERS = ["location_query", "budget_max", "move_in_date", "tenant_gender", "tenant_nationality"]
+
+def _rental_predicates(price_column: str) -> Dict[str, str]:
+    return {
+        "budget": f"p.{price_column} <= :budget",
+        "pets": ROOM_PREDICATES["pets"],
+        "move_in": ROOM_PREDICATES["move_in"],
+    }
+
+def _sale_predicates(price_column: str) -> Dict[str, str]:
+    return {"budget": f"p.{price_column} <= :budget"}
+
+def _price_sort(price_column: str) -> Dict[str, str]:
+    return {"price": f"p.{price_column} ASC"}
+
+# ---------------------------------------------
+# REGISTRY
+# ---------------------------------------------
+
+VERTICALS: Dict[str, VerticalSchema] = {
+    "coliving_property": VerticalSchema(
+        table="coliving_property",
+        label="Co-living Spaces",
+        capability_column="co_living_property",
+        default_name="Coliving Unit",
+        base_conditions=["p.listing_status = 'active'", "p.current_listing = 'Available to rent'"],
+        text_columns=["property_name", "property_address", "nearest_mrt", "district"],
+        supports_geo=True,
+        predicates=ROOM_PREDICATES,
+        sort_keys=ROOM_SORT_KEYS,
+        available_column="available_from",
+        required_filters=ROOM_REQUIRED_FILTERS,
+    ),
+    "rooms_for_rent": VerticalSchema(
+        table="rooms_for_rent",
+        label="Standard Rooms",
+        capability_column="rooms_for_rent",
+        default_name="Room",
+        base_conditions=["p.listing_status = 'active'", "p.current_listing = 'Available to rent'"],
+        text_columns=["property_name", "property_address", "nearest_mrt", "district"],
+        supports_geo=True,
+        predicates=ROOM_PREDICATES,
+        sort_keys=ROOM_SORT_KEYS,
+        available_column="available_from",
+        required_filters=ROOM_REQUIRED_FILTERS,
+    ),
+    "residential_properties_for_rent": VerticalSchema(
+        table="residential_properties_for_rent",
+        label="Whole Unit Rentals",
+        capability_column="residential_property_rent",
+        default_name="Residential Unit",
+        text_columns=["property_name", "property_address", "nearest_mrt", "district"],
+        predicates=_rental_predicates("monthly_rent"),
+        sort_keys=_price_sort("monthly_rent"),
+        available_column="available_from",
+        required_filters=["location_query", "budget_max", "move_in_date"],
+        card=CardFields(subtitle="property_type", unit_ref="unit_number"),
+    ),
+    "residential_properties_for_resale": VerticalSchema(
+        table="residential_properties_for_resale",
+        label="Residential Sales",
+        capability_column="residential_property_resale",
+        default_name="Residential Unit",
+        price_suffix="",
+        predicates=_sale_predicates("asking_price"),
+        sort_keys=_price_sort("asking_price"),
+        card=CardFields(price="asking_price", subtitle="property_type", location="district", unit_ref="unit_number"),
+    ),
+    "residential_properties_for_sale_by_developers": VerticalSchema(
+        table="residential_properties_for_sale_by_developers",
+        label="New Launch Residential",
+        capability_column="residential_property_developer",
+        default_name="New Launch",
+        price_suffix="",
+        predicates=_sale_predicates("starting_price"),
+        sort_keys=_price_sort("starting_price"),
+        card=CardFields(price="starting_price", subtitle="property_type", location="district", unit_ref=None),
+    ),
+    "commercial_properties_for_rent": VerticalSchema(
+        table="commercial_properties_for_rent",
+        label="Commercial Rentals",
+        capability_column="commercial_property_rent",
+        default_name="Commercial Space",
+        predicates=_rental_predicates("monthly_rent"),
+        sort_keys=_price_sort("monthly_rent"),
+        available_column="available_from",
+        required_filters=["location_query", "budget_max", "move_in_date"],
+        card=CardFields(subtitle="property_type", location="district", unit_ref="unit_number"),
+    ),
+    "commercial_properties_for_resale": VerticalSchema(
+        table="commercial_properties_for_resale",
+        label="Commercial Sales",
+        capability_column="commercial_property_resale",
+        default_name="Commercial Space",
+        price_suffix="",
+        predicates=_sale_predicates("asking_price"),
+        sort_keys=_price_sort("asking_price"),
+        card=CardFields(price="asking_price", subtitle="property_type", location="district", unit_ref="unit_number"),
+    ),
+    "commercial_properties_for_sale_by_developers": VerticalSchema(
+        table="commercial_properties_for_sale_by_developers",
+        label="New Launch Commercial",
+        capability_column="commercial_property_developer",
+        default_name="New Launch",
+        price_suffix="",
+        predicates=_sale_predicates("starting_price"),
+        sort_keys=_price_sort("starting_price"),
+        card=CardFields(price="starting_price", subtitle="property_type", location="district", unit_ref=None),
+    ),
+}
+
+DEFAULT_VERTICAL = "coliving_property"
+
+def get_vertical(table_name: Optional[str]) -> VerticalSchema:
+    """Missing tables fall back to co-living (the router's default); unknown ones raise ValueError."""
+    vertical = VERTICALS.get(table_name or DEFAULT_VERTICAL)
+    if vertical is None:
+        raise ValueError(f"Unknown vertical {table_name!r}")
+    return vertical
+
+# --- Enabled verticals ---
+
+# Mirrored in app/db/models.py, so searchable without the startup check
+_MIRRORED = {DEFAULT_VERTICAL}
+
+def _configured() -> Set[str]:
+    tables = {t.strip() for t in settings.SEARCH_VERTICALS.split(",") if t.strip()}
+    if not tables:
+        return set(VERTICALS)
+    unknown = tables - set(VERTICALS)
+    if unknown:
+        logger.error(f"Ignoring unknown SEARCH_VERTICALS {sorted(unknown)}")
+    return tables & set(VERTICALS)
+
+_configured_tables: Set[str] = _configured()
+_enabled: Set[str] = _configured_tables & _MIRRORED
+
+def is_enabled(table_name: Optional[str]) -> bool:
+    """Whether searches may query this vertical's table."""
+    return (table_name or DEFAULT_VERTICAL) in _enabled
+
+_COLUMN_REF = re.compile(r"\bp\.(\w+)")
+
+def referenced_columns(vertical: VerticalSchema) -> Set[str]:
+    """Every column of the vertical's table that the compiled queries and the listing card use."""
+    columns = {vertical.id_column, "agent_id", *vertical.text_columns}
+    for sql in [*vertical.base_conditions, *vertical.predicates.values(), *vertical.sort_keys.values()]:
+        columns.update(_COLUMN_REF.findall(sql))
+    if vertical.available_column:
+        columns.add(vertical.available_column)
+    columns.update(c for c in vertical.card.model_dump().values() if c)
+    return columns
+
+async def verify_verticals():
+    """
+    Checks the configured verticals' columns against information_schema, enables
+    the ones that match and disables the rest (logged). Called once from the app
+    lifespan; if the check itself fails, only the mirrored verticals stay enabled.
+    """
+    # Imported here: the registry is also used by modules that never touch the database
+    from sqlalchemy import text
+    from app.db.session import engine
+
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(text(
+                "SELECT table_name, column_name FROM information_schema.columns WHERE table_name = ANY(:tables)"
+            ), {"tables": sorted(_configured_tables)})
+            existing: Dict[str, Set[str]] = {}
+            for table, column in result.all():
+                existing.setdefault(table, set()).add(column)
+    except Exception as e:
+        logger.error(f"Search vertical schema check failed: {e}")
+        return
+
+    for table in sorted(_configured_tables):
+        if table not in existing:
+            _enabled.discard(table)
+            logger.error(f"❌ Search vertical {table} disabled: table not found")
+            continue
+        missing = referenced_columns(VERTICALS[table]) - existing[table]
+        if missing:
+            _enabled.discard(table)
+            logger.error(f"❌ Search vertical {table} disabled: missing columns {sorted(missing)}")
+        else:
+            _enabled.add(table)
+            logger.info(f"✅ Search vertical {table} matches the schema")
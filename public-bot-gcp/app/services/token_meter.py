@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import async_session_factory
+
+logger = logging.getLogger(__name__)
+
+# No agent label: /metrics is unauthenticated and one series per agent is unbounded
+metrics.describe("agent_tokens_total", "LLM tokens billed to agents per node and kind (prompt/completion)")
+metrics.describe("token_meter_flushes_total", "Batched tokens_available updates by outcome (ok/failed)")
+metrics.describe("token_meter_unflushed_tokens", "Tokens recorded but not yet written to agent.tokens_available")
+metrics.describe("token_quota_rejections_total", "Webhooks refused because the agent has no tokens left")
+
+# Agent whose conversation is being handled. Set at webhook ingress; asyncio tasks
+# copy the context, so background jobs started from the request are billed too.
+current_agent_id: ContextVar[Optional[str]] = ContextVar("current_agent_id", default=None)
+
+FLUSH_SQL = text("""
+    UPDATE agent AS a
+    SET tokens_available = a.tokens_available - v.used
+    FROM unnest(CAST(:agent_ids AS varchar[]), CAST(:used AS bigint[])) AS v(agent_id, used)
+    WHERE a.agent_id = v.agent_id
+      AND a.tokens_available IS NOT NULL
+""")
+
+class TokenMeter:
+    """
+    Per-agent LLM token accounting against agent.tokens_available.
+
+    - record(): called by llm_gateway for every completed call with the API `usage`;
+      only touches in-memory counters.
+    - A background task flushes the pending totals as ONE batched UPDATE every
+      flush_seconds (and once more on shutdown). A failed flush keeps the totals
+      for the next round. The per-node breakdown is logged (debug) and reset on
+      every flush, so memory is bounded by the agents active in one interval.
+    - has_quota(): ingress check on the agent row the webhook already loaded,
+      minus what this worker used since its last flush. No extra query.
+
+    NULL tokens_available means unmetered (no quota). Per worker process: other
+    workers' usage shows up once they flush.
+    """
+
+    def __init__(self, flush_seconds: float):
+        self.flush_seconds = flush_seconds
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._flushing: Dict[str, int] = {}
+        self._usage: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {"prompt": 0, "completion": 0})
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    # --- 1. Ingress ---
+
+    def bind(self, agent_id: str):
+        """Bills the LLM calls of the current request (and tasks it spawns) to agent_id."""
+        current_agent_id.set(agent_id)
+
+    def unflushed(self, agent_id: str) -> int:
+        return self._pending.get(agent_id, 0) + self._flushing.get(agent_id, 0)
+
+    def has_quota(self, agent) -> bool:
+        if not settings.TOKEN_QUOTA_ENFORCED or agent.tokens_available is None:
+            return True
+        remaining = agent.tokens_available - self.unflushed(agent.agent_id)
+        if remaining > 0:
+            return True
+        metrics.incr("token_quota_rejections_total")
+        logger.warning(f"🪙 Agent {agent.agent_id} is out of tokens ({remaining} left on plan {agent.current_plan}).")
+        return False
+
+    # --- 2. Recording ---
+
+    def record(self, node: str, prompt_tokens: int, completion_tokens: int, agent_id: Optional[str] = None):
+        agent_id = agent_id or current_agent_id.get()
+        if not settings.TOKEN_METERING_ENABLED or not agent_id:
+            return
+        used = (prompt_tokens or 0) + (completion_tokens or 0)
+        if not used:
+            return
+
+        self._pending[agent_id] += used
+        usage = self._usage[(agent_id, node)]
+        usage["prompt"] += prompt_tokens or 0
+        usage["completion"] += completion_tokens or 0
+        metrics.incr("agent_tokens_total", prompt_tokens or 0, node=node, kind="prompt")
+        metrics.incr("agent_tokens_total", completion_tokens or 0, node=node, kind="completion")
+
+    def usage(self, agent_id: str) -> Dict[str, Dict[str, int]]:
+        """Tokens per node recorded by this worker since the last flush."""
+        return {node: dict(u) for (a, node), u in self._usage.items() if a == agent_id}
+
+    # --- 3. Flushing ---
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            self._flushing, self._pending = dict(self._pending), defaultdict(int)
+            usage, self._usage = self._usage, defaultdict(lambda: {"prompt": 0, "completion": 0})
+            for (agent_id, node), u in usage.items():
+                logger.debug(f"🪙 {agent_id} / {node}: {u['prompt']} prompt + {u['completion']} completion tokens")
+            try:
+                async with async_session_factory() as session:
+                    await session.execute(FLUSH_SQL, {
+                        "agent_ids": list(self._flushing),
+                        "used": list(self._flushing.values()),
+                    })
+                    await session.commit()
+                metrics.incr("token_meter_flushes_total", outcome="ok")
+                logger.info(f"🪙 Flushed token usage for {len(self._flushing)} agent(s).")
+            except Exception as e:
+                # Put the usage back; it goes out with the next batch
+                for agent_id, used in self._flushing.items():
+                    self._pending[agent_id] += used
+                metrics.incr("token_meter_flushes_total", outcome="failed")
+                logger.error(f"Token usage flush failed: {e}")
+            finally:
+                self._flushing = {}
+                metrics.set_gauge("token_meter_unflushed_tokens", sum(self._pending.values()))
+
+    async def start(self):
+        if self._task or not settings.TOKEN_METERING_ENABLED:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+token_meter = TokenMeter(flush_seconds=settings.TOKEN_METER_FLUSH_SECONDS)
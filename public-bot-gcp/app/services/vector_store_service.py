@@ -0,0 +1,311 @@
+"""
+Knowledge base retrieval over pgvector.
+
+Every passage of an agent (one per FAQ, token windows per document, produced by
+app/services/kb_ingestion.py into knowledge_base_passages) is embedded once into
+knowledge_base_chunks. intelligent_chat then gets the top-k chunks for the
+user's question instead of the whole KB, so the prompt and the rows read per
+turn stay the same size no matter how much an agent uploads.
+
+- Indexing is incremental: a sync only embeds passages that have no chunk for the
+  current embedder yet (in batches, committed as they go) and deletes chunks whose
+  passage disappeared. Changing the embedder re-embeds everything on the next sync.
+- kb_changes notifications run ingestion + sync after a short debounce (see
+  kb_ingestion); scripts/index_knowledge_base.py backfills.
+- Agents without chunks (not indexed yet) fall back to the full KB for a while.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.db.session import async_session_factory, engine
+from app.services.llm_gateway import llm_gateway
+from app.services.openai_service import get_llm_client
+from app.services.token_meter import token_meter
+
+logger = logging.getLogger(__name__)
+
+metrics.describe("kb_retrieval_total", "Knowledge base lookups by result (vector/bm25/not_indexed/no_match/error)")
+metrics.describe("kb_retrieval_ms", "Query embedding + vector search time")
+metrics.describe("kb_chunks_embedded_total", "Knowledge base chunks embedded by the indexer")
+metrics.describe("kb_syncs_total", "Knowledge base index syncs by outcome (ok/failed)")
+
+# --- 0. Retrieval mode ---
+
+RETRIEVAL_MODES = ("vector", "bm25", "full")
+
+@lru_cache(maxsize=1)
+def _retrieval_overrides() -> Dict[str, str]:
+    if not settings.KB_RETRIEVAL_BY_AGENT:
+        return {}
+    try:
+        overrides = {str(k): str(v) for k, v in json.loads(settings.KB_RETRIEVAL_BY_AGENT).items()}
+    except (json.JSONDecodeError, AttributeError) as e:
+        logger.error(f"Invalid JSON in KB_RETRIEVAL_BY_AGENT: {e}. Using KB_RETRIEVAL for every agent.")
+        return {}
+    unknown = {k: v for k, v in overrides.items() if v not in RETRIEVAL_MODES}
+    if unknown:
+        logger.error(f"Ignoring KB_RETRIEVAL_BY_AGENT entries {unknown}, expected one of {list(RETRIEVAL_MODES)}")
+    return {k: v for k, v in overrides.items() if k not in unknown}
+
+def retrieval_mode(agent_id: str) -> str:
+    """KB_RETRIEVAL, unless KB_RETRIEVAL_BY_AGENT overrides it (e.g. bm25 for tenants without embeddings)."""
+    return _retrieval_overrides().get(agent_id, settings.KB_RETRIEVAL)
+
+def retrieval_modes() -> Set[str]:
+    """Every mode in use, so startup only installs what some agent needs."""
+    return {settings.KB_RETRIEVAL, *_retrieval_overrides().values()}
+
+# --- 1. Embedders ---
+
+EMBED_BATCH_SIZE = 64
+
+class OpenAIEmbedder:
+    """
+    Remote embeddings through the shared LLM client and the gateway (deadline,
+    retries, circuit breaker; usage is metered there). Dimensions are truncated
+    server-side.
+    """
+
+    def __init__(self, model: str, dimensions: int):
+        self.model = model
+        self.dimensions = dimensions
+        self.name = f"openai:{model}:{dimensions}"
+
+    async def embed(self, texts: List[str], node: str = "kb_embedding") -> List[List[float]]:
+        vectors = []
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            response = await llm_gateway.embed(
+                node, get_llm_client(),
+                model=self.model,
+                input=texts[i:i + EMBED_BATCH_SIZE],
+                dimensions=self.dimensions,
+            )
+            vectors.extend(item.embedding for item in sorted(response.data, key=lambda d: d.index))
+        return vectors
+
+class LocalEmbedder:
+    """
+    In-process sentence-transformers model (optional dependency), run in a worker
+    thread. No per-call cost or network hop; pick a model whose size matches
+    KB_EMBEDDING_DIMENSIONS (e.g. all-MiniLM-L6-v2 = 384).
+    """
+
+    def __init__(self, model: str, dimensions: int):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise RuntimeError("KB_EMBEDDER=local needs the sentence-transformers package") from e
+        self._model = SentenceTransformer(model, truncate_dim=dimensions)
+        size = self._model.get_sentence_embedding_dimension()
+        if size != dimensions:
+            raise ValueError(f"{model} embeds to {size} dimensions, KB_EMBEDDING_DIMENSIONS is {dimensions}")
+        self.dimensions = dimensions
+        self.name = f"local:{model}:{dimensions}"
+
+    async def embed(self, texts: List[str], node: str = "kb_embedding") -> List[List[float]]:
+        def encode():
+            return self._model.encode(texts, batch_size=EMBED_BATCH_SIZE, normalize_embeddings=True).tolist()
+        return await asyncio.to_thread(encode)
+
+EMBEDDERS = {"openai": OpenAIEmbedder, "local": LocalEmbedder}
+
+@lru_cache(maxsize=1)
+def get_embedder():
+    embedder_cls = EMBEDDERS.get(settings.KB_EMBEDDER)
+    if embedder_cls is None:
+        raise ValueError(f"Unknown KB_EMBEDDER {settings.KB_EMBEDDER!r}, expected one of {list(EMBEDDERS)}")
+    return embedder_cls(settings.KB_EMBEDDING_MODEL, settings.KB_EMBEDDING_DIMENSIONS)
+
+def _vector_literal(vector: List[float]) -> str:
+    # pgvector's text input format; avoids registering an adapter on the NullPool connections
+    return "[" + ",".join(f"{v:.6f}" for v in vector) + "]"
+
+# --- 2. Schema ---
+
+def schema_sql(dimensions: int, index: str, lists: int) -> List[str]:
+    if index == "ivfflat":
+        index_sql = f"USING ivfflat (embedding vector_cosine_ops) WITH (lists = {int(lists)})"
+    else:
+        index_sql = "USING hnsw (embedding vector_cosine_ops)"
+    return [
+        "CREATE EXTENSION IF NOT EXISTS vector",
+        f"""
+        CREATE TABLE IF NOT EXISTS knowledge_base_chunks (
+            id BIGSERIAL PRIMARY KEY,
+            agent_id VARCHAR(50) NOT NULL,
+            source TEXT NOT NULL,
+            title TEXT,
+            chunk_index INTEGER NOT NULL DEFAULT 0,
+            content TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            embedding_model TEXT NOT NULL,
+            embedding vector({int(dimensions)}) NOT NULL,
+            token_count INTEGER,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+        """,
+        """
+        CREATE UNIQUE INDEX IF NOT EXISTS knowledge_base_chunks_agent_hash_idx
+        ON knowledge_base_chunks (agent_id, content_hash)
+        """,
+        "ALTER TABLE knowledge_base_chunks ADD COLUMN IF NOT EXISTS token_count INTEGER",
+        f"CREATE INDEX IF NOT EXISTS knowledge_base_chunks_embedding_idx ON knowledge_base_chunks {index_sql}",
+    ]
+
+# --- 3. Chunks ---
+
+class Chunk(NamedTuple):
+    source: str        # "faq" | "document"
+    title: Optional[str]
+    index: int
+    content: str
+    tokens: Optional[int] = None
+
+class RetrievedChunk(NamedTuple):
+    source: str
+    title: Optional[str]
+    content: str
+    score: float
+    tokens: Optional[int] = None
+
+# --- 4. Store ---
+
+NOT_INDEXED_RECHECK_SECONDS = 300
+
+PENDING_PASSAGES_SQL = text("""
+    SELECT p.source, p.title, p.chunk_index, p.content, p.content_hash, p.token_count
+    FROM knowledge_base_passages p
+    WHERE p.agent_id = :agent_id AND p.duplicate_of IS NULL
+      AND NOT EXISTS (
+          SELECT 1 FROM knowledge_base_chunks c
+          WHERE c.agent_id = p.agent_id AND c.content_hash = p.content_hash AND c.embedding_model = :model
+      )
+    ORDER BY p.id
+    LIMIT :limit
+""")
+STALE_CHUNKS_SQL = text("""
+    DELETE FROM knowledge_base_chunks c
+    WHERE c.agent_id = :agent_id
+      AND (c.embedding_model <> :model OR NOT EXISTS (
+          SELECT 1 FROM knowledge_base_passages p
+          WHERE p.agent_id = c.agent_id AND p.content_hash = c.content_hash AND p.duplicate_of IS NULL
+      ))
+""")
+INSERT_CHUNK_SQL = text("""
+    INSERT INTO knowledge_base_chunks
+        (agent_id, source, title, chunk_index, content, content_hash, embedding_model, embedding, token_count)
+    VALUES
+        (:agent_id, :source, :title, :chunk_index, :content, :content_hash, :model, CAST(:embedding AS vector), :token_count)
+    ON CONFLICT (agent_id, content_hash) DO NOTHING
+""")
+
+SEARCH_SQL = text("""
+    SELECT source, title, content, token_count, 1 - (embedding <=> CAST(:query AS vector)) AS score
+    FROM knowledge_base_chunks
+    WHERE agent_id = :agent_id AND embedding_model = :model
+    ORDER BY embedding <=> CAST(:query AS vector)
+    LIMIT :k
+""")
+
+class VectorStore:
+    def __init__(self):
+        self._not_indexed: Dict[str, float] = {}
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def install_schema(self):
+        """Idempotent; needs DDL rights (and the pgvector extension available on the server)."""
+        embedder = get_embedder()
+        async with engine.begin() as conn:
+            for sql in schema_sql(embedder.dimensions, settings.KB_VECTOR_INDEX, settings.KB_IVFFLAT_LISTS):
+                await conn.execute(text(sql))
+        logger.info(f"🧭 knowledge_base_chunks ready ({settings.KB_VECTOR_INDEX}, {embedder.dimensions} dims)")
+
+    # --- Retrieval ---
+
+    async def search(self, db, agent_id: str, query: str, k: int) -> Optional[List[RetrievedChunk]]:
+        """Top-k chunks by cosine similarity, or None if the agent has no chunks yet."""
+        checked_at = self._not_indexed.get(agent_id)
+        if checked_at and time.monotonic() - checked_at < NOT_INDEXED_RECHECK_SECONDS:
+            metrics.incr("kb_retrieval_total", result="not_indexed")
+            return None
+
+        started = time.perf_counter()
+        embedder = get_embedder()
+        vector = (await embedder.embed([query]))[0]
+
+        # Savepoint: a failure here must not abort the turn's transaction for later queries
+        try:
+            async with db.begin_nested():
+                if settings.KB_VECTOR_INDEX == "ivfflat":
+                    await db.execute(text(f"SET LOCAL ivfflat.probes = {int(settings.KB_IVFFLAT_PROBES)}"))
+                else:
+                    await db.execute(text(f"SET LOCAL hnsw.ef_search = {int(settings.KB_HNSW_EF_SEARCH)}"))
+                result = await db.execute(SEARCH_SQL, {
+                    "query": _vector_literal(vector),
+                    "agent_id": agent_id,
+                    "model": embedder.name,
+                    "k": k,
+                })
+                rows = result.mappings().all()
+        except Exception:
+            # Typically knowledge_base_chunks not installed: don't pay for an embedding on every turn
+            self._not_indexed[agent_id] = time.monotonic()
+            raise
+        metrics.observe("kb_retrieval_ms", (time.perf_counter() - started) * 1000)
+
+        if not rows:
+            self._not_indexed[agent_id] = time.monotonic()
+            metrics.incr("kb_retrieval_total", result="not_indexed")
+            return None
+        metrics.incr("kb_retrieval_total", result="vector")
+        return [
+            RetrievedChunk(r["source"], r["title"], r["content"], float(r["score"]), r["token_count"])
+            for r in rows
+        ]
+
+    # --- Indexing ---
+
+    async def sync_agent(self, agent_id: str) -> dict:
+        """Brings the agent's chunks in line with its passages (run kb_ingestion first)."""
+        embedder = get_embedder()
+        token_meter.bind(agent_id)  # Embedding tokens are the agent's usage too
+        params = {"agent_id": agent_id, "model": embedder.name}
+        embedded = 0
+        async with self._locks[agent_id]:
+            async with async_session_factory() as session:
+                deleted = (await session.execute(STALE_CHUNKS_SQL, params)).rowcount
+                await session.commit()
+
+                # Only passages without a chunk are read; each batch is committed, so a
+                # failure halfway through keeps what was already embedded
+                batch = settings.KB_INGEST_BATCH_SIZE
+                while True:
+                    rows = (await session.execute(PENDING_PASSAGES_SQL, {**params, "limit": batch})).mappings().all()
+                    if not rows:
+                        break
+                    vectors = await embedder.embed([r["content"] for r in rows], node="kb_index_embedding")
+                    await session.execute(INSERT_CHUNK_SQL, [
+                        {**dict(r), "agent_id": agent_id, "model": embedder.name, "embedding": _vector_literal(v)}
+                        for r, v in zip(rows, vectors)
+                    ])
+                    await session.commit()
+                    embedded += len(rows)
+                    if len(rows) < batch:
+                        break
+
+        self._not_indexed.pop(agent_id, None)
+        metrics.incr("kb_chunks_embedded_total", embedded)
+        stats = {"embedded": embedded, "deleted": deleted}
+        logger.info(f"🧭 KB index for agent {agent_id}: {stats}")
+        return stats
+
+vector_store = VectorStore()
@@ -1,59 +1,83 @@
 from sqlalchemy import text
+from app.config import settings
+from app.core.metrics import metrics
+from app.services.kb_context_cache import DOC_CONTEXT_MAX_CHARS, KBContext, build_context, kb_context_cache
+from app.services.lexical_index import lexical_index
+from app.services.vector_store_service import retrieval_mode, vector_store
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _stored_tokens(chunks):
+    """Token counts stored at ingestion, or None if any chunk predates them."""
+    tokens = [c.tokens for c in chunks]
+    return None if None in tokens else tokens
+
 class KnowledgeBaseTool:
     def __init__(self, db_session):
         self.db = db_session
 
+    async def fetch_items(self, agent_id: str):
+        """
+        The agent's KB as (faq_items, document_items), one string per FAQ / document.
+        Straight from the DB; use load_context() for the cached version. Documents are
+        cut to DOC_CONTEXT_MAX_CHARS by Postgres, so long uploads aren't transferred whole.
+        """
+        faq_res = await self.db.execute(text("""
+            SELECT question, answer
+            FROM knowledge_base_faqs
+            WHERE agent_id = :agent_id
+        """), {"agent_id": agent_id})
+        faqs = [f"Q: {row['question']}\nA: {row['answer']}" for row in faq_res.mappings().all()]
+
+        doc_res = await self.db.execute(text("""
+            SELECT title, left(content, :max_chars) AS content
+            FROM knowledge_base_documents
+            WHERE agent_id = :agent_id
+        """), {"agent_id": agent_id, "max_chars": DOC_CONTEXT_MAX_CHARS})
+        docs = [
+            f"DOCUMENT TITLE: {row['title']}\nCONTENT:\n{row['content'] or ''}"
+            for row in doc_res.mappings().all()
+        ]
+        return faqs, docs
+
+    async def load_context(self, agent_id: str) -> KBContext:
+        """The full KB, pre-rendered and measured; repeat calls skip both queries until the KB changes."""
+        return await kb_context_cache.get_or_load(agent_id, lambda: self.fetch_items(agent_id))
+
+    async def retrieve(self, agent_id: str, query: str) -> KBContext:
+        """
+        KB context relevant to the query: the top KB_TOP_K chunks from pgvector
+        (KB_RETRIEVAL=vector) or from the in-memory BM25 index (bm25).
+        Falls back to the full (cached) KB if the agent isn't indexed yet, nothing
+        matched, retrieval is off (KB_RETRIEVAL=full) or the search fails.
+        Used by the token-budgeted prompt assembly (app/core/prompt_budget.py).
+        """
+        mode = retrieval_mode(agent_id)
+        if mode in ("vector", "bm25") and query:
+            store = vector_store if mode == "vector" else lexical_index
+            try:
+                chunks = await store.search(self.db, agent_id, query, settings.KB_TOP_K)
+                if chunks is not None:
+                    faqs = [c for c in chunks if c.source == "faq"]
+                    docs = [c for c in chunks if c.source == "document"]
+                    return build_context(
+                        [c.content for c in faqs], [c.content for c in docs],
+                        faq_tokens=_stored_tokens(faqs), doc_tokens=_stored_tokens(docs),
+                    )
+            except Exception as e:
+                metrics.incr("kb_retrieval_total", result="error")
+                logger.warning(f"KB {mode} search failed for agent {agent_id}: {e}. Using the full KB.")
+        return await self.load_context(agent_id)
+
     async def search(self, agent_id: str, query: str):
         """
-        Fetches the FULL Knowledge Base for the agent.
-        We let the AI filter relevance instead of SQL.
+        Knowledge base context for the query as one text block (FAQs, then documents).
         """
-        context_parts = []
-        
         try:
-            # 1. Fetch ALL FAQs for this Agent
-            # FAQs are short, so we can usually afford to load all of them.
-            faq_query = text("""
-                SELECT question, answer 
-                FROM knowledge_base_faqs 
-                WHERE agent_id = :agent_id 
-            """)
-            faq_res = await self.db.execute(faq_query, {"agent_id": agent_id})
-            
-            faqs = faq_res.mappings().all()
-            if faqs:
-                context_parts.append("## FREQUENTLY ASKED QUESTIONS (FAQs)")
-                for row in faqs:
-                    context_parts.append(f"Q: {row['question']}\nA: {row['answer']}")
-                context_parts.append("-" * 20)
-
-            # 2. Fetch Documents (With Limit)
-            # We fetch all docs but limit the character count per doc to avoid exploding tokens.
-            doc_query = text("""
-                SELECT title, content 
-                FROM knowledge_base_documents 
-                WHERE agent_id = :agent_id 
-            """)
-            doc_res = await self.db.execute(doc_query, {"agent_id": agent_id})
-            
-            docs = doc_res.mappings().all()
-            if docs:
-                context_parts.append("## COMPANY DOCUMENTS & POLICIES")
-                for row in docs:
-                    # Truncate massive docs to first 3000 chars to be safe
-                    content_preview = row['content'][:3000] 
-                    context_parts.append(f"DOCUMENT TITLE: {row['title']}\nCONTENT:\n{content_preview}")
-
-            if not context_parts:
-                return None
-            
-            # Combine everything into one big text block for the AI
-            return "\n\n".join(context_parts)
+            context = await self.retrieve(agent_id, query)
+            return context.text or None
 
         except Exception as e:
             logger.error(f"KB Fetch Error: {e}")
-            return None
\ No newline at end of file
+            return None
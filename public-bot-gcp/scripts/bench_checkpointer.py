@@ -0,0 +1,273 @@
+"""
+Checkpointer benchmark (app/core/persistence.py): what reading and writing the
+conversation state costs per turn on each backend.
+
+Every virtual user plays --turns messages through a small graph over the real
+AgentState (router -> search every few turns -> reply, no LLM, no SQL), so the
+channels, reducers and checkpoint traffic match master_graph. The checkpointer
+is wrapped to time each call:
+- read:  aget_tuple (state load at the start of the turn)
+- write: aput + aput_writes (one checkpoint per graph step)
+plus the serialized size of the thread's state after the turn. Early vs late
+turns show how the cost grows with the conversation. Searches store PropertyCards
+like search_node does; --full-rows stores the whole rows instead (the old state
+shape) for comparison.
+
+Usage (from public-bot-gcp/):
+    python -m scripts.bench_checkpointer --backends memory
+    python -m scripts.bench_checkpointer --backends memory --full-rows
+    python -m scripts.bench_checkpointer --backends memory redis postgres \\
+        --database-url postgresql://user:pw@localhost:5432/bench --redis-url redis://localhost:6379/15
+
+Postgres tables are created by the saver's setup(); benchmark threads are named
+'bench-ckpt-*' and deleted afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from scripts.bench_search import percentiles, _git_sha
+
+AREAS = ["Bedok", "Tampines", "Jurong", "Bishan", "Clementi", "Yishun", "Woodlands"]
+SEARCH_EVERY = 4  # Turns between searches (found_properties is replaced)
+
+def fake_property_row(rng: random.Random, i: int) -> dict:
+    """About as wide and heavy as a coliving_property row: ~90 columns, datetimes, long text."""
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    area = rng.choice(AREAS)
+    row = {
+        "property_id": f"bench-{i}",
+        "agent_id": "bench-agent-0",
+        "property_name": f"Common room {i} near {area} MRT",
+        "room_type": rng.choice(["Common room without attached bathroom", "Master room with attached bathroom"]),
+        "room_number": str(rng.randint(1, 6)),
+        "nearest_mrt": f"{area} MRT",
+        "description": " ".join(rng.choice(["bright", "quiet", "spacious", "aircon", "cooking", "allowed",
+                                             "near", "MRT", "mall", "utilities", "included", "WiFi"])
+                                for _ in range(140)),
+        "property_address": f"{rng.randint(1, 999)} {area} Street {rng.randint(1, 99)}",
+        "district": area,
+        "monthly_rent": rng.randint(700, 3000),
+        "deposit": rng.randint(700, 3000),
+        "latitude": 1.3 + rng.random() / 10,
+        "longitude": 103.8 + rng.random() / 10,
+        "available_from": now + timedelta(days=rng.randint(0, 60)),
+        "created_at": now - timedelta(days=rng.randint(0, 365)),
+        "updated_at": now,
+        "amenities": ["wifi", "aircon", "washer", "fridge"][: rng.randint(1, 4)],
+        "media": json.dumps([f"https://cdn.example.com/p/{i}/{n}.jpg" for n in range(6)]),
+    }
+    for n in range(72):
+        row[f"attr_{n}"] = rng.choice([None, True, False, rng.randint(0, 100), f"value-{rng.randint(0, 9999)}"])
+    return row
+
+def build_graph(checkpointer, properties: int, full_rows: bool = False):
+    from langchain_core.messages import AIMessage
+    from langgraph.graph import END, StateGraph
+    from app.core.state import AgentState
+    from app.schemas.property_card import PropertyCard
+    from app.services.search_verticals import get_vertical
+
+    rng = random.Random(0)
+    vertical = get_vertical("coliving_property")
+
+    def router(state):
+        return {"next_step": "search" if len(state["messages"]) % (2 * SEARCH_EVERY) == 1 else "reply",
+                "router_intent": {"intent": "SEARCH", "source": "rule"}}
+
+    def search(state):
+        rows = [fake_property_row(rng, i) for i in range(properties)]
+        found = rows if full_rows else [PropertyCard.from_row(row, vertical) for row in rows]
+        return {"found_properties": found, "shown_count": 3}
+
+    def reply(state):
+        text = "Here are a few options that match what you asked for. " * 4
+        return {"messages": [AIMessage(content=text)], "next_step": None}
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("router", router)
+    workflow.add_node("search", search)
+    workflow.add_node("reply", reply)
+    workflow.set_entry_point("router")
+    workflow.add_conditional_edges("router", lambda s: s["next_step"], {"search": "search", "reply": "reply"})
+    workflow.add_edge("search", "reply")
+    workflow.add_edge("reply", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+def timed(saver, timings):
+    """The saver with aget_tuple / aput / aput_writes timed into timings[thread_id]."""
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+
+    class TimedSaver(BaseCheckpointSaver):
+        def __init__(self):
+            super().__init__(serde=saver.serde)
+
+        def get_next_version(self, current, channel):
+            return saver.get_next_version(current, channel)
+
+        async def aget_tuple(self, config):
+            started = time.perf_counter()
+            try:
+                return await saver.aget_tuple(config)
+            finally:
+                timings[config["configurable"]["thread_id"]]["read"] += (time.perf_counter() - started) * 1000
+
+        def alist(self, config, **kwargs):
+            return saver.alist(config, **kwargs)
+
+        async def aput(self, config, checkpoint, metadata, new_versions):
+            started = time.perf_counter()
+            try:
+                return await saver.aput(config, checkpoint, metadata, new_versions)
+            finally:
+                timings[config["configurable"]["thread_id"]]["write"] += (time.perf_counter() - started) * 1000
+
+        async def aput_writes(self, config, writes, task_id, task_path=""):
+            started = time.perf_counter()
+            try:
+                return await saver.aput_writes(config, writes, task_id, task_path)
+            finally:
+                timings[config["configurable"]["thread_id"]]["write"] += (time.perf_counter() - started) * 1000
+
+    return TimedSaver()
+
+def state_bytes(saver, checkpoint) -> int:
+    return sum(len(saver.serde.dumps_typed(v)[1]) for v in checkpoint["channel_values"].values())
+
+def summarize(rows) -> dict:
+    out = {}
+    for key in ("read_ms", "write_ms", "checkpoint_ms", "turn_ms"):
+        samples = [r[key] for r in rows]
+        out[key] = {"mean": round(statistics.fmean(samples), 3), **percentiles(samples)} if samples else {}
+    out["state_bytes"] = round(statistics.fmean(r["state_bytes"] for r in rows)) if rows else 0
+    return out
+
+async def run_backend(backend: str, args) -> dict:
+    from langchain_core.messages import HumanMessage
+    from app.core.persistence import create_checkpointer
+
+    saver, close = await create_checkpointer(backend)
+    timings = defaultdict(lambda: {"read": 0.0, "write": 0.0})
+    graph = build_graph(timed(saver, timings), args.properties, args.full_rows)
+    limit = asyncio.Semaphore(args.concurrency)
+    rows = []
+    threads = [f"bench-ckpt-{backend}-{i}" for i in range(args.threads)]
+
+    async def user(thread_id: str):
+        async with limit:
+            config = {"configurable": {"thread_id": thread_id}}
+            for turn in range(args.turns):
+                timings[thread_id] = {"read": 0.0, "write": 0.0}
+                started = time.perf_counter()
+                await graph.ainvoke({
+                    "messages": [HumanMessage(content=f"Message {turn}: a room near Bedok under 2k please")],
+                    "agent_id": "bench-agent-0",
+                    "user_mobile": thread_id,
+                    "user_name": "Bench",
+                    "agent_name": "Aba",
+                    "company_name": "PropPanda",
+                    "agent_bio": None,
+                }, config=config)
+                turn_ms = (time.perf_counter() - started) * 1000
+                latest = await saver.aget_tuple(config)
+                t = timings[thread_id]
+                rows.append({
+                    "turn": turn,
+                    "read_ms": t["read"],
+                    "write_ms": t["write"],
+                    "checkpoint_ms": t["read"] + t["write"],
+                    "turn_ms": turn_ms,
+                    "state_bytes": state_bytes(saver, latest.checkpoint),
+                })
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(t) for t in threads))
+        wall = time.perf_counter() - started
+        for thread_id in threads:
+            try:
+                await saver.adelete_thread(thread_id)
+            except NotImplementedError:
+                pass
+    finally:
+        if close is not None:
+            await close()
+
+    quarter = max(args.turns // 4, 1)
+    return {
+        "turns": len(rows),
+        "turns_per_s": round(len(rows) / wall, 2) if wall else 0.0,
+        "all": summarize(rows),
+        "early": summarize([r for r in rows if r["turn"] < quarter]),
+        "late": summarize([r for r in rows if r["turn"] >= args.turns - quarter]),
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint read / write latency per turn.")
+    parser.add_argument("--backends", nargs="+", default=["memory"], choices=["memory", "redis", "postgres"])
+    parser.add_argument("--database-url", default=None, help="For postgres (never production)")
+    parser.add_argument("--redis-url", default=None, help="For redis (use a scratch DB)")
+    parser.add_argument("--threads", type=int, default=20, help="Conversations")
+    parser.add_argument("--turns", type=int, default=40, help="Messages per conversation")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--properties", type=int, default=10, help="Rows put in found_properties by each search")
+    parser.add_argument("--full-rows", action="store_true", help="Store whole rows in found_properties, not cards")
+    parser.add_argument("--out", default=None, help="Output JSON path (default: bench_results/checkpointer-<ts>.json)")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+
+    # app.config reads these at import time, so set them before importing app modules
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("DATABASE_URL", "postgresql://unused/unused")
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    os.environ["CHECKPOINT_SETUP"] = "true"  # Benchmark database: create the checkpoint tables
+    if "postgres" in args.backends and not args.database_url:
+        raise SystemExit("--database-url is required for the postgres backend")
+
+    from app.services.redis_service import close_redis
+
+    print(f"⏱️  {args.threads} threads x {args.turns} turns, concurrency {args.concurrency}, "
+          f"{args.properties} {'rows' if args.full_rows else 'cards'} per search")
+    results = {}
+    for backend in args.backends:
+        results[backend] = await run_backend(backend, args)
+        late = results[backend]["late"]
+        print(f"  {backend:<9} read p50={late['read_ms']['p50_ms']:.2f}ms p95={late['read_ms']['p95_ms']:.2f}ms  "
+              f"write p50={late['write_ms']['p50_ms']:.2f}ms p95={late['write_ms']['p95_ms']:.2f}ms  "
+              f"state={late['state_bytes'] / 1024:.1f}KB (late turns)")
+    await close_redis()
+
+    report = {
+        "meta": {
+            "benchmark": "checkpointer",
+            "git_sha": _git_sha(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "threads": args.threads,
+            "turns": args.turns,
+            "concurrency": args.concurrency,
+            "properties": args.properties,
+            "found_properties": "rows" if args.full_rows else "cards",
+        },
+        "backends": results,
+    }
+
+    out = args.out or os.path.join(
+        "bench_results", f"checkpointer-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Wrote {out}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
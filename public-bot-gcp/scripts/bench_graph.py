@@ -0,0 +1,174 @@
+"""
+Full-graph benchmark with the LLM stand-in (app/services/llm_standin.py): scripted
+conversations run through master_graph against a real Postgres, with rule-generated
+(or recorded) completions instead of OpenAI calls.
+
+Two passes over the same conversations:
+- loaded:   simulated LLM latency (--latency), N users at --concurrency -> throughput
+            and per-turn latency as users would see it.
+- overhead: zero LLM latency -> what the graph itself costs per turn (routing,
+            state, checkpointing, prompt assembly, SQL).
+
+Usage (from public-bot-gcp/):
+    python -m scripts.bench_graph --database-url postgresql://user:pw@localhost:5432/bench --seed-rows 10000
+    python -m scripts.bench_graph --database-url ... --users 50 --concurrency 20 \\
+        --latency '{"default": "lognormal:900,0.4", "router": "lognormal:350,0.3"}'
+    python -m scripts.bench_graph --database-url ... --cassette llm_cassettes/default.jsonl
+
+The database needs the app schema; --seed-rows adds bench listings via
+scripts/bench_search.py. Conversations run as 'bench-agent-0'. Same --seed, same numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+from scripts.bench_search import BENCH_AGENT_PREFIX, percentiles, _git_sha
+
+# Each virtual user plays one of these, turn by turn
+CONVERSATIONS = [
+    ["Hi", "What are your fees?", "Do you allow pets?"],
+    ["I'm looking for a room", "Bedok", "2k", "next month", "female", "Indian", "show more"],
+    ["Room near Tampines under 1500", "in 2 weeks", "male", "Chinese", "Can I book a viewing?",
+     "alex@example.com", "EP", "12 months", "Virtual", "morning"],
+    ["Looking for a master room in Jurong, budget 1800", "Couple", "Malaysian", "Is there a gym?"],
+]
+
+def standin_client(standin, mode: str):
+    import httpx
+    from openai import AsyncOpenAI
+    from app.services.llm_standin import StandInTransport
+
+    http_client = httpx.AsyncClient(transport=StandInTransport(mode, standin))
+    return AsyncOpenAI(api_key="standin", http_client=http_client, max_retries=0)
+
+async def run_pass(name: str, standin, mode: str, session_factory, args) -> dict:
+    from langchain_core.messages import HumanMessage
+    from langgraph.checkpoint.memory import MemorySaver
+    from app.graphs.master_graph import get_master_graph
+
+    graph = get_master_graph(MemorySaver())
+    client = standin_client(standin, mode)
+    agent_id = f"{BENCH_AGENT_PREFIX}0"
+    limit = asyncio.Semaphore(args.concurrency)
+    samples = []
+    errors = 0
+
+    async def user(index: int):
+        nonlocal errors
+        thread_id = f"bench-{name}-{index}"
+        async with limit:
+            for message in CONVERSATIONS[index % len(CONVERSATIONS)]:
+                async with session_factory() as session:
+                    config = {"configurable": {"thread_id": thread_id, "db_session": session, "llm_client": client}}
+                    input_data = {
+                        "messages": [HumanMessage(content=message)],
+                        "agent_id": agent_id,
+                        "user_mobile": thread_id,
+                        "user_name": "Bench",
+                        "agent_name": "Aba",
+                        "company_name": "PropPanda",
+                        "agent_bio": None,
+                    }
+                    started = time.perf_counter()
+                    try:
+                        await graph.ainvoke(input_data, config=config)
+                    except Exception as e:
+                        errors += 1
+                        print(f"  ⚠️ {thread_id} '{message}': {e}")
+                    samples.append((time.perf_counter() - started) * 1000)
+                    await session.rollback()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(args.users)))
+    wall = time.perf_counter() - started
+    await client.close()
+
+    turns = len(samples)
+    return {
+        "turns": turns,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "turns_per_s": round(turns / wall, 2) if wall else 0.0,
+        "mean_ms": round(statistics.fmean(samples), 3) if samples else 0.0,
+        **percentiles(samples),
+        "llm_calls_per_turn": {node: round(n / turns, 3) for node, n in standin.calls.items()} if turns else {},
+        "simulated_llm_ms_per_turn": round(sum(standin.simulated_ms.values()) / turns, 3) if turns else 0.0,
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark master_graph offline with the LLM stand-in.")
+    parser.add_argument("--database-url", required=True,
+                        help="Benchmark database (never production). postgresql:// or postgresql+asyncpg://")
+    parser.add_argument("--seed-rows", type=int, default=0, help="Seed this many bench listings first (0: reuse)")
+    parser.add_argument("--users", type=int, default=20, help="Virtual users (each plays one conversation)")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", default="lognormal:700,0.35", help="Spec or per-node JSON, see LatencyModel")
+    parser.add_argument("--seed", type=int, default=0, help="Latency RNG seed")
+    parser.add_argument("--cassette", default=None, help="Replay recorded responses (misses fall back to rules)")
+    parser.add_argument("--hedging", action="store_true", help="Keep LLM_HEDGING on (off by default for stable runs)")
+    parser.add_argument("--out", default=None, help="Output JSON path (default: bench_results/graph-<ts>.json)")
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+
+    # app.config reads these at import time, so set them before importing app modules
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("LOCATION_IQ_KEY", None)  # No network geocoding during the benchmark
+
+    from app.config import settings
+    from app.db.session import engine, async_session_factory
+    from app.services.llm_standin import create_standin
+
+    settings.LLM_HEDGING = args.hedging
+
+    if args.seed_rows:
+        from scripts.bench_search import seed
+        await seed(engine, args.seed_rows, 1, 0.42)
+
+    mode = "replay" if args.cassette else "standin"
+    print(f"⏱️  {args.users} users x {len(CONVERSATIONS)} scripts, concurrency {args.concurrency}, "
+          f"latency {args.latency} ({mode})")
+
+    # Loaded pass first: the gateway's p95 windows then never see the zero-latency samples
+    loaded = await run_pass("loaded", create_standin(mode, args.latency, args.seed, args.cassette),
+                            mode, async_session_factory, args)
+    print(f"  loaded    {loaded['turns_per_s']:>7.2f} turns/s  p50={loaded['p50_ms']:.1f}ms  p95={loaded['p95_ms']:.1f}ms")
+    overhead = await run_pass("overhead", create_standin(mode, "", args.seed, args.cassette),
+                              mode, async_session_factory, args)
+    print(f"  overhead  {overhead['turns_per_s']:>7.2f} turns/s  p50={overhead['p50_ms']:.1f}ms  p95={overhead['p95_ms']:.1f}ms")
+    await engine.dispose()
+
+    report = {
+        "meta": {
+            "benchmark": "graph",
+            "git_sha": _git_sha(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "latency": args.latency,
+            "seed": args.seed,
+            "mode": mode,
+            "cassette": args.cassette,
+            "hedging": args.hedging,
+            "fused_routing": settings.FUSED_ROUTING,
+            "generator_mode": settings.GENERATOR_MODE,
+        },
+        "loaded": loaded,
+        "overhead": overhead,
+    }
+
+    out = args.out or os.path.join(
+        "bench_results", f"graph-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Wrote {out}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
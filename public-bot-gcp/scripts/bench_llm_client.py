@@ -0,0 +1,127 @@
+"""
+LLM client benchmark: per-call AsyncOpenAI clients (the old OpenAIService().client
+pattern) vs the shared pooled client from app/services/openai_service.py.
+
+Usage (from public-bot-gcp/, needs OPENAI_API_KEY):
+    python -m scripts.bench_llm_client --calls 30
+    python -m scripts.bench_llm_client --calls 30 --concurrency 5 --chat
+
+By default each call is a models.retrieve() request, which costs no tokens and is
+dominated by connection setup + network RTT, i.e. exactly the overhead pooling removes.
+--chat uses a 1-token completion instead to see the effect on a real node call.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime, timezone
+
+from scripts.bench_search import percentiles, _git_sha
+
+async def _call(client, args):
+    if args.chat:
+        await client.chat.completions.create(
+            model=args.model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+        )
+    else:
+        await client.models.retrieve(args.model)
+
+async def run_fresh(args):
+    """A new client (new pool, new TLS handshake) for every call."""
+    from app.services.openai_service import create_llm_client
+
+    async def one():
+        client = create_llm_client()
+        try:
+            started = time.perf_counter()
+            await _call(client, args)
+            return (time.perf_counter() - started) * 1000
+        finally:
+            await client.close()
+
+    return await _run_batches(one, args)
+
+async def run_shared(args):
+    """One client for the whole run, as the graph nodes now use it."""
+    from app.services.openai_service import init_llm_client, close_llm_client
+
+    client = init_llm_client()
+    await _call(client, args)  # Warm the pool once, like the first request after startup
+
+    async def one():
+        started = time.perf_counter()
+        await _call(client, args)
+        return (time.perf_counter() - started) * 1000
+
+    try:
+        return await _run_batches(one, args)
+    finally:
+        await close_llm_client()
+
+async def _run_batches(one, args):
+    # Batches of --concurrency calls approximate several nodes calling the LLM in one turn
+    samples = []
+    remaining = args.calls
+    while remaining > 0:
+        batch = min(args.concurrency, remaining)
+        samples.extend(await asyncio.gather(*(one() for _ in range(batch))))
+        remaining -= batch
+    return samples
+
+def summarize(samples):
+    return {"calls": len(samples), "mean_ms": round(statistics.fmean(samples), 3), **percentiles(samples)}
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure per-call connection overhead of the LLM client.")
+    parser.add_argument("--calls", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--chat", action="store_true", help="Use a 1-token chat completion instead of models.retrieve")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    if not os.getenv("OPENAI_API_KEY"):
+        raise SystemExit("OPENAI_API_KEY is not set")
+
+    from app.config import settings
+
+    print(f"⏱️  {args.calls} calls, concurrency {args.concurrency}, {'chat' if args.chat else 'models.retrieve'}")
+    fresh = summarize(await run_fresh(args))
+    print(f"  per-call client  p50={fresh['p50_ms']:.1f}ms  p95={fresh['p95_ms']:.1f}ms")
+    shared = summarize(await run_shared(args))
+    print(f"  shared client    p50={shared['p50_ms']:.1f}ms  p95={shared['p95_ms']:.1f}ms")
+
+    overhead = round(fresh["p50_ms"] - shared["p50_ms"], 3)
+    print(f"📉 Connection overhead removed per call (p50): {overhead:.1f}ms")
+
+    report = {
+        "meta": {
+            "benchmark": "llm_client",
+            "git_sha": _git_sha(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "calls": args.calls,
+            "concurrency": args.concurrency,
+            "request": "chat" if args.chat else "models.retrieve",
+            "http2": settings.LLM_HTTP2,
+            "max_connections": settings.LLM_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        },
+        "per_call_client": fresh,
+        "shared_client": shared,
+        "overhead_removed_p50_ms": overhead,
+    }
+
+    out = args.out or os.path.join(
+        "bench_results", f"llm-client-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📝 Wrote {out}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,428 @@
+"""
+Search benchmark: seeds synthetic inventory and replays a filter matrix through
+the real search path (search_node -> build_property_query -> Postgres).
+
+Usage (from public-bot-gcp/):
+    python -m scripts.bench_search --database-url postgresql://user:pw@localhost:5432/bench --rows 100000
+    python -m scripts.bench_search --database-url ... --skip-seed --baseline bench_results/search-prev.json
+
+Point it at a throwaway Postgres with PostGIS. Seeding only touches rows owned by
+'bench-agent-*' agents, but it will create the agent / coliving_property /
+property_geolocations tables if they don't exist.
+
+Output JSON (one file per run) has, per case: latency percentiles, result rows,
+rows scanned (from EXPLAIN ANALYZE) and the captured plans.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+BENCH_AGENT_PREFIX = "bench-agent-"
+
+# Bedok MRT, used for the geo cases (no geocoding call during the benchmark)
+GEO_POINT = (1.3240, 103.9300)
+
+# --- FILTER MATRIX ---
+# Text cases go through search_node exactly like a chat turn.
+# Geo cases go through build_property_query with fixed coordinates (search_node's strategy 2).
+CASES = [
+    {"name": "text_budget", "mode": "text",
+     "filters": {"location_query": "Bedok", "budget_max": 1500}},
+    {"name": "text_budget_gender", "mode": "text",
+     "filters": {"location_query": "Tampines", "budget_max": 1500, "tenant_gender": "Female"}},
+    {"name": "text_full_profile", "mode": "text",
+     "filters": {"location_query": "Jurong", "budget_max": 1800, "move_in_date": "+30d",
+                 "tenant_gender": "Male", "tenant_nationality": "Indian"}},
+    {"name": "text_room_and_amenities", "mode": "text",
+     "filters": {"location_query": "Bishan", "budget_max": 2200, "room_type": "Master",
+                 "needs_cooking": True, "needs_gym": True, "needs_wifi": True}},
+    {"name": "text_env_and_policies", "mode": "text",
+     "filters": {"location_query": "Clementi", "budget_max": 1600, "environment": "Female",
+                 "has_pets": True, "needs_visitor_allowance": True}},
+    {"name": "text_zero_result_relaxation", "mode": "text",
+     "filters": {"location_query": "Bedok", "budget_max": 300, "move_in_date": "+1d",
+                 "tenant_nationality": "Martian"}},
+    {"name": "geo_budget", "mode": "geo",
+     "filters": {"location_query": "Bedok", "budget_max": 1500}},
+    {"name": "geo_full_profile", "mode": "geo",
+     "filters": {"location_query": "Bedok", "budget_max": 1800, "move_in_date": "+30d",
+                 "tenant_gender": "Couple", "tenant_nationality": "Chinese", "room_type": "Common"}},
+]
+
+AREAS = ["Bedok", "Tampines", "Jurong", "Bishan", "Clementi", "Yishun", "Woodlands",
+         "Serangoon", "Punggol", "Queenstown", "Toa Payoh", "Ang Mo Kio"]
+
+# ---------------------------------------------
+# 1. SEEDING
+# ---------------------------------------------
+
+SETUP_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    """
+    DO $$ BEGIN
+        CREATE TYPE currentlisting AS ENUM ('Available to rent', 'Booked');
+    EXCEPTION WHEN duplicate_object THEN NULL;
+    END $$;
+    """,
+]
+
+POST_CREATE_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS property_geolocations (
+        property_id text PRIMARY KEY,
+        location geography(Point, 4326) NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS bench_property_geolocations_location ON property_geolocations USING GIST (location)",
+    "CREATE INDEX IF NOT EXISTS bench_coliving_property_agent_id ON coliving_property (agent_id)",
+]
+
+CLEANUP_SQL = [
+    f"""DELETE FROM property_geolocations g USING coliving_property p
+        WHERE g.property_id = p.property_id AND p.agent_id LIKE '{BENCH_AGENT_PREFIX}%'""",
+    f"DELETE FROM coliving_property WHERE agent_id LIKE '{BENCH_AGENT_PREFIX}%'",
+    f"DELETE FROM agent WHERE agent_id LIKE '{BENCH_AGENT_PREFIX}%'",
+]
+
+SEED_AGENTS_SQL = f"""
+INSERT INTO agent (agent_id, name, co_living_property, rooms_for_rent, chatbot_enabled)
+SELECT '{BENCH_AGENT_PREFIX}' || i, 'Bench Agent ' || i, true, true, true
+FROM generate_series(0, :agents - 1) AS i
+"""
+
+# One set-based INSERT, so 1M rows seeds in seconds rather than minutes
+SEED_PROPERTIES_SQL = f"""
+INSERT INTO coliving_property (
+    property_id, agent_id, property_name, property_address, nearest_mrt, district,
+    room_type, room_number, gender_preference, nationality_preferences, monthly_rent,
+    available_from, listing_status, current_listing,
+    aircon, ensuite_bathroom, window_details, cooking_allowed, gas_stove, washer, dryer,
+    gym, swimming_pool, virtual_viewing_available, wifi, pet_policy, visitor_policy, description
+)
+SELECT
+    'bench-' || i,
+    '{BENCH_AGENT_PREFIX}' || (i % :agents),
+    area || ' Residence ' || (i % 500),
+    (i % 900) || ' ' || area || ' Avenue ' || (i % 12),
+    area || ' MRT',
+    area,
+    CASE WHEN random() < 0.35 THEN 'Master Room (with attached bathroom)' ELSE 'Common Room (without attached bathroom)' END,
+    'R' || (i % 6),
+    (ARRAY['male', 'female', 'any', 'mixed', 'couple', NULL])[1 + floor(random() * 6)::int],
+    (ARRAY['any', 'Indian', 'Chinese', 'Malaysian', 'Indian, Malaysian', NULL])[1 + floor(random() * 6)::int],
+    (600 + floor(random() * 2400))::int,
+    CURRENT_DATE + floor(random() * 120)::int - 30,
+    CASE WHEN random() < 0.9 THEN 'active' ELSE 'inactive' END,
+    (CASE WHEN random() < 0.85 THEN 'Available to rent' ELSE 'Booked' END)::currentlisting,
+    random() < 0.8, random() < 0.35, random() < 0.7, random() < 0.6, random() < 0.5,
+    random() < 0.7, random() < 0.4, random() < 0.3, random() < 0.3, random() < 0.2,
+    (ARRAY['true', 'available', 'no', NULL])[1 + floor(random() * 4)::int],
+    (ARRAY['No pets allowed', 'Pets allowed', 'Cats only', NULL])[1 + floor(random() * 4)::int],
+    (ARRAY['Visitors not allowed', 'Day visitors only', NULL])[1 + floor(random() * 3)::int],
+    'Synthetic listing for search benchmarks'
+FROM (
+    SELECT i, (:areas)[1 + (i % cardinality(:areas))] AS area
+    FROM generate_series(0, :rows - 1) AS i
+) s
+"""
+
+# Scatter points over mainland Singapore
+SEED_GEO_SQL = f"""
+INSERT INTO property_geolocations (property_id, location)
+SELECT p.property_id,
+       ST_SetSRID(ST_MakePoint(103.65 + random() * 0.35, 1.25 + random() * 0.20), 4326)::geography
+FROM coliving_property p
+WHERE p.agent_id LIKE '{BENCH_AGENT_PREFIX}%'
+"""
+
+async def seed(engine, rows: int, agents: int, seed_value: float):
+    from sqlalchemy import text
+    from app.db.base_class import Base
+    from app.db.models import Agent, ColivingProperty
+
+    print(f"🌱 Seeding {rows:,} listings across {agents} agents...")
+    started = time.perf_counter()
+
+    async with engine.begin() as conn:
+        for sql in SETUP_SQL:
+            await conn.execute(text(sql))
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Agent.__table__, ColivingProperty.__table__],
+            checkfirst=True,
+        )
+        for sql in POST_CREATE_SQL:
+            await conn.execute(text(sql))
+        for sql in CLEANUP_SQL:
+            await conn.execute(text(sql))
+
+        await conn.execute(text("SELECT setseed(:s)"), {"s": seed_value})
+        await conn.execute(text(SEED_AGENTS_SQL), {"agents": agents})
+        await conn.execute(text(SEED_PROPERTIES_SQL), {"agents": agents, "rows": rows, "areas": AREAS})
+        await conn.execute(text(SEED_GEO_SQL))
+
+        # Fresh stats, otherwise the planner benchmarks against an empty table
+        await conn.execute(text("ANALYZE agent, coliving_property, property_geolocations"))
+
+    print(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
+
+# ---------------------------------------------
+# 2. REPLAY
+# ---------------------------------------------
+
+class RecordingSession:
+    """
+    Thin pass-through around AsyncSession that remembers every statement the
+    search path executes, so the exact same SQL can be EXPLAINed afterwards.
+    """
+
+    def __init__(self, session):
+        self._session = session
+        self.statements = []
+
+    async def execute(self, statement, params=None, **kwargs):
+        self.statements.append((statement, dict(params or {})))
+        return await self._session.execute(statement, params, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+def _resolve_filters(raw: dict) -> dict:
+    """'+30d' style dates keep the matrix valid whenever it is run."""
+    filters = dict(raw)
+    move_in = filters.get("move_in_date")
+    if move_in and move_in.startswith("+"):
+        days = int(move_in[1:-1])
+        filters["move_in_date"] = (datetime.now().date() + timedelta(days=days)).isoformat()
+    return filters
+
+async def run_case_once(session, case: dict, agent_id: str):
+    from app.graphs.nodes.search_tool import search_node
+    from app.schemas.property_search import PropertySearchFilters
+    from app.services.query_builder import build_property_query
+    from app.services.ranking import get_ranking_weights
+    from app.config import settings
+
+    filters = _resolve_filters(case["filters"])
+    recorder = RecordingSession(session)
+
+    started = time.perf_counter()
+    if case["mode"] == "text":
+        state = {
+            "agent_id": agent_id,
+            "filters": PropertySearchFilters(**filters),
+            "target_table": "coliving_property",
+            "active_relaxation": None,
+        }
+        result = await search_node(state, {"configurable": {"db_session": recorder}})
+        found = len(result["found_properties"])
+    else:
+        ranking_args = {}
+        if settings.RANKING_ENABLED:
+            ranking_args = {
+                "ranking": get_ranking_weights(agent_id),
+                "candidate_limit": settings.RANKING_CANDIDATE_LIMIT,
+            }
+        lat, lng = GEO_POINT
+        query, params = build_property_query(
+            filters=filters, agent_id=agent_id, lat=lat, lng=lng,
+            target_table="coliving_property", **ranking_args
+        )
+        rows = await recorder.execute(query, params)
+        found = len(rows.mappings().all())
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    return elapsed_ms, found, recorder.statements
+
+SCAN_NODE_TYPES = {
+    "Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan", "Tid Scan", "Sample Scan",
+}
+
+def rows_scanned(plan: dict) -> int:
+    """Rows read by scan nodes (kept + filtered out), summed over the whole plan tree."""
+    total = 0
+    if plan.get("Node Type") in SCAN_NODE_TYPES:
+        per_loop = (
+            plan.get("Actual Rows", 0)
+            + plan.get("Rows Removed by Filter", 0)
+            + plan.get("Rows Removed by Index Recheck", 0)
+        )
+        total += per_loop * plan.get("Actual Loops", 1)
+    for child in plan.get("Plans", []):
+        total += rows_scanned(child)
+    return total
+
+async def explain(session, statement, params: dict) -> dict:
+    from sqlalchemy import text
+    sql = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + str(statement).strip()
+    result = await session.execute(text(sql), params)
+    plan = result.scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+def percentiles(samples):
+    if len(samples) < 2:
+        value = samples[0] if samples else 0.0
+        return {"p50_ms": value, "p95_ms": value, "p99_ms": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50_ms": round(cuts[49], 3), "p95_ms": round(cuts[94], 3), "p99_ms": round(cuts[98], 3)}
+
+async def run_benchmark(session_factory, cases, agent_id: str, iterations: int, warmup: int):
+    results = []
+    for case in cases:
+        async with session_factory() as session:
+            for _ in range(warmup):
+                await run_case_once(session, case, agent_id)
+
+            samples = []
+            found = 0
+            statements = []
+            for _ in range(iterations):
+                elapsed_ms, found, statements = await run_case_once(session, case, agent_id)
+                samples.append(elapsed_ms)
+
+            # EXPLAIN the statements of the last iteration (search + relaxation counts, if any)
+            plans = []
+            for statement, params in statements:
+                plan = await explain(session, statement, params)
+                plans.append({
+                    "rows_scanned": rows_scanned(plan["Plan"]),
+                    "execution_ms": plan.get("Execution Time"),
+                    "planning_ms": plan.get("Planning Time"),
+                    "plan": plan,
+                })
+            await session.rollback()
+
+        entry = {
+            "name": case["name"],
+            "mode": case["mode"],
+            "filters": case["filters"],
+            "iterations": iterations,
+            "result_rows": found,
+            "queries": len(plans),
+            "rows_scanned": sum(p["rows_scanned"] for p in plans),
+            "mean_ms": round(statistics.fmean(samples), 3),
+            **percentiles(samples),
+            "plans": plans,
+        }
+        results.append(entry)
+        print(f"  {entry['name']:<30} p50={entry['p50_ms']:>8.2f}ms  p95={entry['p95_ms']:>8.2f}ms  "
+              f"p99={entry['p99_ms']:>8.2f}ms  rows={found:<3} scanned={entry['rows_scanned']:,}")
+    return results
+
+# ---------------------------------------------
+# 3. REPORTING
+# ---------------------------------------------
+
+def _git_sha() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+def compare(current: dict, baseline_path: str, threshold_pct: float) -> bool:
+    """Prints p95 deltas against a previous run. Returns True if any case regressed."""
+    with open(baseline_path) as f:
+        baseline = {c["name"]: c for c in json.load(f)["cases"]}
+
+    regressed = False
+    print(f"\n📊 Compared with {baseline_path} (threshold {threshold_pct:.0f}%)")
+    for case in current["cases"]:
+        before = baseline.get(case["name"])
+        if not before or not before["p95_ms"]:
+            print(f"  {case['name']:<30} (new)")
+            continue
+        delta = (case["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+        flag = "❌" if delta > threshold_pct else "✅"
+        regressed = regressed or delta > threshold_pct
+        print(f"  {flag} {case['name']:<30} p95 {before['p95_ms']:.2f} -> {case['p95_ms']:.2f}ms ({delta:+.1f}%)  "
+              f"scanned {before['rows_scanned']:,} -> {case['rows_scanned']:,}")
+    return regressed
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Seed synthetic inventory and benchmark property search.")
+    parser.add_argument("--database-url", required=True,
+                        help="Benchmark database (never production). postgresql:// or postgresql+asyncpg://")
+    parser.add_argument("--rows", type=int, default=10_000, help="Listings to seed (1k - 1M)")
+    parser.add_argument("--agents", type=int, default=10, help="Agents to spread the listings over")
+    parser.add_argument("--seed", type=float, default=0.42, help="Postgres setseed() value for repeatable data")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the inventory from a previous run")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--no-ranking", action="store_true", help="Benchmark with RANKING_ENABLED=False")
+    parser.add_argument("--cases", nargs="*", help="Only run these case names")
+    parser.add_argument("--out", default=None, help="Output JSON path (default: bench_results/search-<ts>.json)")
+    parser.add_argument("--baseline", default=None, help="Previous result JSON to compare against")
+    parser.add_argument("--regression-pct", type=float, default=10.0)
+    return parser.parse_args()
+
+async def main():
+    args = parse_args()
+    if not 1 <= args.agents <= args.rows:
+        sys.exit("--agents must be between 1 and --rows")
+
+    # app.config reads these at import time, so set them before importing app modules
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from app.config import settings
+    from app.db.session import engine, async_session_factory
+    from app.tools.property_search import PropertySearchTool
+
+    # Text cases must never fall through to a network geocode. Set after the import:
+    # app.config's load_dotenv() would restore a popped key from .env.
+    os.environ["LOCATION_IQ_KEY"] = ""
+
+    async def no_geocode(self, location_name):
+        return None
+
+    PropertySearchTool.get_coordinates = no_geocode
+
+    if args.no_ranking:
+        settings.RANKING_ENABLED = False
+
+    if not args.skip_seed:
+        await seed(engine, args.rows, args.agents, args.seed)
+
+    cases = [c for c in CASES if not args.cases or c["name"] in args.cases]
+    agent_id = f"{BENCH_AGENT_PREFIX}0"
+
+    print(f"⏱️  Running {len(cases)} cases x {args.iterations} iterations (agent {agent_id})")
+    results = await run_benchmark(async_session_factory, cases, agent_id, args.iterations, args.warmup)
+    await engine.dispose()
+
+    report = {
+        "meta": {
+            "benchmark": "search",
+            "git_sha": _git_sha(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "rows": args.rows,
+            "agents": args.agents,
+            "listings_per_agent": args.rows // args.agents,
+            "seeded": not args.skip_seed,
+            "ranking_enabled": settings.RANKING_ENABLED,
+            "iterations": args.iterations,
+            "warmup": args.warmup,
+        },
+        "cases": results,
+    }
+
+    out = args.out or os.path.join(
+        "bench_results", f"search-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"📝 Wrote {out}")
+
+    if args.baseline and compare(report, args.baseline, args.regression_pct):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
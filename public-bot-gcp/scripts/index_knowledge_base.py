@@ -0,0 +1,73 @@
+"""
+Ingests agents' FAQs and documents into knowledge_base_passages (app/services/kb_ingestion.py)
+and refreshes the index each agent retrieves from (pgvector or BM25), for every agent
+with FAQs or documents, or only the given ones.
+
+Usage (from public-bot-gcp/):
+    python -m scripts.index_knowledge_base --database-url postgresql://... --install-schema
+    python -m scripts.index_knowledge_base --database-url postgresql://... --agents agent-1 agent-2
+
+Safe to re-run: only new or changed documents are chunked and only new passages embedded.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+AGENTS_SQL = """
+SELECT agent_id FROM knowledge_base_faqs
+UNION
+SELECT agent_id FROM knowledge_base_documents
+"""
+
+async def main():
+    parser = argparse.ArgumentParser(description="Ingest and index agents' FAQs and documents.")
+    parser.add_argument("--database-url", required=True, help="postgresql:// or postgresql+asyncpg://")
+    parser.add_argument("--agents", nargs="*", help="Only these agent_ids (default: every agent with a KB)")
+    parser.add_argument("--install-schema", action="store_true", help="Create the tables, extension and index first")
+    args = parser.parse_args()
+
+    # app.config reads this at import time, so set it before importing app modules
+    os.environ["DATABASE_URL"] = args.database_url
+
+    from sqlalchemy import text
+    from app.db.session import engine, async_session_factory
+    from app.services.openai_service import close_llm_client
+    from app.services.token_meter import token_meter
+    from app.services.kb_ingestion import kb_ingestion
+    from app.services.vector_store_service import vector_store, retrieval_modes
+
+    if args.install_schema:
+        await kb_ingestion.install_schema()
+        if "vector" in retrieval_modes():
+            await vector_store.install_schema()
+
+    agents = args.agents
+    if not agents:
+        async with async_session_factory() as session:
+            agents = sorted((await session.execute(text(AGENTS_SQL))).scalars().all())
+
+    print(f"🧩 Ingesting {len(agents)} agent(s)")
+    started = time.perf_counter()
+    totals = {"added": 0, "duplicates": 0, "removed": 0}
+    for agent_id in agents:
+        try:
+            stats = await kb_ingestion.process(agent_id)
+        except Exception as e:
+            print(f"  ❌ {agent_id}: {e}")
+            continue
+        if not stats:
+            print(f"  {agent_id:<30} skipped (KB_RETRIEVAL=full)")
+            continue
+        print(f"  {agent_id:<30} sources={stats['sources']:<5} added={stats['added']:<5} "
+              f"duplicates={stats['duplicates']:<5} removed={stats['removed']:<5} index={stats['index']}")
+        for key in totals:
+            totals[key] += stats[key]
+
+    await token_meter.flush()  # Embedding tokens count against the agents' quota
+    await close_llm_client()
+    await engine.dispose()
+    print(f"✅ Done in {time.perf_counter() - started:.1f}s: {totals}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
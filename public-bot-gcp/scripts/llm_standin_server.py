@@ -0,0 +1,63 @@
+"""
+OpenAI-compatible stand-in server for load tests (see app/services/llm_standin.py).
+
+Serves rule-generated (or recorded) completions with simulated latency, so the
+whole service, webhook included, can be load-tested without the real API.
+
+Usage (from public-bot-gcp/):
+    python -m scripts.llm_standin_server --port 8100 --latency "lognormal:700,0.35"
+    python -m scripts.llm_standin_server --port 8100 --cassette llm_cassettes/default.jsonl \\
+        --latency '{"default": "lognormal:900,0.4", "router": "lognormal:350,0.3"}'
+
+Then run the app with LLM_BASE_URL=http://localhost:8100/v1 (any OPENAI_API_KEY).
+Stand-in stats: GET /standin/stats
+"""
+import argparse
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+from app.core.metrics import metrics
+from app.services.llm_standin import create_standin
+
+def create_app(standin) -> FastAPI:
+    app = FastAPI(title="LLM stand-in")
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await standin.handle("/chat/completions", await request.json())
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        return await standin.handle("/embeddings", await request.json())
+
+    @app.get("/v1/models/{model}")
+    async def retrieve_model(model: str):
+        return await standin.handle(f"/models/{model}", {})
+
+    @app.get("/standin/stats")
+    async def stats():
+        return {
+            "calls": dict(standin.calls),
+            "simulated_ms": {node: round(ms, 1) for node, ms in standin.simulated_ms.items()},
+            "metrics": metrics.snapshot(),
+        }
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stand-in for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", default=None, help="Spec or per-node JSON (default: LLM_STANDIN_LATENCY)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--cassette", default=None, help="Replay recorded responses from this JSONL file")
+    args = parser.parse_args()
+
+    standin = create_standin("replay" if args.cassette else "standin", args.latency, args.seed, args.cassette)
+    print(f"🧪 LLM stand-in on http://{args.host}:{args.port}/v1 "
+          f"({'replay ' + args.cassette if args.cassette else 'rules only'})")
+    uvicorn.run(create_app(standin), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
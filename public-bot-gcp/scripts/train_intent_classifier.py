@@ -0,0 +1,191 @@
+"""
+Trains the local intent classifier (app/core/intent_classifier.py) from logged
+router decisions and tunes its confidence threshold on held-out data.
+
+Labels come from chat_history_whatsapp: each assistant message's metadata carries
+the router_intent of the user message before it. By default only LLM decisions are
+used as labels, so the classifier learns to reproduce the gpt-4o router.
+
+Usage (from public-bot-gcp/):
+    python -m scripts.train_intent_classifier --database-url postgresql://... --target-precision 0.97
+    python -m scripts.train_intent_classifier --jsonl samples.jsonl --out models/intent_classifier.json
+
+JSONL samples: {"text": "...", "intent": "PROPERTY_SEARCH", "last_bot_message": "...", "has_table": true}
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from scripts.bench_search import _git_sha
+
+SAMPLES_SQL = """
+WITH ordered AS (
+    SELECT
+        sender,
+        message,
+        LAG(sender) OVER w AS prev_sender,
+        LAG(message) OVER w AS prev_message,
+        LEAD(sender) OVER w AS next_sender,
+        CAST(LEAD(metadata) OVER w AS jsonb) AS next_metadata
+    FROM chat_history_whatsapp
+    WHERE (CAST(:since AS timestamptz) IS NULL OR created_at >= CAST(:since AS timestamptz))
+    WINDOW w AS (PARTITION BY session_id ORDER BY created_at)
+)
+SELECT
+    message AS text,
+    CASE WHEN prev_sender = 'assistant' THEN prev_message ELSE '' END AS last_bot_message,
+    next_metadata -> 'intent' ->> 'intent' AS intent,
+    next_metadata -> 'intent' ->> 'source' AS source,
+    COALESCE((next_metadata -> 'intent' ->> 'has_table')::boolean, false) AS has_table
+FROM ordered
+WHERE sender = 'user'
+  AND next_sender = 'assistant'
+  AND next_metadata -> 'intent' ->> 'intent' IS NOT NULL
+"""
+
+async def load_from_db(database_url: str, sources, since):
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import text
+    from app.core.intent_classifier import IntentSample
+    from app.db.session import engine, async_session_factory
+
+    async with async_session_factory() as session:
+        result = await session.execute(text(SAMPLES_SQL), {"since": since})
+        rows = result.mappings().all()
+    await engine.dispose()
+
+    return [
+        IntentSample(r["text"], r["intent"], r["last_bot_message"] or "", r["has_table"])
+        for r in rows
+        if r["text"] and (not sources or r["source"] in sources)
+    ]
+
+def load_from_jsonl(path: str):
+    from app.core.intent_classifier import IntentSample
+
+    samples = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                samples.append(IntentSample(
+                    row["text"], row["intent"], row.get("last_bot_message", ""), bool(row.get("has_table"))
+                ))
+    return samples
+
+def evaluate(classifier, samples):
+    """(confidence, correct) per held-out sample, highest confidence first."""
+    scored = []
+    for s in samples:
+        prediction = classifier.predict(s.text, s.last_bot_message, s.has_table)
+        scored.append((prediction.confidence, prediction.intent == s.intent))
+    scored.sort(key=lambda x: -x[0])
+    return scored
+
+def tune_threshold(scored, target_precision: float, min_coverage_samples: int = 20):
+    """
+    Lowest threshold whose accepted set still meets target_precision, i.e. the
+    most traffic the fast path can take at that accuracy. Returns (threshold, coverage, precision).
+    """
+    best = (1.0, 0.0, 1.0)
+    correct = 0
+    for i, (confidence, ok) in enumerate(scored, start=1):
+        correct += ok
+        precision = correct / i
+        # Only cut between distinct confidences, and ignore tiny accepted sets
+        next_conf = scored[i][0] if i < len(scored) else -1
+        if next_conf == confidence or i < min_coverage_samples:
+            continue
+        if precision >= target_precision:
+            best = (confidence, i / len(scored), precision)
+    return best
+
+def threshold_table(scored, thresholds=(0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99)):
+    rows = []
+    for t in thresholds:
+        accepted = [ok for conf, ok in scored if conf >= t]
+        rows.append({
+            "threshold": t,
+            "coverage": round(len(accepted) / len(scored), 4) if scored else 0,
+            "precision": round(sum(accepted) / len(accepted), 4) if accepted else None,
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local router intent classifier.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--database-url", help="Read labelled turns from chat_history_whatsapp")
+    source.add_argument("--jsonl", help="Read labelled samples from a JSONL file")
+    parser.add_argument("--since", default=None, help="Only use chat logs after this ISO timestamp")
+    parser.add_argument("--sources", nargs="*", default=["llm", "llm_fused"],
+                        help="router_intent sources to learn from (default: the LLM router, plain or fused)")
+    parser.add_argument("--holdout", type=float, default=0.2)
+    parser.add_argument("--target-precision", type=float, default=0.97)
+    parser.add_argument("--alpha", type=float, default=0.5, help="Additive smoothing")
+    parser.add_argument("--min-feature-count", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None, help="Model path (default: settings.INTENT_MODEL_PATH)")
+    args = parser.parse_args()
+
+    if args.database_url:
+        samples = asyncio.run(load_from_db(args.database_url, set(args.sources or []), args.since))
+    else:
+        samples = load_from_jsonl(args.jsonl)
+
+    from app.config import settings
+    from app.core.intent_classifier import IntentClassifier
+
+    if len(samples) < 50:
+        raise SystemExit(f"Only {len(samples)} labelled samples; need at least 50 to tune a threshold.")
+
+    print(f"📚 {len(samples)} samples: {dict(Counter(s.intent for s in samples))}")
+
+    random.Random(args.seed).shuffle(samples)
+    split = int(len(samples) * (1 - args.holdout))
+    train, held_out = samples[:split], samples[split:]
+
+    # --- 1. Fit on the training split and tune on held-out ---
+    classifier = IntentClassifier.train(train, alpha=args.alpha, min_feature_count=args.min_feature_count)
+    scored = evaluate(classifier, held_out)
+    accuracy = sum(ok for _, ok in scored) / len(scored)
+    threshold, coverage, precision = tune_threshold(scored, args.target_precision)
+
+    print(f"🎯 Held-out accuracy (no threshold): {accuracy:.3f}")
+    for row in threshold_table(scored):
+        print(f"  threshold {row['threshold']:.2f}: coverage {row['coverage']:.1%}  precision {row['precision']}")
+    print(f"✅ Tuned threshold {threshold:.4f}: fast path takes {coverage:.1%} of turns at {precision:.3f} precision")
+
+    # --- 2. Refit on everything, keep the tuned threshold ---
+    final = IntentClassifier.train(samples, alpha=args.alpha, threshold=threshold,
+                                   min_feature_count=args.min_feature_count)
+
+    started = time.perf_counter()
+    for s in held_out:
+        final.predict(s.text, s.last_bot_message, s.has_table)
+    latency_ms = (time.perf_counter() - started) * 1000 / len(held_out)
+    print(f"⚡ Mean prediction latency: {latency_ms:.3f}ms")
+
+    final.metrics = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "git_sha": _git_sha(),
+        "samples": len(samples),
+        "holdout_samples": len(held_out),
+        "holdout_accuracy": round(accuracy, 4),
+        "target_precision": args.target_precision,
+        "tuned_coverage": round(coverage, 4),
+        "tuned_precision": round(precision, 4),
+        "thresholds": threshold_table(scored),
+        "mean_latency_ms": round(latency_ms, 4),
+    }
+
+    out = args.out or settings.INTENT_MODEL_PATH
+    final.save(out)
+    print(f"📝 Wrote {out} ({os.path.getsize(out) / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()